@@ -0,0 +1,171 @@
+"""
+Compares the throughput of the API's JSON renderers on responses shaped like
+the largest ones it serves:
+- a 100-row study search page, with facets and meta (/api/study/search/);
+- a 1000-row study lookup (/api/study/lookup/).
+
+Rows are synthetic, with the fields and typical value sizes of
+GEOSeriesSerializer's output, so no database is needed; each renderer renders
+the same data, and their outputs are checked to be identical before timing.
+
+Run from this directory, with the backend's dependencies installed:
+    python renderers.py
+    python renderers.py --repeat 200 --json renderers.json
+
+Unlike the other benchmarks here, this one imports the backend (from ../src).
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meta2onto.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.renderers import ORJSONRenderer  # noqa: E402
+
+RENDERERS = {
+    "drf-json": JSONRenderer,
+    "orjson": ORJSONRenderer,
+}
+
+
+def _text(rng, words):
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+        for _ in range(words)
+    )
+
+
+def series_row(rng, i):
+    """A row as GEOSeriesSerializer renders it, with plausible value sizes."""
+    prob = rng.random()
+    return {
+        "name": _text(rng, 12),
+        "id": f"GSE{100000 + i}",
+        "status": f"Public on {rng.randint(1, 28)} Jan {rng.randint(2005, 2024)}",
+        "submitted_at": f"{rng.randint(2005, 2024)}-01-{rng.randint(10, 28)}",
+        "last_update_date": f"{rng.randint(2005, 2024)}-02-{rng.randint(10, 28)}",
+        "pubmed_id": rng.randint(10_000_000, 39_999_999),
+        "summary": _text(rng, 150),
+        "description": _text(rng, 150),
+        "type": "Expression profiling by high throughput sequencing",
+        "contributor": _text(rng, 8),
+        "web_link": None,
+        "overall_design": _text(rng, 60),
+        "repeats": None,
+        "repeats_sample_list": None,
+        "variable": None,
+        "variable_description": None,
+        "contact": _text(rng, 20),
+        "supplementary_file": f"ftp://ftp.ncbi.nlm.nih.gov/geo/series/GSE{i}nnn/GSE{i}/suppl/",
+        "confidence": {
+            "name": "high" if prob >= 0.8 else "medium" if prob >= 0.5 else "low",
+            "value": prob,
+        },
+        "sample_count": rng.randint(2, 400),
+        "database": ["GEO"],
+        "platform": f"['GPL{rng.randint(1000, 30000)}']",
+        "keywords": [_text(rng, 2) for _ in range(rng.randint(0, 8))],
+        "classification": "Positive",
+    }
+
+
+def search_page(rng, rows):
+    """A study search response: a page of rows, plus facets and meta."""
+    return {
+        "count": 12345,
+        "next": "http://localhost:8050/api/study/search/?limit=100&offset=100&query=MONDO%3A0005015",
+        "previous": None,
+        "results": [series_row(rng, i) for i in range(rows)],
+        "facets": {
+            "Study Size": {"small": 5000, "medium": 4000, "large": 3345},
+            "Confidence": {"high": 6000, "medium": 4000, "low": 2345},
+            "Platforms": {f"GPL{1000 + i}": rng.randint(1, 500) for i in range(50)},
+            "Technologies": {"high-throughput sequencing": 8000, "in situ oligonucleotide": 4345},
+        },
+        "meta": {"term": "MONDO:0005015", "performance": "high"},
+    }
+
+
+def lookup(rng, rows):
+    """A study lookup response: rows for the requested ids, without facets."""
+    return {
+        "count": rows,
+        "next": None,
+        "previous": None,
+        "results": [series_row(rng, i) for i in range(rows)],
+        "facets": {},
+        "meta": {},
+    }
+
+
+def bench(renderer, data, repeat):
+    """Render data repeat times; returns (seconds per render, bytes per render)."""
+    size = len(renderer.render(data))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        renderer.render(data)
+    return (time.perf_counter() - start) / repeat, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare JSON renderer throughput")
+    parser.add_argument(
+        "--repeat", type=int, default=50, help="Renders per renderer and response (default: %(default)s)"
+    )
+    parser.add_argument("--json", help="Also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    responses = {
+        "search page (100 rows)": search_page(rng, 100),
+        "lookup (1000 rows)": lookup(rng, 1000),
+    }
+
+    results = []
+    for response_name, data in responses.items():
+        outputs = {name: cls().render(data) for name, cls in RENDERERS.items()}
+        if len(set(outputs.values())) != 1:
+            sys.exit(f"! Renderers disagree on the {response_name} response")
+
+        baseline = None
+        for name, cls in RENDERERS.items():
+            seconds, size = bench(cls(), data, args.repeat)
+            baseline = baseline or seconds
+            results.append(
+                {
+                    "response": response_name,
+                    "renderer": name,
+                    "ms_per_render": seconds * 1000,
+                    "renders_per_s": 1 / seconds,
+                    "mb_per_s": size / seconds / 1e6,
+                    "speedup": baseline / seconds,
+                    "bytes": size,
+                }
+            )
+
+    print(f"{'response':<24} {'renderer':<10} {'ms/render':>10} {'renders/s':>10} {'MB/s':>8} {'speedup':>8}")
+    for row in results:
+        print(
+            f"{row['response']:<24} {row['renderer']:<10} {row['ms_per_render']:>10.2f} "
+            f"{row['renders_per_s']:>10.1f} {row['mb_per_s']:>8.1f} {row['speedup']:>7.1f}x"
+        )
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump({"repeat": args.repeat, "results": results}, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+"""
+Replays recorded API requests against a running meta2onto stack and reports
+throughput, latency percentiles and error rates per endpoint.
+
+Two log formats are understood, and can be mixed in the same file:
+- Caddy JSON access logs (one JSON object per line, as written by the `log`
+  directive), which carry the request URI, method and a timestamp.
+- Common/combined access logs as written by gunicorn's --access-logfile or
+  Django's runserver, e.g.
+  `127.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET /api/study/search/?query=MONDO:0000270 HTTP/1.1" 200 1234`
+
+Only requests whose body isn't needed are replayed (GET/HEAD by default), since
+neither log format records request bodies.
+
+Requests can be paced in one of three ways:
+- as fast as the workers allow (the default),
+- at a fixed aggregate rate (--rate, in requests/second), or
+- following the original inter-arrival times from the log, optionally sped up
+  (--speedup; requires timestamps in the log).
+
+We use this to size gunicorn workers and memcached before deploys, e.g.:
+    python replay_logs.py access.log --target http://localhost:8050 --concurrency 16 --rate 50
+
+If the server reports a Server-Timing header (e.g. the ontology search endpoint
+reports time spent in each search strategy), its metrics are summarized too.
+
+Requires only the Python standard library.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import re
+import sys
+import threading
+import time
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# ============================================================================
+# === log parsing
+# ============================================================================
+
+# matches the request line and status of a common/combined log entry, with an
+# optional gunicorn/apache-style or runserver-style timestamp before it
+COMMON_LOG_RE = re.compile(
+    r'(?:\[(?P<ts>[^\]]+)\]\s+)?"(?P<method>[A-Z]+) (?P<uri>\S+) HTTP/[\d.]+" (?P<status>\d{3})'
+)
+
+# timestamp formats used by gunicorn (apache-style) and django runserver
+COMMON_LOG_TS_FORMATS = ("%d/%b/%Y:%H:%M:%S %z", "%d/%b/%Y %H:%M:%S")
+
+
+@dataclass
+class LoggedRequest:
+    method: str
+    uri: str
+    ts: float | None = None
+
+
+def _parse_common_ts(value):
+    for fmt in COMMON_LOG_TS_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_line(line: str) -> LoggedRequest | None:
+    """
+    Parse a single log line in either Caddy JSON or common log format.
+
+    :param line: a line from an access log
+    :return: the logged request, or None if the line isn't a request entry
+    """
+    line = line.strip()
+    if not line:
+        return None
+
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        request = entry.get("request") or {}
+        if "uri" not in request:
+            return None
+        return LoggedRequest(
+            method=request.get("method", "GET"),
+            uri=request["uri"],
+            ts=entry.get("ts"),
+        )
+
+    match = COMMON_LOG_RE.search(line)
+    if match is None:
+        return None
+    return LoggedRequest(
+        method=match["method"],
+        uri=match["uri"],
+        ts=_parse_common_ts(match["ts"]) if match["ts"] else None,
+    )
+
+
+def load_requests(paths, methods, path_prefix=None, limit=None):
+    """
+    Read logged requests from the given files, keeping only replayable methods
+    and, optionally, URIs under path_prefix. Requests are returned in log order.
+    """
+    requests = []
+    skipped = 0
+
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as fp:
+            for line in fp:
+                req = parse_line(line)
+                if req is None:
+                    continue
+                if req.method not in methods or (
+                    path_prefix and not req.uri.startswith(path_prefix)
+                ):
+                    skipped += 1
+                    continue
+                requests.append(req)
+                if limit is not None and len(requests) >= limit:
+                    return requests, skipped
+
+    return requests, skipped
+
+
+# ids that vary per request are collapsed so that e.g. /api/study/GSE1/samples/
+# and /api/study/GSE2/samples/ are reported as the same endpoint
+ENDPOINT_PATTERNS = [
+    (re.compile(r"/(GSE|GSM|GPL)\d+(?=/|$)"), r"/{\1}"),
+    (
+        re.compile(
+            r"/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)"
+        ),
+        "/{uuid}",
+    ),
+    (re.compile(r"/[A-Za-z]+:\d+(?=/|$)"), "/{term}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{id}"),
+]
+
+
+def endpoint_for(uri: str) -> str:
+    """Reduce a request URI to the endpoint it targets, without query string or ids."""
+    path = urlsplit(uri).path
+    for pattern, repl in ENDPOINT_PATTERNS:
+        path = pattern.sub(repl, path)
+    return path
+
+
+# ============================================================================
+# === replay
+# ============================================================================
+
+
+@dataclass
+class EndpointStats:
+    latencies: list = field(default_factory=list)
+    statuses: dict = field(default_factory=lambda: defaultdict(int))
+    failures: int = 0
+    bytes: int = 0
+    # durations (in ms) reported by the server via Server-Timing, by metric name
+    server_timings: dict = field(default_factory=lambda: defaultdict(list))
+
+    @property
+    def count(self):
+        return len(self.latencies) + self.failures
+
+    @property
+    def errors(self):
+        # connection failures and server errors; 4xx responses are the
+        # client's fault and are reported via the status breakdown instead
+        return self.failures + sum(
+            n for code, n in self.statuses.items() if code >= 500
+        )
+
+
+def parse_server_timing(value):
+    """
+    Parse a Server-Timing header, e.g. "cache;dur=0.41, trigram;dur=12.20",
+    into a {name: duration_ms} dict; metrics without a duration are skipped.
+    """
+    timings = {}
+    for metric in (value or "").split(","):
+        name, *params = (p.strip() for p in metric.split(";"))
+        for param in params:
+            key, _, dur = param.partition("=")
+            if name and key == "dur":
+                try:
+                    timings[name] = float(dur)
+                except ValueError:
+                    pass
+    return timings
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already-sorted list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Replayer:
+    """
+    Issues requests from a pool of threads, each holding its own keep-alive
+    connection to the target, and records per-endpoint results.
+    """
+
+    def __init__(self, target, concurrency, timeout, headers):
+        parts = urlsplit(target)
+        self.scheme = parts.scheme or "http"
+        self.netloc = parts.netloc
+        # replayed paths are joined onto the target's, for stacks served
+        # under a prefix (e.g., https://example.org/meta2onto)
+        self.base_path = parts.path.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.headers = headers
+
+        self.stats = defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn_cls = (
+                http.client.HTTPSConnection
+                if self.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            conn = conn_cls(self.netloc, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def send(self, req: LoggedRequest):
+        endpoint = endpoint_for(req.uri)
+        start = time.perf_counter()
+        status = None
+        size = 0
+        timings = {}
+
+        try:
+            conn = self._connection()
+            conn.request(req.method, self.base_path + req.uri, headers=self.headers)
+            resp = conn.getresponse()
+            size = len(resp.read())
+            status = resp.status
+            timings = parse_server_timing(resp.getheader("Server-Timing"))
+        except (OSError, http.client.HTTPException):
+            self._reset_connection()
+
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            stats = self.stats[endpoint]
+            if status is None:
+                stats.failures += 1
+            else:
+                stats.latencies.append(elapsed)
+                stats.statuses[status] += 1
+                stats.bytes += size
+                for name, dur in timings.items():
+                    stats.server_timings[name].append(dur)
+
+    def run(self, requests, rate=None, speedup=None, duration=None):
+        """
+        Replay the requests, pacing them by a fixed rate, by their original
+        timestamps scaled by speedup, or not at all.
+
+        :return: wall-clock seconds taken to issue and complete all requests
+        """
+        if speedup:
+            # logs from several files (or workers) needn't be in order
+            requests = sorted(
+                (r for r in requests if r.ts is not None), key=lambda r: r.ts
+            )
+            if not requests:
+                raise SystemExit("--speedup requires timestamps in the log")
+        first_ts = requests[0].ts if speedup else None
+
+        # keep the backlog shallow so that pacing reflects issue time rather
+        # than the time at which requests were enqueued
+        in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for i, req in enumerate(requests):
+                if rate:
+                    due = i / rate
+                elif speedup:
+                    due = (req.ts - first_ts) / speedup
+                else:
+                    due = None
+
+                if due is not None:
+                    delay = due - (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                if duration is not None and time.perf_counter() - start > duration:
+                    break
+
+                in_flight.acquire()
+                future = pool.submit(self.send, req)
+                future.add_done_callback(lambda _: in_flight.release())
+
+        return time.perf_counter() - start
+
+
+# ============================================================================
+# === reporting
+# ============================================================================
+
+
+def summarize(stats, elapsed):
+    """Produce one summary row per endpoint, plus an overall row."""
+    rows = []
+    combined = EndpointStats()
+
+    for endpoint, s in sorted(stats.items(), key=lambda kv: -kv[1].count):
+        rows.append(_summary_row(endpoint, s, elapsed))
+        combined.latencies.extend(s.latencies)
+        combined.failures += s.failures
+        combined.bytes += s.bytes
+        for code, n in s.statuses.items():
+            combined.statuses[code] += n
+
+    rows.append(_summary_row("(all)", combined, elapsed))
+    return rows
+
+
+def _summary_row(endpoint, s, elapsed):
+    lat = sorted(s.latencies)
+    return {
+        "endpoint": endpoint,
+        "requests": s.count,
+        "errors": s.errors,
+        "error_rate": s.errors / s.count if s.count else 0.0,
+        "rps": s.count / elapsed if elapsed else 0.0,
+        "mean_ms": 1000 * sum(lat) / len(lat) if lat else float("nan"),
+        "p50_ms": 1000 * percentile(lat, 50),
+        "p90_ms": 1000 * percentile(lat, 90),
+        "p95_ms": 1000 * percentile(lat, 95),
+        "p99_ms": 1000 * percentile(lat, 99),
+        "max_ms": 1000 * lat[-1] if lat else float("nan"),
+        "mb": s.bytes / 1e6,
+        "statuses": {str(k): v for k, v in sorted(s.statuses.items())},
+    }
+
+
+def summarize_server_timings(stats):
+    """Produce one summary row per (endpoint, Server-Timing metric) pair."""
+    rows = []
+    for endpoint, s in sorted(stats.items(), key=lambda kv: -kv[1].count):
+        for name, durations in sorted(s.server_timings.items()):
+            durations = sorted(durations)
+            rows.append(
+                {
+                    "endpoint": endpoint,
+                    "metric": name,
+                    "count": len(durations),
+                    "mean_ms": sum(durations) / len(durations),
+                    "p50_ms": percentile(durations, 50),
+                    "p95_ms": percentile(durations, 95),
+                    "p99_ms": percentile(durations, 99),
+                    "max_ms": durations[-1],
+                }
+            )
+    return rows
+
+
+def print_report(rows, out=sys.stdout):
+    header = (
+        f"{'endpoint':<40} {'reqs':>7} {'err%':>6} {'rps':>8} {'mean':>8} "
+        f"{'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8} {'MB':>8}"
+    )
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for r in rows:
+        print(
+            f"{r['endpoint'][:40]:<40} {r['requests']:>7} {100 * r['error_rate']:>6.2f} "
+            f"{r['rps']:>8.1f} {r['mean_ms']:>8.1f} {r['p50_ms']:>8.1f} "
+            f"{r['p90_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+            f"{r['max_ms']:>8.1f} {r['mb']:>8.2f}",
+            file=out,
+        )
+    print("(latencies in ms)", file=out)
+
+
+def print_server_timings(rows, out=sys.stdout):
+    if not rows:
+        return
+    header = (
+        f"{'endpoint':<40} {'metric':<16} {'count':>7} {'mean':>8} "
+        f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    )
+    print(file=out)
+    print("Server-Timing metrics reported by the server:", file=out)
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for r in rows:
+        print(
+            f"{r['endpoint'][:40]:<40} {r['metric'][:16]:<16} {r['count']:>7} "
+            f"{r['mean_ms']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}",
+            file=out,
+        )
+
+
+# ============================================================================
+# === entrypoint
+# ============================================================================
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay Caddy JSON or common-format access logs against a meta2onto stack"
+    )
+    parser.add_argument("logs", nargs="+", help="Access log file(s) to replay")
+    parser.add_argument(
+        "--target",
+        default="http://localhost:8050",
+        help="Base URL of the stack to replay against; logged paths are appended "
+        "to its path (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Concurrent connections (default: %(default)s)"
+    )
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument(
+        "--rate", type=float, help="Aggregate requests/second to issue (default: unpaced)"
+    )
+    pacing.add_argument(
+        "--speedup",
+        type=float,
+        help="Follow the log's original timing, sped up by this factor (e.g. 1, 10)",
+    )
+    parser.add_argument(
+        "--methods",
+        default="GET,HEAD",
+        help="Comma-separated methods to replay (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--path-prefix",
+        default="/api/",
+        help="Only replay URIs starting with this prefix (default: %(default)s)",
+    )
+    parser.add_argument("--limit", type=int, help="Replay at most this many requests")
+    parser.add_argument("--duration", type=float, help="Stop issuing requests after this many seconds")
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="Per-request timeout in seconds (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--header",
+        action="append",
+        default=[],
+        metavar="NAME:VALUE",
+        help="Extra header to send with every request; may be repeated",
+    )
+    parser.add_argument("--json", help="Also write the summary as JSON to this path")
+
+    args = parser.parse_args(argv)
+
+    methods = {m.strip().upper() for m in args.methods.split(",") if m.strip()}
+    headers = dict(h.split(":", 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+
+    requests, skipped = load_requests(
+        args.logs, methods, path_prefix=args.path_prefix, limit=args.limit
+    )
+    if not requests:
+        raise SystemExit("No replayable requests found in the given logs")
+
+    print(
+        f"* Replaying {len(requests)} requests against {args.target} "
+        f"({skipped} skipped, concurrency={args.concurrency})",
+        file=sys.stderr,
+    )
+
+    replayer = Replayer(args.target, args.concurrency, args.timeout, headers)
+    elapsed = replayer.run(
+        requests, rate=args.rate, speedup=args.speedup, duration=args.duration
+    )
+
+    rows = summarize(replayer.stats, elapsed)
+    timing_rows = summarize_server_timings(replayer.stats)
+    print(f"* Completed in {elapsed:.2f}s", file=sys.stderr)
+    print_report(rows)
+    print_server_timings(timing_rows)
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(
+                {
+                    "target": args.target,
+                    "concurrency": args.concurrency,
+                    "rate": args.rate,
+                    "speedup": args.speedup,
+                    "elapsed_s": elapsed,
+                    "endpoints": rows,
+                    "server_timings": timing_rows,
+                },
+                fp,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Measures how well a meta2onto stack keeps serving fast requests while slow
+ones are in flight, e.g. to compare the sync (WSGI) and async (ASGI) serving
+modes selected by API_SERVER in launch_api.sh.
+
+A mix of requests is issued concurrently:
+- slow ones: uncached study searches (each gets a unique, ignored query
+  parameter so that it misses the page cache) for the given ontology terms,
+  which run the search, facet and count queries every time;
+- fast ones: ontology searches for the given autocomplete queries, which are
+  answered from the cache or the in-memory indexes after their first request.
+
+With sync workers, every slow request occupies a worker until it finishes, so
+fast requests queue behind them once all workers are busy; with async workers,
+fast requests should keep completing while the slow ones wait on the database.
+Compare the fast endpoint's latencies and the overall throughput between runs:
+    API_SERVER=wsgi ... ; python slow_queries.py --json wsgi.json
+    API_SERVER=asgi ... ; python slow_queries.py --json asgi.json
+
+Requires only the Python standard library (and replay_logs.py, alongside).
+"""
+
+import argparse
+import json
+import random
+import sys
+
+from urllib.parse import urlencode
+
+from replay_logs import LoggedRequest, Replayer, print_report, summarize
+
+DEFAULT_TERMS = ["MONDO:0005015", "MONDO:0004992", "MONDO:0005148", "UBERON:0002048"]
+DEFAULT_QUERIES = ["lun", "lung", "asthma", "diabetes", "breast cancer", "liver"]
+
+
+def build_requests(n, slow_fraction, terms, queries, limit, seed=0):
+    """A shuffled mix of n slow study searches and fast ontology searches."""
+    rng = random.Random(seed)
+    n_slow = round(n * slow_fraction)
+    requests = []
+    for i in range(n_slow):
+        params = {"query": terms[i % len(terms)], "limit": limit, "nocache": i}
+        requests.append(LoggedRequest("GET", f"/api/study/search/?{urlencode(params)}"))
+    for i in range(n - n_slow):
+        params = {"query": queries[i % len(queries)]}
+        requests.append(LoggedRequest("GET", f"/api/ontology/search/?{urlencode(params)}"))
+    rng.shuffle(requests)
+    return requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare fast-request latency under concurrent slow queries"
+    )
+    parser.add_argument(
+        "--target",
+        default="http://localhost:8050",
+        help="Base URL of the stack to benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=400, help="Total requests to issue (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=32, help="Concurrent connections (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--slow-fraction",
+        type=float,
+        default=0.25,
+        help="Fraction of requests that are slow study searches (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--term",
+        action="append",
+        dest="terms",
+        help="Ontology term id to study-search for; may be repeated",
+    )
+    parser.add_argument(
+        "--query",
+        action="append",
+        dest="queries",
+        help="Autocomplete query to ontology-search for; may be repeated",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=100,
+        help="Page size of the slow study searches (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120, help="Per-request timeout in seconds (default: %(default)s)"
+    )
+    parser.add_argument("--json", help="Also write the summary as JSON to this path")
+
+    args = parser.parse_args(argv)
+
+    requests = build_requests(
+        args.requests,
+        args.slow_fraction,
+        args.terms or DEFAULT_TERMS,
+        args.queries or DEFAULT_QUERIES,
+        args.limit,
+    )
+
+    print(
+        f"* Issuing {len(requests)} requests against {args.target} "
+        f"({args.slow_fraction:.0%} slow, concurrency={args.concurrency})",
+        file=sys.stderr,
+    )
+
+    replayer = Replayer(args.target, args.concurrency, args.timeout, headers={})
+    elapsed = replayer.run(requests)
+
+    rows = summarize(replayer.stats, elapsed)
+    print(f"* Completed in {elapsed:.2f}s", file=sys.stderr)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(
+                {
+                    "target": args.target,
+                    "concurrency": args.concurrency,
+                    "slow_fraction": args.slow_fraction,
+                    "elapsed_s": elapsed,
+                    "endpoints": rows,
+                },
+                fp,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
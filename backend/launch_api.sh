@@ -22,6 +22,13 @@ echo "* Collecting static files"
 if [ "$DJANGO_DEBUG" = "1" ] ; then
     echo "* Serving via django runserver (debug mode)"
     ./manage.py runserver 0.0.0.0:8000
+elif [ "$API_SERVER" = "asgi" ] ; then
+    # uvicorn workers each run an event loop, so slow searches don't block
+    # other requests (see api/async_views.py)
+    echo "* Serving via gunicorn with uvicorn workers (production mode, async)"
+    API_ASYNC_VIEWS="${API_ASYNC_VIEWS:-1}" \
+    gunicorn meta2onto.asgi:application --bind 0.0.0.0:8000 --workers 3 \
+        --worker-class uvicorn_worker.UvicornWorker
 else
     echo "* Serving via gunicorn (production mode)"
     gunicorn meta2onto.wsgi:application --bind 0.0.0.0:8000 --workers 3
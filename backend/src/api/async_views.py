@@ -0,0 +1,218 @@
+"""
+Async versions of the study search, study lookup and ontology search views,
+routed in place of their DRF counterparts when the API is served via ASGI (see
+API_ASYNC_VIEWS in meta2onto/settings.py and launch_api.sh).
+
+DRF views are sync-only, so a slow search ties up a whole sync worker. These
+are plain Django async views that build the same querysets as the DRF views but
+evaluate them on async connections (see api.utils.async_db), so each worker's
+event loop can serve other requests while a search waits on the database.
+Their responses are the same as the DRF views'.
+"""
+
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .decorators import compressed_cache_page
+from .models import GEOSeries, OntologyTermRating
+from .serializers import GEOSeriesValuesSerializer, OntologySearchResultsSerializer
+from .utils.async_db import fetch_count, fetch_queryset
+from .utils.cache import ontology_search_cache_key
+from .utils.ontology_search import asearch_ontology_terms, timed
+from .views import (
+    GEOSeriesSearchPagination,
+    GEOSeriesViewSet,
+    parse_fields_param,
+    parse_ontology_search_params,
+    server_timing,
+)
+
+# ===========================================================================
+# === Helpers
+# ===========================================================================
+
+
+def render(data, status=200):
+    """Render data with the API's default renderer, as a DRF Response would be."""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f"{content_type}; charset={renderer.charset}"
+    return HttpResponse(renderer.render(data), content_type=content_type, status=status)
+
+
+async def fetch_series(queryset, fields=None):
+    """
+    Evaluate and serialize a GEOSeries queryset, as GEOSeriesValuesSerializer
+    does, fetching its databases and platforms concurrently.
+    """
+    rows = await fetch_queryset(GEOSeriesValuesSerializer.values_queryset(queryset, fields))
+    querysets = GEOSeriesValuesSerializer.related_querysets(
+        [row["gse"] for row in rows], fields
+    )
+    related_rows = await asyncio.gather(*(fetch_queryset(qs) for qs in querysets.values()))
+    return GEOSeriesValuesSerializer(
+        rows, dict(zip(querysets, related_rows)), fields=fields
+    ).data
+
+
+async def fetch_page(request, queryset, fields=None):
+    """
+    Paginate a GEOSeries queryset as GEOSeriesViewSet does, fetching the page
+    and the count concurrently. Returns the paginator and the serialized page
+    (restricted to the given fields, if any); the caller builds the response
+    with paginator.get_paginated_response().
+    """
+    paginator = GEOSeriesSearchPagination()
+    request = Request(request)
+    paginator.request = request
+    paginator.limit = paginator.get_limit(request)
+    paginator.offset = paginator.get_offset(request)
+
+    paginator.count, data = await asyncio.gather(
+        fetch_count(queryset),
+        fetch_series(queryset[paginator.offset:paginator.offset + paginator.limit], fields),
+    )
+    paginator.facets = {}
+    paginator.meta = {}
+
+    return paginator, data
+
+
+async def fetch_facets(viewset, facet_querysets):
+    """Evaluate {facet name: (queryset, key field)} concurrently into facet counts."""
+    rows = await asyncio.gather(*(fetch_queryset(qs) for qs, _ in facet_querysets.values()))
+    return {
+        name: viewset._facet_counts(facet_rows, key)
+        for (name, (_, key)), facet_rows in zip(facet_querysets.items(), rows)
+    }
+
+
+# ===========================================================================
+# === Core Entities
+# ===========================================================================
+
+
+@compressed_cache_page(settings.LONGTERM_CACHE_TIMEOUT)
+@require_GET
+async def study_search(request):
+    """Async version of GEOSeriesViewSet.search; accessible at /api/study/search/"""
+    query = request.GET.get("query")
+    ordering = request.GET.get("ordering") or "relevance"
+    try:
+        fields = parse_fields_param(request.GET)
+    except ValueError as e:
+        return render({"error": str(e)}, status=400)
+
+    if not query:
+        return render(
+            {
+                "count": 0,
+                "next": None,
+                "previous": None,
+                "results": [],
+                "facets": {},
+                "meta": {
+                    "term": query,
+                    "performance": "unknown",
+                },
+            }
+        )
+
+    viewset = GEOSeriesViewSet()
+    searched, results = viewset._search_querysets(query, ordering, request.GET)
+
+    async def platform_facets():
+        # platform facets need the GSEs in the result set first
+        gse_rows = await fetch_queryset(searched.values("gse"))
+        gse_list = [row["gse"] for row in gse_rows]
+        return await fetch_facets(viewset, viewset._platform_facet_querysets(gse_list))
+
+    # as in GEOSeriesViewSet.search, facets describe the full searched result
+    # set, and the facet, rating, count and page queries run concurrently
+    bucket_facets, other_facets, rating, (paginator, data) = await asyncio.gather(
+        fetch_facets(viewset, viewset._bucket_facet_querysets(searched)),
+        platform_facets(),
+        fetch_queryset(
+            OntologyTermRating.objects.filter(term=query)
+            .order_by("pk")
+            .values("performance")[:1]
+        ),
+        fetch_page(request, results, fields),
+    )
+
+    paginator.facets = {**bucket_facets, **other_facets}
+    paginator.meta = {
+        "term": query,
+        "performance": rating[0]["performance"] if rating else "unknown",
+    }
+    return render(paginator.get_paginated_response(data).data)
+
+
+@csrf_exempt
+@require_POST
+async def study_lookup(request):
+    """Async version of GEOSeriesViewSet.lookup; accessible at /api/study/lookup/"""
+    try:
+        series_ids = json.loads(request.body or b"{}").get("ids", [])
+    except (ValueError, AttributeError):
+        return render({"error": "expected a JSON object with an 'ids' list"}, status=400)
+
+    try:
+        fields = parse_fields_param(request.GET)
+    except ValueError as e:
+        return render({"error": str(e)}, status=400)
+
+    paginator, data = await fetch_page(
+        request, GEOSeries.objects.filter(gse__in=series_ids), fields
+    )
+    return render(paginator.get_paginated_response(data).data)
+
+
+# ===========================================================================
+# === Ontology search terms from meta-hq
+# ===========================================================================
+
+
+@require_GET
+async def ontology_search(request):
+    """Async version of api.views.ontology_search; accessible at /api/ontology/search/"""
+    try:
+        query, max_results, engine, filters = parse_ontology_search_params(request.GET)
+    except ValueError as e:
+        return render({"error": str(e)}, status=400)
+
+    if not query:
+        # return an empty list if no query is provided
+        return render([])
+
+    # time spent per search strategy, reported via the Server-Timing header
+    timings = {}
+
+    cache_key = ontology_search_cache_key(
+        query, max_results=max_results, engine=engine, **filters
+    )
+    with timed(timings, "cache"):
+        data = await cache.aget(cache_key)
+
+    if data is None:
+        meta = {}
+        results = await asearch_ontology_terms(
+            query, max_results, timings=timings, engine=engine, meta=meta, **filters
+        )
+        data = OntologySearchResultsSerializer(results, many=True).data
+        # narrowed results aren't cached, as in api.views.ontology_search
+        if not meta["narrowed"]:
+            await cache.aset(cache_key, data, settings.LONGTERM_CACHE_TIMEOUT)
+
+    response = render(data)
+    response["Server-Timing"] = server_timing(timings)
+    return response
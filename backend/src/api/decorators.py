@@ -0,0 +1,55 @@
+"""
+View decorators for the API.
+"""
+
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import decorator_from_middleware
+from django.views.decorators.cache import cache_page
+
+from .middleware import CompressionMiddleware
+from .utils.compression import negotiate_encoding
+
+# compresses a view's responses as CompressionMiddleware does, e.g. so that
+# they're compressed before a cache decorator around it stores them
+compress_page = decorator_from_middleware(CompressionMiddleware)
+
+
+def compressed_cache_page(timeout):
+    """
+    Like cache_page, but caches responses compressed with the encoding
+    negotiated with the client (see api.utils.compression), so that cache hits
+    are served as they are rather than being compressed again on every request.
+
+    A copy is cached per encoding; to keep clients whose Accept-Encoding headers
+    differ but negotiate the same encoding from caching a copy each, the header
+    is replaced with the negotiated encoding before the cache is consulted.
+    """
+
+    def decorator(view_func):
+        cached_view = cache_page(timeout)(compress_page(view_func))
+
+        def negotiate(request):
+            accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+            request.META["HTTP_ACCEPT_ENCODING"] = (
+                negotiate_encoding(accept_encoding) or "identity"
+            )
+
+        if iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                negotiate(request)
+                return await cached_view(request, *args, **kwargs)
+
+        else:
+
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                negotiate(request)
+                return cached_view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
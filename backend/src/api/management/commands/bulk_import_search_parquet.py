@@ -1,6 +1,7 @@
 import io
 from pathlib import Path
 
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 
@@ -82,4 +83,7 @@ class Command(BaseCommand):
                             break
                         copy.write(chunk)
 
+        # precompute per-term stats from the newly-imported search terms
+        call_command("refresh_term_stats", stdout=self.stdout)
+
         self.stdout.write(self.style.SUCCESS("Import completed successfully."))
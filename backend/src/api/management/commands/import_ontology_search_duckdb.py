@@ -16,6 +16,7 @@ from api.models import (
     OntologySynonyms,
     OntologyTerms,
 )
+from api.utils.cache import bump_ontology_data_version
 
 # ============================================================================
 # === entrypoint
@@ -94,8 +95,14 @@ class Command(BaseCommand):
 
         # OntologySynonyms
         self.stdout.write(self.style.HTTP_INFO("→ Importing OntologySynonyms..."))
+        # ontology and type are denormalized from each synonym's term, for
+        # filtered searches (see migration 0040_search_onto_filters)
         rows = con.execute(
-            "SELECT term_id, synonym, scope FROM ontology_synonyms"
+            """
+            SELECT s.term_id, s.synonym, s.scope, t.ontology, t.type
+            FROM ontology_synonyms s
+            LEFT JOIN ontology_terms t ON t.id = s.term_id
+            """
         ).fetchall()
         OntologySynonyms.objects.bulk_create(
             [
@@ -103,6 +110,8 @@ class Command(BaseCommand):
                     term_id=row[0],
                     synonym=row[1],
                     scope=row[2],
+                    ontology=row[3],
+                    type=row[4],
                 )
                 for row in tqdm(rows)
             ],
@@ -129,4 +138,27 @@ class Command(BaseCommand):
         )
         self.stdout.write(self.style.SUCCESS("✓ OntologyTerms imported"))
 
+        # normalized keys for search_onto()'s exact-match branches; computed in
+        # the database by onto_norm_key(), which search_onto() also applies to
+        # queries (see migration 0043_normalized_term_keys)
+        self.stdout.write(self.style.HTTP_INFO("→ Computing normalized term keys..."))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE api_ontologyterms SET name_key = onto_norm_key(name)
+                WHERE name_key IS DISTINCT FROM onto_norm_key(name)
+                """
+            )
+            cursor.execute(
+                """
+                UPDATE api_ontologysynonyms SET synonym_key = onto_norm_key(synonym)
+                WHERE synonym_key IS DISTINCT FROM onto_norm_key(synonym)
+                """
+            )
+        self.stdout.write(self.style.SUCCESS("✓ Normalized term keys computed"))
+
+        # invalidate cached ontology search responses and workers' in-memory indexes
+        bump_ontology_data_version()
+        self.stdout.write(self.style.SUCCESS("✓ Ontology search caches invalidated"))
+
         self.stdout.write(self.style.MIGRATE_HEADING("Import complete"))
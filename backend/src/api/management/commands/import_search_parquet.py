@@ -7,6 +7,7 @@ from pathlib import Path
 
 from tqdm import tqdm
 
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction, connection
 
@@ -208,4 +209,8 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.WARNING("Skipping eval terms import"))
 
+        # precompute per-term stats (e.g., the set of searchable terms) from
+        # the newly-imported search terms
+        call_command("refresh_term_stats", stdout=self.stdout)
+
         self.stdout.write(self.style.MIGRATE_HEADING("Import complete"))
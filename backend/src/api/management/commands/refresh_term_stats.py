@@ -0,0 +1,24 @@
+"""
+Recomputes the per-term statistics in OntologyTermStats from api_searchterm.
+
+Run automatically at the end of import_search_parquet; run it by hand after
+modifying api_searchterm any other way.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.models import OntologyTermStats
+from api.utils.cache import bump_ontology_data_version
+
+
+class Command(BaseCommand):
+    help = "Recompute per-term statistics (OntologyTermStats) from api_searchterm."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.HTTP_INFO("→ Refreshing OntologyTermStats..."))
+        refreshed = OntologyTermStats.objects.refresh()
+        self.stdout.write(self.style.SUCCESS(f"✓ Statistics computed for {refreshed} term(s)"))
+
+        # the set of searchable terms may have changed, so invalidate cached
+        # ontology search responses and workers' in-memory indexes
+        bump_ontology_data_version()
@@ -0,0 +1,37 @@
+"""
+Warms up the database and caches for serving: prewarms the search tables and
+their trigram indexes into Postgres' shared buffers and replays the searches for
+the most popular terms (see api.utils.warmup).
+
+gunicorn does this by itself as it starts; run it by hand after restoring or
+restarting the database under a running backend.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.utils.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Prewarm the search tables and indexes and replay the most popular searches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=None,
+            help="Number of most popular terms to replay searches for (default: WARMUP_TOP_QUERIES)",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.HTTP_INFO("→ Warming up..."))
+        done = warm_up(top_n=options["top"])
+
+        for name, (seconds, result) in done.items():
+            if isinstance(result, dict):
+                detail = f"{sum(result.values())} blocks in {len(result)} relations"
+            elif isinstance(result, int):
+                detail = f"{result} searches"
+            else:
+                detail = "done"
+            self.stdout.write(self.style.SUCCESS(f"✓ {name}: {detail} ({seconds:.2f}s)"))
@@ -0,0 +1,147 @@
+"""
+Middleware for the API.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .routers import request_reads
+from .utils.compression import compress, negotiate_encoding
+
+
+def sync_pool_wait_ms() -> float:
+    """
+    Total milliseconds requests have waited for a connection from this
+    worker's Django connection pools, summed over every database alias that
+    has one (e.g., the primary and its replicas), or 0 if pooling is disabled.
+    """
+    total = 0.0
+    for alias in settings.DATABASES:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            total += pool.get_stats().get("requests_wait_ms", 0)
+    return total
+
+
+class PoolWaitTimingMiddleware:
+    """
+    Reports the time a request spent waiting for pooled database connections
+    as "db-pool" in its Server-Timing header, so that pool exhaustion can be
+    told apart from slow queries (e.g., by benchmarks/replay_logs.py).
+
+    Under WSGI, this is the change in the Django pools' wait statistics over
+    the request, which is the request's own since a sync worker serves one
+    request at a time. Under ASGI, it's the sum of the waits of the async
+    views' queries (see api.utils.async_db).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        before = sync_pool_wait_ms()
+        response = self.get_response(request)
+        return self.add_timing(response, sync_pool_wait_ms() - before)
+
+    async def __acall__(self, request):
+        from .utils.async_db import pool_waits
+
+        waits = []
+        token = pool_waits.set(waits)
+        try:
+            response = await self.get_response(request)
+        finally:
+            pool_waits.reset(token)
+        return self.add_timing(response, sum(waits))
+
+    @staticmethod
+    def add_timing(response, wait_ms: float):
+        metric = f"db-pool;dur={wait_ms:.2f}"
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = f"{existing}, {metric}" if existing else metric
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Sends all of a request's reads to the same database, chosen by
+    api.routers.ReplicaRouter on the request's first read, so that its
+    queries all see the same replica's data.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = request_reads.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            request_reads.reset(token)
+
+    async def __acall__(self, request):
+        token = request_reads.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            request_reads.reset(token)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses responses with the encoding negotiated with the client (see
+    api.utils.compression), like Django's GZipMiddleware but also offering
+    zstd and brotli. Responses smaller than COMPRESSION_MIN_BYTES, streaming
+    responses and ones that are already encoded (e.g., cached compressed pages,
+    see api.decorators.compressed_cache_page) are passed through as they are.
+    """
+
+    def process_response(self, request, response):
+        # it's not worth attempting to compress really short responses
+        if response.streaming or len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        # avoid compressing twice
+        if response.has_header("Content-Encoding"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        # return the original content if compression doesn't save anything
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+
+        # as GZipMiddleware does, weaken strong ETags, since the compressed
+        # content isn't byte-for-byte what they were computed from
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,144 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:10
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.migrations import RunSQL
+
+# adds search_onto_prefix, which answers short (1-3 character) queries from
+# btree indexes on lower(name) and lower(synonym) rather than trigram GIN
+# indexes, which either match nothing or scan huge posting lists for them.
+#
+# note that prefix matches are written as a range over text_pattern_ops'
+# bytewise ordering, i.e. lower(x) ~>=~ prefix AND lower(x) ~<~ prefix || U+10FFFF,
+# rather than as lower(x) LIKE prefix || '%': the planner only turns LIKE into an
+# index range for constant patterns, and the query here is a function parameter.
+
+FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto_prefix(text, integer);
+
+CREATE FUNCTION search_onto_prefix(
+    query text,
+    max_results integer DEFAULT 50
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean
+)
+AS $$
+    SELECT
+        d.id, d.name, d.ontology, d.type,
+        d.synonym, d.scope,
+        d.sim, d.scope_weight, d.overall_rank, d.is_exact
+    FROM (
+        SELECT DISTINCT ON (q.id)
+            q.id, q.name, q.ontology, q.type,
+            q.synonym, q.scope,
+            q.sim, q.scope_weight, q.overall_rank, q.is_exact
+        FROM (
+            -- Branch 1: exact match on term id.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                1.0::real     AS sim,
+                1.0::real     AS scope_weight,
+                1.0::real     AS overall_rank,
+                TRUE          AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE t.id = query
+
+            UNION ALL
+
+            -- Branch 2: prefix match on name, via api_ontoterms_name_lower_idx.
+            -- Similarity is the fraction of the name covered by the query, so
+            -- shorter completions rank higher.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                (length(query)::real / length(t.name))::real AS sim,
+                1.0::real AS scope_weight,
+                (length(query)::real / length(t.name))::real AS overall_rank,
+                lower(t.name) = lower(query) AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE lower(t.name) ~>=~ lower(query)
+              AND lower(t.name) ~<~ (lower(query) || chr(1114111))
+
+            UNION ALL
+
+            -- Branch 3: prefix match on a synonym, via api_ontosyn_syn_lower_idx.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                (length(query)::real / length(s.synonym))::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                (length(query)::real / length(s.synonym) * CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END)::real AS overall_rank,
+                lower(s.synonym) = lower(query) AS is_exact
+            FROM api_ontologysynonyms s
+            JOIN api_ontologyterms t ON t.id = s.term_id
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE lower(s.synonym) ~>=~ lower(query)
+              AND lower(s.synonym) ~<~ (lower(query) || chr(1114111))
+        ) q
+        ORDER BY
+            q.id,
+            q.is_exact DESC,
+            q.overall_rank DESC,
+            q.scope_weight DESC,
+            q.sim DESC,
+            q.synonym NULLS LAST
+    ) d
+    ORDER BY
+        d.is_exact DESC,
+        d.overall_rank DESC,
+        d.scope_weight DESC,
+        d.sim DESC,
+        d.id
+    LIMIT max_results;
+$$ LANGUAGE sql;
+
+alter function search_onto_prefix(text, integer) owner to meta2onto;
+"""
+
+OLD_FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto_prefix(text, integer);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_ontologytermstats_search_onto'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ontologysynonyms',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('synonym'), name='text_pattern_ops'), name='api_ontosyn_syn_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ontologyterms',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('name'), name='text_pattern_ops'), name='api_ontoterms_name_lower_idx'),
+        ),
+        RunSQL(
+            FUNC_DEFN,
+            reverse_sql=OLD_FUNC_DEFN,
+        ),
+    ]
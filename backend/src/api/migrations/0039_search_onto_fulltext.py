@@ -0,0 +1,382 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:05
+
+from django.db import migrations
+from django.db.migrations import RunSQL
+
+# adds full-text branches to search_onto that use the existing tsvector GIN
+# indexes (api_ontoterms_name_tsv_idx, api_ontosyn_syn_tsv_idx) via
+# websearch_to_tsquery, and fuses their ts_rank with trigram similarity.
+#
+# also adds a use_trigram argument; when false, the trigram branches are
+# skipped, so multi-word queries can be answered from the tsvector indexes
+# alone (see the "fulltext" strategy in OntologySearchResultsManager).
+
+FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto(text, integer);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean);
+
+CREATE FUNCTION search_onto(
+    query text,
+    max_results integer DEFAULT 50,
+    use_trigram boolean DEFAULT TRUE
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean
+)
+SET pg_trgm.similarity_threshold = 0.2
+AS $$
+    SELECT
+        d.id, d.name, d.ontology, d.type,
+        d.synonym, d.scope,
+        d.sim, d.scope_weight, d.overall_rank, d.is_exact
+    FROM (
+        SELECT DISTINCT ON (q.id)
+            q.id, q.name, q.ontology, q.type,
+            q.synonym, q.scope,
+            q.sim, q.scope_weight, q.overall_rank, q.is_exact
+        FROM (
+            -- Branch 1: exact match on term id or name.
+            -- No similarity calculation; wins all ranking.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                1.0::real     AS sim,
+                1.0::real     AS scope_weight,
+                1.0::real     AS overall_rank,
+                TRUE          AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE (t.id = query OR t.name = query)
+
+            UNION ALL
+
+            -- Branch 2: exact match on a synonym.
+            -- Carries scope weight but no similarity cost.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                1.0::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS overall_rank,
+                TRUE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE s.synonym = query
+              AND t.id    <> query
+              AND t.name  <> query
+
+            UNION ALL
+
+            -- Branch 3: fuzzy name match.
+            -- Uses the trigram GIN index on api_ontologyterms.name via the %
+            -- operator (controlled by the pg_trgm.similarity_threshold = 0.2 SET
+            -- clause above, which replaces the previous > 0.2 threshold).
+            -- Skipped entirely (via a one-time filter) unless use_trigram.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                similarity(t.name, query)::real AS sim,
+                1.0::real AS scope_weight,
+                similarity(t.name, query)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE use_trigram
+              AND t.name % query
+              AND t.name <> query
+              AND t.id   <> query
+
+            UNION ALL
+
+            -- Branch 4: fuzzy synonym match.
+            -- Uses the trigram GIN index on api_ontologysynonyms.synonym via %.
+            -- Skipped entirely (via a one-time filter) unless use_trigram.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                similarity(s.synonym, query)::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                (similarity(s.synonym, query) * CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE use_trigram
+              AND s.synonym % query
+              AND s.synonym <> query
+
+            UNION ALL
+
+            -- Branch 5: full-text name match.
+            -- Uses the tsvector GIN index api_ontoterms_name_tsv_idx; the
+            -- to_tsvector() expression must match the index's exactly.
+            -- The ts_rank (normalized to [0, 1) by flag 32) is added to the
+            -- trigram similarity, so a term matched by both branches outranks
+            -- one matched by either alone, and the DISTINCT ON below keeps
+            -- this fused row over the branch 3 row for the same term.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                similarity(t.name, query)::real AS sim,
+                1.0::real AS scope_weight,
+                (
+                    similarity(t.name, query)
+                    + ts_rank(
+                        to_tsvector('simple'::regconfig, COALESCE(t.name, '')),
+                        websearch_to_tsquery('simple'::regconfig, query),
+                        32
+                    )
+                )::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE to_tsvector('simple'::regconfig, COALESCE(t.name, ''))
+                    @@ websearch_to_tsquery('simple'::regconfig, query)
+              AND t.name <> query
+              AND t.id   <> query
+
+            UNION ALL
+
+            -- Branch 6: full-text synonym match.
+            -- Uses the tsvector GIN index api_ontosyn_syn_tsv_idx; scored as
+            -- in branch 5, then weighted by scope.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                similarity(s.synonym, query)::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                ((
+                    similarity(s.synonym, query)
+                    + ts_rank(
+                        to_tsvector('simple'::regconfig, COALESCE(s.synonym, '')),
+                        websearch_to_tsquery('simple'::regconfig, query),
+                        32
+                    )
+                ) * CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE to_tsvector('simple'::regconfig, COALESCE(s.synonym, ''))
+                    @@ websearch_to_tsquery('simple'::regconfig, query)
+              AND s.synonym <> query
+        ) q
+        ORDER BY
+            q.id,
+            q.is_exact DESC,
+            q.overall_rank DESC,
+            q.scope_weight DESC,
+            q.sim DESC,
+            q.synonym NULLS LAST
+    ) d
+    ORDER BY
+        d.is_exact DESC,
+        d.overall_rank DESC,
+        d.scope_weight DESC,
+        d.sim DESC,
+        d.id
+    LIMIT max_results;
+$$ LANGUAGE sql;
+
+alter function search_onto(text, integer, boolean) owner to meta2onto;
+"""
+
+# reverse: the version from 0037_ontologytermstats_search_onto.py
+OLD_FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean);
+DROP FUNCTION IF EXISTS search_onto(text, integer);
+
+CREATE FUNCTION search_onto(
+    query text,
+    max_results integer DEFAULT 50
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean
+)
+SET pg_trgm.similarity_threshold = 0.2
+AS $$
+    SELECT
+        d.id, d.name, d.ontology, d.type,
+        d.synonym, d.scope,
+        d.sim, d.scope_weight, d.overall_rank, d.is_exact
+    FROM (
+        SELECT DISTINCT ON (q.id)
+            q.id, q.name, q.ontology, q.type,
+            q.synonym, q.scope,
+            q.sim, q.scope_weight, q.overall_rank, q.is_exact
+        FROM (
+            -- Branch 1: exact match on term id or name.
+            -- No similarity calculation; wins all ranking.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                1.0::real     AS sim,
+                1.0::real     AS scope_weight,
+                1.0::real     AS overall_rank,
+                TRUE          AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE (t.id = query OR t.name = query)
+
+            UNION ALL
+
+            -- Branch 2: exact match on a synonym.
+            -- Carries scope weight but no similarity cost.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                1.0::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS overall_rank,
+                TRUE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE s.synonym = query
+              AND t.id    <> query
+              AND t.name  <> query
+
+            UNION ALL
+
+            -- Branch 3: fuzzy name match.
+            -- Uses the trigram GIN index on api_ontologyterms.name via the %
+            -- operator (controlled by the pg_trgm.similarity_threshold = 0.2 SET
+            -- clause above, which replaces the previous > 0.2 threshold).
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                similarity(t.name, query)::real AS sim,
+                1.0::real AS scope_weight,
+                similarity(t.name, query)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE t.name % query
+              AND t.name <> query
+              AND t.id   <> query
+
+            UNION ALL
+
+            -- Branch 4: fuzzy synonym match.
+            -- Uses the trigram GIN index on api_ontologysynonyms.synonym via %.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                similarity(s.synonym, query)::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                (similarity(s.synonym, query) * CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE s.synonym % query
+              AND s.synonym <> query
+        ) q
+        ORDER BY
+            q.id,
+            q.is_exact DESC,
+            q.overall_rank DESC,
+            q.scope_weight DESC,
+            q.sim DESC,
+            q.synonym NULLS LAST
+    ) d
+    ORDER BY
+        d.is_exact DESC,
+        d.overall_rank DESC,
+        d.scope_weight DESC,
+        d.sim DESC,
+        d.id
+    LIMIT max_results;
+$$ LANGUAGE sql;
+
+alter function search_onto(text, integer) owner to meta2onto;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_prefix_indexes_search_onto_prefix'),
+    ]
+
+    operations = [
+        RunSQL(
+            FUNC_DEFN,
+            reverse_sql=OLD_FUNC_DEFN,
+        ),
+    ]
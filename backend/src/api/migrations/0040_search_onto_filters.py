@@ -0,0 +1,744 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:20
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import BtreeGinExtension
+from django.db import migrations, models
+from django.db.migrations import RunSQL
+
+# adds optional ontology and type filters (ontology_filter, type_filter) to
+# search_onto and search_onto_prefix, applied in every branch.
+#
+# the filters are backed by composite GIN indexes over (ontology, type, name)
+# and (ontology, type, synonym), using btree_gin for the equality columns and
+# gin_trgm_ops for the text; to let synonym matches be filtered within the
+# index, ontology and type are denormalized onto api_ontologysynonyms.
+#
+# both functions are now plpgsql with plan_cache_mode = force_custom_plan, so
+# each call is planned with its actual arguments: "ontology_filter IS NULL OR
+# ..." then folds away when no filter is given, and the planner can pick the
+# composite indexes when one is.
+
+# backfills the denormalized columns on existing synonyms
+POPULATE_SYNONYM_FILTERS = """
+UPDATE api_ontologysynonyms s
+SET ontology = t.ontology, type = t.type
+FROM api_ontologyterms t
+WHERE t.id = s.term_id;
+"""
+
+FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto(text, integer);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean, text, text);
+
+CREATE FUNCTION search_onto(
+    query text,
+    max_results integer DEFAULT 50,
+    use_trigram boolean DEFAULT TRUE,
+    ontology_filter text DEFAULT NULL,
+    type_filter text DEFAULT NULL
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean
+)
+LANGUAGE plpgsql
+SET pg_trgm.similarity_threshold = 0.2
+SET plan_cache_mode = force_custom_plan
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+        SELECT
+            d.id, d.name, d.ontology, d.type,
+            d.synonym, d.scope,
+            d.sim, d.scope_weight, d.overall_rank, d.is_exact
+        FROM (
+            SELECT DISTINCT ON (q.id)
+                q.id, q.name, q.ontology, q.type,
+                q.synonym, q.scope,
+                q.sim, q.scope_weight, q.overall_rank, q.is_exact
+            FROM (
+                -- Branch 1: exact match on term id or name.
+                -- No similarity calculation; wins all ranking.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    1.0::real     AS sim,
+                    1.0::real     AS scope_weight,
+                    1.0::real     AS overall_rank,
+                    TRUE          AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE (t.id = query OR t.name = query)
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 2: exact match on a synonym.
+                -- Carries scope weight but no similarity cost.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    1.0::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS overall_rank,
+                    TRUE AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE s.synonym = query
+                  AND t.id    <> query
+                  AND t.name  <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 3: fuzzy name match.
+                -- Uses the trigram GIN index on api_ontologyterms.name via the %
+                -- operator (controlled by the pg_trgm.similarity_threshold = 0.2 SET
+                -- clause above, which replaces the previous > 0.2 threshold).
+                -- Skipped entirely (via a one-time filter) unless use_trigram.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    similarity(t.name, query)::real AS sim,
+                    1.0::real AS scope_weight,
+                    similarity(t.name, query)::real AS overall_rank,
+                    FALSE AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE use_trigram
+                  AND t.name % query
+                  AND t.name <> query
+                  AND t.id   <> query
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 4: fuzzy synonym match.
+                -- Uses the trigram GIN index on api_ontologysynonyms.synonym via %.
+                -- Skipped entirely (via a one-time filter) unless use_trigram.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    similarity(s.synonym, query)::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    (similarity(s.synonym, query) * CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END)::real AS overall_rank,
+                    FALSE AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE use_trigram
+                  AND s.synonym % query
+                  AND s.synonym <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 5: full-text name match.
+                -- Uses the tsvector GIN index api_ontoterms_name_tsv_idx; the
+                -- to_tsvector() expression must match the index's exactly.
+                -- The ts_rank (normalized to [0, 1) by flag 32) is added to the
+                -- trigram similarity, so a term matched by both branches outranks
+                -- one matched by either alone, and the DISTINCT ON below keeps
+                -- this fused row over the branch 3 row for the same term.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    similarity(t.name, query)::real AS sim,
+                    1.0::real AS scope_weight,
+                    (
+                        similarity(t.name, query)
+                        + ts_rank(
+                            to_tsvector('simple'::regconfig, COALESCE(t.name, '')),
+                            websearch_to_tsquery('simple'::regconfig, query),
+                            32
+                        )
+                    )::real AS overall_rank,
+                    FALSE AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE to_tsvector('simple'::regconfig, COALESCE(t.name, ''))
+                        @@ websearch_to_tsquery('simple'::regconfig, query)
+                  AND t.name <> query
+                  AND t.id   <> query
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 6: full-text synonym match.
+                -- Uses the tsvector GIN index api_ontosyn_syn_tsv_idx; scored as
+                -- in branch 5, then weighted by scope.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    similarity(s.synonym, query)::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    ((
+                        similarity(s.synonym, query)
+                        + ts_rank(
+                            to_tsvector('simple'::regconfig, COALESCE(s.synonym, '')),
+                            websearch_to_tsquery('simple'::regconfig, query),
+                            32
+                        )
+                    ) * CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END)::real AS overall_rank,
+                    FALSE AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE to_tsvector('simple'::regconfig, COALESCE(s.synonym, ''))
+                        @@ websearch_to_tsquery('simple'::regconfig, query)
+                  AND s.synonym <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+            ) q
+            ORDER BY
+                q.id,
+                q.is_exact DESC,
+                q.overall_rank DESC,
+                q.scope_weight DESC,
+                q.sim DESC,
+                q.synonym NULLS LAST
+        ) d
+        ORDER BY
+            d.is_exact DESC,
+            d.overall_rank DESC,
+            d.scope_weight DESC,
+            d.sim DESC,
+            d.id
+        LIMIT max_results;
+END;
+$$;
+
+alter function search_onto(text, integer, boolean, text, text) owner to meta2onto;
+"""
+
+# reverse: the version from 0039_search_onto_fulltext.py
+OLD_FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean, text, text);
+DROP FUNCTION IF EXISTS search_onto(text, integer);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean);
+
+CREATE FUNCTION search_onto(
+    query text,
+    max_results integer DEFAULT 50,
+    use_trigram boolean DEFAULT TRUE
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean
+)
+SET pg_trgm.similarity_threshold = 0.2
+AS $$
+    SELECT
+        d.id, d.name, d.ontology, d.type,
+        d.synonym, d.scope,
+        d.sim, d.scope_weight, d.overall_rank, d.is_exact
+    FROM (
+        SELECT DISTINCT ON (q.id)
+            q.id, q.name, q.ontology, q.type,
+            q.synonym, q.scope,
+            q.sim, q.scope_weight, q.overall_rank, q.is_exact
+        FROM (
+            -- Branch 1: exact match on term id or name.
+            -- No similarity calculation; wins all ranking.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                1.0::real     AS sim,
+                1.0::real     AS scope_weight,
+                1.0::real     AS overall_rank,
+                TRUE          AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE (t.id = query OR t.name = query)
+
+            UNION ALL
+
+            -- Branch 2: exact match on a synonym.
+            -- Carries scope weight but no similarity cost.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                1.0::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS overall_rank,
+                TRUE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE s.synonym = query
+              AND t.id    <> query
+              AND t.name  <> query
+
+            UNION ALL
+
+            -- Branch 3: fuzzy name match.
+            -- Uses the trigram GIN index on api_ontologyterms.name via the %
+            -- operator (controlled by the pg_trgm.similarity_threshold = 0.2 SET
+            -- clause above, which replaces the previous > 0.2 threshold).
+            -- Skipped entirely (via a one-time filter) unless use_trigram.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                similarity(t.name, query)::real AS sim,
+                1.0::real AS scope_weight,
+                similarity(t.name, query)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE use_trigram
+              AND t.name % query
+              AND t.name <> query
+              AND t.id   <> query
+
+            UNION ALL
+
+            -- Branch 4: fuzzy synonym match.
+            -- Uses the trigram GIN index on api_ontologysynonyms.synonym via %.
+            -- Skipped entirely (via a one-time filter) unless use_trigram.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                similarity(s.synonym, query)::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                (similarity(s.synonym, query) * CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE use_trigram
+              AND s.synonym % query
+              AND s.synonym <> query
+
+            UNION ALL
+
+            -- Branch 5: full-text name match.
+            -- Uses the tsvector GIN index api_ontoterms_name_tsv_idx; the
+            -- to_tsvector() expression must match the index's exactly.
+            -- The ts_rank (normalized to [0, 1) by flag 32) is added to the
+            -- trigram similarity, so a term matched by both branches outranks
+            -- one matched by either alone, and the DISTINCT ON below keeps
+            -- this fused row over the branch 3 row for the same term.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                similarity(t.name, query)::real AS sim,
+                1.0::real AS scope_weight,
+                (
+                    similarity(t.name, query)
+                    + ts_rank(
+                        to_tsvector('simple'::regconfig, COALESCE(t.name, '')),
+                        websearch_to_tsquery('simple'::regconfig, query),
+                        32
+                    )
+                )::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE to_tsvector('simple'::regconfig, COALESCE(t.name, ''))
+                    @@ websearch_to_tsquery('simple'::regconfig, query)
+              AND t.name <> query
+              AND t.id   <> query
+
+            UNION ALL
+
+            -- Branch 6: full-text synonym match.
+            -- Uses the tsvector GIN index api_ontosyn_syn_tsv_idx; scored as
+            -- in branch 5, then weighted by scope.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                similarity(s.synonym, query)::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                ((
+                    similarity(s.synonym, query)
+                    + ts_rank(
+                        to_tsvector('simple'::regconfig, COALESCE(s.synonym, '')),
+                        websearch_to_tsquery('simple'::regconfig, query),
+                        32
+                    )
+                ) * CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END)::real AS overall_rank,
+                FALSE AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            JOIN api_ontologysynonyms s ON s.term_id = t.id
+            WHERE to_tsvector('simple'::regconfig, COALESCE(s.synonym, ''))
+                    @@ websearch_to_tsquery('simple'::regconfig, query)
+              AND s.synonym <> query
+        ) q
+        ORDER BY
+            q.id,
+            q.is_exact DESC,
+            q.overall_rank DESC,
+            q.scope_weight DESC,
+            q.sim DESC,
+            q.synonym NULLS LAST
+    ) d
+    ORDER BY
+        d.is_exact DESC,
+        d.overall_rank DESC,
+        d.scope_weight DESC,
+        d.sim DESC,
+        d.id
+    LIMIT max_results;
+$$ LANGUAGE sql;
+
+alter function search_onto(text, integer, boolean) owner to meta2onto;
+"""
+
+PREFIX_FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto_prefix(text, integer);
+DROP FUNCTION IF EXISTS search_onto_prefix(text, integer, text, text);
+
+CREATE FUNCTION search_onto_prefix(
+    query text,
+    max_results integer DEFAULT 50,
+    ontology_filter text DEFAULT NULL,
+    type_filter text DEFAULT NULL
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean
+)
+LANGUAGE plpgsql
+SET plan_cache_mode = force_custom_plan
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+        SELECT
+            d.id, d.name, d.ontology, d.type,
+            d.synonym, d.scope,
+            d.sim, d.scope_weight, d.overall_rank, d.is_exact
+        FROM (
+            SELECT DISTINCT ON (q.id)
+                q.id, q.name, q.ontology, q.type,
+                q.synonym, q.scope,
+                q.sim, q.scope_weight, q.overall_rank, q.is_exact
+            FROM (
+                -- Branch 1: exact match on term id.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    1.0::real     AS sim,
+                    1.0::real     AS scope_weight,
+                    1.0::real     AS overall_rank,
+                    TRUE          AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE t.id = query
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 2: prefix match on name, via api_ontoterms_name_lower_idx.
+                -- Similarity is the fraction of the name covered by the query, so
+                -- shorter completions rank higher.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    (length(query)::real / length(t.name))::real AS sim,
+                    1.0::real AS scope_weight,
+                    (length(query)::real / length(t.name))::real AS overall_rank,
+                    lower(t.name) = lower(query) AS is_exact
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE lower(t.name) ~>=~ lower(query)
+                  AND lower(t.name) ~<~ (lower(query) || chr(1114111))
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 3: prefix match on a synonym, via api_ontosyn_syn_lower_idx.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    (length(query)::real / length(s.synonym))::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    (length(query)::real / length(s.synonym) * CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END)::real AS overall_rank,
+                    lower(s.synonym) = lower(query) AS is_exact
+                FROM api_ontologysynonyms s
+                JOIN api_ontologyterms t ON t.id = s.term_id
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE lower(s.synonym) ~>=~ lower(query)
+                  AND lower(s.synonym) ~<~ (lower(query) || chr(1114111))
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+            ) q
+            ORDER BY
+                q.id,
+                q.is_exact DESC,
+                q.overall_rank DESC,
+                q.scope_weight DESC,
+                q.sim DESC,
+                q.synonym NULLS LAST
+        ) d
+        ORDER BY
+            d.is_exact DESC,
+            d.overall_rank DESC,
+            d.scope_weight DESC,
+            d.sim DESC,
+            d.id
+        LIMIT max_results;
+END;
+$$;
+
+alter function search_onto_prefix(text, integer, text, text) owner to meta2onto;
+"""
+
+# reverse: the version from 0038_prefix_indexes_search_onto_prefix.py
+OLD_PREFIX_FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto_prefix(text, integer, text, text);
+DROP FUNCTION IF EXISTS search_onto_prefix(text, integer);
+
+CREATE FUNCTION search_onto_prefix(
+    query text,
+    max_results integer DEFAULT 50
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean
+)
+AS $$
+    SELECT
+        d.id, d.name, d.ontology, d.type,
+        d.synonym, d.scope,
+        d.sim, d.scope_weight, d.overall_rank, d.is_exact
+    FROM (
+        SELECT DISTINCT ON (q.id)
+            q.id, q.name, q.ontology, q.type,
+            q.synonym, q.scope,
+            q.sim, q.scope_weight, q.overall_rank, q.is_exact
+        FROM (
+            -- Branch 1: exact match on term id.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                1.0::real     AS sim,
+                1.0::real     AS scope_weight,
+                1.0::real     AS overall_rank,
+                TRUE          AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE t.id = query
+
+            UNION ALL
+
+            -- Branch 2: prefix match on name, via api_ontoterms_name_lower_idx.
+            -- Similarity is the fraction of the name covered by the query, so
+            -- shorter completions rank higher.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                NULL::varchar AS synonym,
+                NULL::varchar AS scope,
+                (length(query)::real / length(t.name))::real AS sim,
+                1.0::real AS scope_weight,
+                (length(query)::real / length(t.name))::real AS overall_rank,
+                lower(t.name) = lower(query) AS is_exact
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE lower(t.name) ~>=~ lower(query)
+              AND lower(t.name) ~<~ (lower(query) || chr(1114111))
+
+            UNION ALL
+
+            -- Branch 3: prefix match on a synonym, via api_ontosyn_syn_lower_idx.
+            SELECT
+                t.id, t.name, t.ontology, t.type,
+                s.synonym,
+                s.scope,
+                (length(query)::real / length(s.synonym))::real AS sim,
+                CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END::real AS scope_weight,
+                (length(query)::real / length(s.synonym) * CASE s.scope
+                    WHEN 'EXACT'   THEN 1.5
+                    WHEN 'NARROW'  THEN 1.3
+                    WHEN 'BROAD'   THEN 1.1
+                    WHEN 'RELATED' THEN 0.9
+                    ELSE 1.0
+                END)::real AS overall_rank,
+                lower(s.synonym) = lower(query) AS is_exact
+            FROM api_ontologysynonyms s
+            JOIN api_ontologyterms t ON t.id = s.term_id
+            JOIN api_ontologytermstats h ON h.term = t.id
+            WHERE lower(s.synonym) ~>=~ lower(query)
+              AND lower(s.synonym) ~<~ (lower(query) || chr(1114111))
+        ) q
+        ORDER BY
+            q.id,
+            q.is_exact DESC,
+            q.overall_rank DESC,
+            q.scope_weight DESC,
+            q.sim DESC,
+            q.synonym NULLS LAST
+    ) d
+    ORDER BY
+        d.is_exact DESC,
+        d.overall_rank DESC,
+        d.scope_weight DESC,
+        d.sim DESC,
+        d.id
+    LIMIT max_results;
+$$ LANGUAGE sql;
+
+alter function search_onto_prefix(text, integer) owner to meta2onto;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_search_onto_fulltext'),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        migrations.AddField(
+            model_name='ontologysynonyms',
+            name='ontology',
+            field=models.CharField(max_length=128, null=True),
+        ),
+        migrations.AddField(
+            model_name='ontologysynonyms',
+            name='type',
+            field=models.CharField(db_column='type', max_length=128, null=True),
+        ),
+        RunSQL(
+            POPULATE_SYNONYM_FILTERS,
+            reverse_sql=RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ontologysynonyms',
+            index=django.contrib.postgres.indexes.GinIndex(models.F('ontology'), models.F('type'), django.contrib.postgres.indexes.OpClass('synonym', name='gin_trgm_ops'), name='api_ontosyn_filt_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ontologyterms',
+            index=django.contrib.postgres.indexes.GinIndex(models.F('ontology'), models.F('type'), django.contrib.postgres.indexes.OpClass('name', name='gin_trgm_ops'), name='api_ontoterms_filt_trgm_idx'),
+        ),
+        RunSQL(
+            FUNC_DEFN,
+            reverse_sql=OLD_FUNC_DEFN,
+        ),
+        RunSQL(
+            PREFIX_FUNC_DEFN,
+            reverse_sql=OLD_PREFIX_FUNC_DEFN,
+        ),
+    ]
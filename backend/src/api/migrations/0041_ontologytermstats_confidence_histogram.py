@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:05
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+from django.db.migrations import RunSQL
+
+# adds a histogram of api_searchterm confidences (10 equal-width bins over
+# [0, 1]) to the per-term stats, for the ontology term detail endpoint, and
+# recomputes the stats so existing rows get theirs
+
+POPULATE_STATS = """
+TRUNCATE TABLE api_ontologytermstats;
+
+WITH buckets AS (
+    SELECT
+        st.term,
+        LEAST(GREATEST(width_bucket(st.confidence, 0, 1, 10), 1), 10) AS bucket,
+        COUNT(*) AS n
+    FROM api_searchterm st
+    GROUP BY 1, 2
+)
+INSERT INTO api_ontologytermstats (term, hit_count, confidence_histogram)
+SELECT
+    t.term,
+    SUM(COALESCE(b.n, 0)),
+    array_agg(COALESCE(b.n, 0) ORDER BY g.bucket)
+FROM (SELECT DISTINCT term FROM buckets) t
+CROSS JOIN generate_series(1, 10) AS g(bucket)
+LEFT JOIN buckets b ON b.term = t.term AND b.bucket = g.bucket
+GROUP BY t.term;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0040_search_onto_filters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ontologytermstats',
+            name='confidence_histogram',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None),
+        ),
+        RunSQL(
+            POPULATE_STATS,
+            reverse_sql=RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,586 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:15
+
+from django.contrib.postgres.operations import UnaccentExtension
+from django.db import migrations, models
+from django.db.migrations import RunSQL
+
+# adds normalized keys for ontology term names and synonyms (name_key,
+# synonym_key), with btree indexes, and makes search_onto's exact-match branches
+# compare them against the normalized query, so that e.g. "Asthma" or
+# "asthma," match "asthma" exactly rather than falling through to the fuzzy
+# branches.
+#
+# keys are computed by onto_norm_key(), both here and by the
+# import_ontology_search_duckdb command, so stored and query keys always agree.
+
+# lowercases, strips accents, and collapses runs of whitespace and punctuation
+# to single spaces. declared IMMUTABLE, which is safe as long as the unaccent
+# dictionary doesn't change, since it names that dictionary explicitly; this
+# lets calls on constants be folded at plan time.
+NORM_KEY_DEFN = """
+CREATE OR REPLACE FUNCTION onto_norm_key(value text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    SELECT btrim(
+        regexp_replace(
+            lower(public.unaccent('public.unaccent'::regdictionary, value)),
+            '[^[:alnum:]]+', ' ', 'g'
+        )
+    );
+$$;
+
+alter function onto_norm_key(text) owner to meta2onto;
+"""
+
+OLD_NORM_KEY_DEFN = """
+DROP FUNCTION IF EXISTS onto_norm_key(text);
+"""
+
+POPULATE_KEYS = """
+UPDATE api_ontologyterms SET name_key = onto_norm_key(name);
+UPDATE api_ontologysynonyms SET synonym_key = onto_norm_key(synonym);
+"""
+
+FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto(text, integer);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean, text, text);
+
+CREATE FUNCTION search_onto(
+    query text,
+    max_results integer DEFAULT 50,
+    use_trigram boolean DEFAULT TRUE,
+    ontology_filter text DEFAULT NULL,
+    type_filter text DEFAULT NULL
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean,
+    hit_count integer
+)
+LANGUAGE plpgsql
+SET pg_trgm.similarity_threshold = 0.2
+SET plan_cache_mode = force_custom_plan
+AS $$
+#variable_conflict use_column
+DECLARE
+    -- see onto_norm_key() above; computed once, so the exact-match branches
+    -- are planned as btree lookups on name_key and synonym_key
+    query_key text := onto_norm_key(query);
+BEGIN
+    RETURN QUERY
+        SELECT
+            d.id, d.name, d.ontology, d.type,
+            d.synonym, d.scope,
+            d.sim, d.scope_weight, d.overall_rank, d.is_exact, d.hit_count
+        FROM (
+            SELECT DISTINCT ON (q.id)
+                q.id, q.name, q.ontology, q.type,
+                q.synonym, q.scope,
+                q.sim, q.scope_weight,
+                -- boosts terms with more predicted series; applied after the
+                -- DISTINCT ON since it's the same for every row of a term
+                (q.overall_rank * (1 + 0.02 * ln(1 + q.hit_count)))::real AS overall_rank,
+                q.is_exact, q.hit_count
+            FROM (
+                -- Branch 1: exact match on term id or normalized name.
+                -- No similarity calculation; wins all ranking.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    1.0::real     AS sim,
+                    1.0::real     AS scope_weight,
+                    1.0::real     AS overall_rank,
+                    TRUE          AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE (t.id = query OR t.name_key = query_key)
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 2: exact match on a normalized synonym.
+                -- Carries scope weight but no similarity cost.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    1.0::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS overall_rank,
+                    TRUE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE s.synonym_key = query_key
+                  AND t.id       <> query
+                  AND t.name_key IS DISTINCT FROM query_key
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 3: fuzzy name match.
+                -- Uses the trigram GIN index on api_ontologyterms.name via the %
+                -- operator (controlled by the pg_trgm.similarity_threshold = 0.2 SET
+                -- clause above, which replaces the previous > 0.2 threshold).
+                -- Skipped entirely (via a one-time filter) unless use_trigram.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    similarity(t.name, query)::real AS sim,
+                    1.0::real AS scope_weight,
+                    similarity(t.name, query)::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE use_trigram
+                  AND t.name % query
+                  AND t.name <> query
+                  AND t.id   <> query
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 4: fuzzy synonym match.
+                -- Uses the trigram GIN index on api_ontologysynonyms.synonym via %.
+                -- Skipped entirely (via a one-time filter) unless use_trigram.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    similarity(s.synonym, query)::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    (similarity(s.synonym, query) * CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END)::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE use_trigram
+                  AND s.synonym % query
+                  AND s.synonym <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 5: full-text name match.
+                -- Uses the tsvector GIN index api_ontoterms_name_tsv_idx; the
+                -- to_tsvector() expression must match the index's exactly.
+                -- The ts_rank (normalized to [0, 1) by flag 32) is added to the
+                -- trigram similarity, so a term matched by both branches outranks
+                -- one matched by either alone, and the DISTINCT ON below keeps
+                -- this fused row over the branch 3 row for the same term.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    similarity(t.name, query)::real AS sim,
+                    1.0::real AS scope_weight,
+                    (
+                        similarity(t.name, query)
+                        + ts_rank(
+                            to_tsvector('simple'::regconfig, COALESCE(t.name, '')),
+                            websearch_to_tsquery('simple'::regconfig, query),
+                            32
+                        )
+                    )::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE to_tsvector('simple'::regconfig, COALESCE(t.name, ''))
+                        @@ websearch_to_tsquery('simple'::regconfig, query)
+                  AND t.name <> query
+                  AND t.id   <> query
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 6: full-text synonym match.
+                -- Uses the tsvector GIN index api_ontosyn_syn_tsv_idx; scored as
+                -- in branch 5, then weighted by scope.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    similarity(s.synonym, query)::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    ((
+                        similarity(s.synonym, query)
+                        + ts_rank(
+                            to_tsvector('simple'::regconfig, COALESCE(s.synonym, '')),
+                            websearch_to_tsquery('simple'::regconfig, query),
+                            32
+                        )
+                    ) * CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END)::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE to_tsvector('simple'::regconfig, COALESCE(s.synonym, ''))
+                        @@ websearch_to_tsquery('simple'::regconfig, query)
+                  AND s.synonym <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+            ) q
+            ORDER BY
+                q.id,
+                q.is_exact DESC,
+                q.overall_rank DESC,
+                q.scope_weight DESC,
+                q.sim DESC,
+                q.synonym NULLS LAST
+        ) d
+        ORDER BY
+            d.is_exact DESC,
+            d.overall_rank DESC,
+            d.scope_weight DESC,
+            d.sim DESC,
+            d.hit_count DESC,
+            d.id
+        LIMIT max_results;
+END;
+$$;
+
+alter function search_onto(text, integer, boolean, text, text) owner to meta2onto;
+"""
+
+# reverse: the version from 0042_search_onto_hit_count.py
+OLD_FUNC_DEFN = """
+DROP FUNCTION IF EXISTS search_onto(text, integer);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean);
+DROP FUNCTION IF EXISTS search_onto(text, integer, boolean, text, text);
+
+CREATE FUNCTION search_onto(
+    query text,
+    max_results integer DEFAULT 50,
+    use_trigram boolean DEFAULT TRUE,
+    ontology_filter text DEFAULT NULL,
+    type_filter text DEFAULT NULL
+)
+RETURNS TABLE (
+    id varchar, name varchar, ontology varchar, type varchar,
+    synonym varchar, scope varchar,
+    sim real, scope_weight real, overall_rank real, is_exact boolean,
+    hit_count integer
+)
+LANGUAGE plpgsql
+SET pg_trgm.similarity_threshold = 0.2
+SET plan_cache_mode = force_custom_plan
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+        SELECT
+            d.id, d.name, d.ontology, d.type,
+            d.synonym, d.scope,
+            d.sim, d.scope_weight, d.overall_rank, d.is_exact, d.hit_count
+        FROM (
+            SELECT DISTINCT ON (q.id)
+                q.id, q.name, q.ontology, q.type,
+                q.synonym, q.scope,
+                q.sim, q.scope_weight,
+                -- boosts terms with more predicted series; applied after the
+                -- DISTINCT ON since it's the same for every row of a term
+                (q.overall_rank * (1 + 0.02 * ln(1 + q.hit_count)))::real AS overall_rank,
+                q.is_exact, q.hit_count
+            FROM (
+                -- Branch 1: exact match on term id or name.
+                -- No similarity calculation; wins all ranking.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    1.0::real     AS sim,
+                    1.0::real     AS scope_weight,
+                    1.0::real     AS overall_rank,
+                    TRUE          AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE (t.id = query OR t.name = query)
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 2: exact match on a synonym.
+                -- Carries scope weight but no similarity cost.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    1.0::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS overall_rank,
+                    TRUE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE s.synonym = query
+                  AND t.id    <> query
+                  AND t.name  <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 3: fuzzy name match.
+                -- Uses the trigram GIN index on api_ontologyterms.name via the %
+                -- operator (controlled by the pg_trgm.similarity_threshold = 0.2 SET
+                -- clause above, which replaces the previous > 0.2 threshold).
+                -- Skipped entirely (via a one-time filter) unless use_trigram.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    similarity(t.name, query)::real AS sim,
+                    1.0::real AS scope_weight,
+                    similarity(t.name, query)::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE use_trigram
+                  AND t.name % query
+                  AND t.name <> query
+                  AND t.id   <> query
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 4: fuzzy synonym match.
+                -- Uses the trigram GIN index on api_ontologysynonyms.synonym via %.
+                -- Skipped entirely (via a one-time filter) unless use_trigram.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    similarity(s.synonym, query)::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    (similarity(s.synonym, query) * CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END)::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE use_trigram
+                  AND s.synonym % query
+                  AND s.synonym <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 5: full-text name match.
+                -- Uses the tsvector GIN index api_ontoterms_name_tsv_idx; the
+                -- to_tsvector() expression must match the index's exactly.
+                -- The ts_rank (normalized to [0, 1) by flag 32) is added to the
+                -- trigram similarity, so a term matched by both branches outranks
+                -- one matched by either alone, and the DISTINCT ON below keeps
+                -- this fused row over the branch 3 row for the same term.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    NULL::varchar AS synonym,
+                    NULL::varchar AS scope,
+                    similarity(t.name, query)::real AS sim,
+                    1.0::real AS scope_weight,
+                    (
+                        similarity(t.name, query)
+                        + ts_rank(
+                            to_tsvector('simple'::regconfig, COALESCE(t.name, '')),
+                            websearch_to_tsquery('simple'::regconfig, query),
+                            32
+                        )
+                    )::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                WHERE to_tsvector('simple'::regconfig, COALESCE(t.name, ''))
+                        @@ websearch_to_tsquery('simple'::regconfig, query)
+                  AND t.name <> query
+                  AND t.id   <> query
+                  AND (ontology_filter IS NULL OR t.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR t.type = type_filter)
+
+                UNION ALL
+
+                -- Branch 6: full-text synonym match.
+                -- Uses the tsvector GIN index api_ontosyn_syn_tsv_idx; scored as
+                -- in branch 5, then weighted by scope.
+                SELECT
+                    t.id, t.name, t.ontology, t.type,
+                    s.synonym,
+                    s.scope,
+                    similarity(s.synonym, query)::real AS sim,
+                    CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END::real AS scope_weight,
+                    ((
+                        similarity(s.synonym, query)
+                        + ts_rank(
+                            to_tsvector('simple'::regconfig, COALESCE(s.synonym, '')),
+                            websearch_to_tsquery('simple'::regconfig, query),
+                            32
+                        )
+                    ) * CASE s.scope
+                        WHEN 'EXACT'   THEN 1.5
+                        WHEN 'NARROW'  THEN 1.3
+                        WHEN 'BROAD'   THEN 1.1
+                        WHEN 'RELATED' THEN 0.9
+                        ELSE 1.0
+                    END)::real AS overall_rank,
+                    FALSE AS is_exact,
+                    h.hit_count
+                FROM api_ontologyterms t
+                JOIN api_ontologytermstats h ON h.term = t.id
+                JOIN api_ontologysynonyms s ON s.term_id = t.id
+                WHERE to_tsvector('simple'::regconfig, COALESCE(s.synonym, ''))
+                        @@ websearch_to_tsquery('simple'::regconfig, query)
+                  AND s.synonym <> query
+                  AND (ontology_filter IS NULL OR s.ontology = ontology_filter)
+                  AND (type_filter IS NULL OR s.type = type_filter)
+            ) q
+            ORDER BY
+                q.id,
+                q.is_exact DESC,
+                q.overall_rank DESC,
+                q.scope_weight DESC,
+                q.sim DESC,
+                q.synonym NULLS LAST
+        ) d
+        ORDER BY
+            d.is_exact DESC,
+            d.overall_rank DESC,
+            d.scope_weight DESC,
+            d.sim DESC,
+            d.hit_count DESC,
+            d.id
+        LIMIT max_results;
+END;
+$$;
+
+alter function search_onto(text, integer, boolean, text, text) owner to meta2onto;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0042_search_onto_hit_count'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        RunSQL(
+            NORM_KEY_DEFN,
+            reverse_sql=OLD_NORM_KEY_DEFN,
+        ),
+        migrations.AddField(
+            model_name='ontologysynonyms',
+            name='synonym_key',
+            field=models.CharField(max_length=512, null=True),
+        ),
+        migrations.AddField(
+            model_name='ontologyterms',
+            name='name_key',
+            field=models.CharField(max_length=512, null=True),
+        ),
+        RunSQL(
+            POPULATE_KEYS,
+            reverse_sql=RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ontologysynonyms',
+            index=models.Index(fields=['synonym_key'], name='api_ontosyn_syn_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ontologyterms',
+            index=models.Index(fields=['name_key'], name='api_ontoterms_name_key_idx'),
+        ),
+        RunSQL(
+            FUNC_DEFN,
+            reverse_sql=OLD_FUNC_DEFN,
+        ),
+    ]
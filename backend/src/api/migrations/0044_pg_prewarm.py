@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:05
+
+from django.db import migrations
+from django.db.migrations import RunSQL
+
+# enables pg_prewarm, which the warmup command uses to load the search tables
+# and their trigram indexes into shared buffers after a restart or restore
+# (see api.utils.warmup)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0043_normalized_term_keys"),
+    ]
+
+    operations = [
+        RunSQL(
+            "CREATE EXTENSION IF NOT EXISTS pg_prewarm;",
+            reverse_sql="",
+        ),
+    ]
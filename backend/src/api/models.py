@@ -1,6 +1,6 @@
 import uuid
 
-from django.db import models
+from django.db import connection, models, router, transaction
 from django.db.models import (
     Case,
     When,
@@ -12,10 +12,10 @@ from django.db.models import (
     OuterRef,
     Subquery,
 )
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Coalesce, Lower
 from django.db.models.sql.constants import INNER
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.contrib.postgres.search import TrigramSimilarity, SearchVector
 from django.contrib.postgres.fields import ArrayField
 
@@ -508,27 +508,156 @@ class OntologyTermRating(models.Model):
     performance = models.CharField(max_length=64)
     type = models.CharField(max_length=64)
 
+
+class OntologyTermStatsManager(models.Manager):
+    def refresh(self):
+        """
+        Recompute the per-term statistics from api_searchterm. Should be run
+        after api_searchterm is (re)imported.
+        """
+        table = self.model._meta.db_table
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"TRUNCATE TABLE {table};")
+                cursor.execute(
+                    f"""
+                    WITH buckets AS (
+                        -- confidences of exactly 1 go in the last bin, rather
+                        -- than the overflow bucket width_bucket() puts them in
+                        SELECT
+                            st.term,
+                            LEAST(
+                                GREATEST(width_bucket(st.confidence, 0, 1, %(bins)s), 1),
+                                %(bins)s
+                            ) AS bucket,
+                            COUNT(*) AS n
+                        FROM api_searchterm st
+                        GROUP BY 1, 2
+                    )
+                    INSERT INTO {table} (term, hit_count, confidence_histogram)
+                    SELECT
+                        t.term,
+                        SUM(COALESCE(b.n, 0)),
+                        array_agg(COALESCE(b.n, 0) ORDER BY g.bucket)
+                    FROM (SELECT DISTINCT term FROM buckets) t
+                    CROSS JOIN generate_series(1, %(bins)s) AS g(bucket)
+                    LEFT JOIN buckets b ON b.term = t.term AND b.bucket = g.bucket
+                    GROUP BY t.term;
+                    """,
+                    {"bins": self.model.CONFIDENCE_BINS},
+                )
+        return self.count()
+
+
+class OntologyTermStats(models.Model):
+    """
+    Statistics precomputed per ontology term from api_searchterm: the number
+    of rows (i.e., predicted series) for each term, and a histogram of their
+    confidences.
+
+    A term has a row here iff it has at least one row in api_searchterm, so
+    search_onto() joins against this small table to restrict its results to
+    searchable terms rather than probing api_searchterm for each candidate.
+    Populated via OntologyTermStats.objects.refresh(), which the search term
+    import commands run once they finish.
+    """
+
+    objects = OntologyTermStatsManager()
+
+    # number of equal-width bins over [0, 1] in confidence_histogram
+    CONFIDENCE_BINS = 10
+
+    term = models.CharField(max_length=256, primary_key=True)
+    hit_count = models.IntegerField()
+    # count of api_searchterm rows per confidence bin, lowest first
+    confidence_histogram = ArrayField(models.IntegerField(), default=list)
+
+    @classmethod
+    def confidence_bin_edges(cls):
+        return [i / cls.CONFIDENCE_BINS for i in range(cls.CONFIDENCE_BINS + 1)]
+
+    def __str__(self):
+        return f"{self.term}: {self.hit_count} hits"
+
 # ===========================================================================
 # === Ontology search terms from meta-hq
 # ===========================================================================
 
 
 class OntologySearchResultsManager(models.Manager):
-    def search(self, query: str, max_results: int = 5000):
+    # SQL function calls implementing each search strategy; all return the same
+    # columns and take the same optional ontology and type filters
+    STRATEGY_FUNCTIONS = {
+        # fuzzy matching via trigram similarity, fused with full-text ranking
+        # (search_onto, see migrations 0039 and 0040)
+        "trigram": "search_onto(%(query)s, %(max_results)s, {filters})",
+        # full-text matching only, via the tsvector indexes, for multi-word queries
+        "fulltext": "search_onto(%(query)s, %(max_results)s, use_trigram => false, {filters})",
+        # prefix matching via btree indexes, for short queries (migration 0038)
+        "prefix": "search_onto_prefix(%(query)s, %(max_results)s, {filters})",
+    }
+    FILTER_ARGS = "ontology_filter => %(ontology)s::text, type_filter => %(type)s::text"
+
+    def search_sql(
+        self,
+        query: str,
+        max_results: int = 5000,
+        strategy: str = "trigram",
+        ontology: str | None = None,
+        type: str | None = None,
+    ):
+        """Return the SQL and parameters that search() runs."""
+        func = self.STRATEGY_FUNCTIONS[strategy].format(filters=self.FILTER_ARGS)
+        sql = f"""
+            SELECT so.*, otr.performance FROM {func} AS so
+            LEFT JOIN api_ontologytermrating AS otr ON otr.term = so.id
+            """
+        params = {
+            "query": query,
+            "max_results": max_results,
+            "ontology": ontology,
+            "type": type,
+        }
+        return sql, params
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 5000,
+        strategy: str = "trigram",
+        ontology: str | None = None,
+        type: str | None = None,
+    ):
         """
         Perform a search for the given query string across ontology terms + synonyms.
 
         Returns api_ontologyterms left-joined w/api_ontologysynonyms, filtered to
         only terms present in api_searchterm (handled inside the SQL function).
+
+        The strategy selects the SQL function used to find matches; see
+        STRATEGY_FUNCTIONS. If given, ontology and type restrict the results to
+        terms from that ontology and of that type.
         """
-        qs = self.get_queryset().raw(
-            """
-            SELECT so.*, otr.performance FROM search_onto(%(query)s, %(max_results)s) AS so
-            LEFT JOIN api_ontologytermrating AS otr ON otr.term = so.id
-            """,
-            {"query": query, "max_results": max_results},
-        )
-        return qs
+        sql, params = self.search_sql(query, max_results, strategy, ontology, type)
+        return self.get_queryset().raw(sql, params)
+
+    async def asearch(
+        self,
+        query: str,
+        max_results: int = 5000,
+        strategy: str = "trigram",
+        ontology: str | None = None,
+        type: str | None = None,
+    ):
+        """
+        Like search(), but run on an async connection (see api.utils.async_db);
+        returns a list of OntologySearchResults rather than a RawQuerySet.
+        """
+        from .utils.async_db import fetch_all, to_instances
+
+        sql, params = self.search_sql(query, max_results, strategy, ontology, type)
+        rows = await fetch_all(sql, params, using=router.db_for_read(self.model))
+        return to_instances(self.model, rows)
 
     def search_series(self, query: str, max_results: int = 5000):
         """
@@ -571,6 +700,8 @@ class OntologySearchResults(models.Model):
     scope_weight = models.FloatField()
     overall_rank = models.FloatField()
     is_exact = models.BooleanField()
+    # number of predicted series for the term, from api_ontologytermstats
+    hit_count = models.IntegerField()
 
     # joined in from the api_ontologytermrating table
     performance = models.CharField(max_length=64, null=True, blank=True)
@@ -614,6 +745,12 @@ class OntologySynonyms(models.Model):
     term_id = models.CharField(max_length=256)
     synonym = models.CharField(max_length=512)
     scope = models.CharField(max_length=64, db_column="scope")
+    # synonym as normalized by the onto_norm_key() SQL function, for exact matches
+    synonym_key = models.CharField(max_length=512, null=True)
+    # denormalized from the synonym's OntologyTerms row, so that search_onto()
+    # can filter synonym matches by ontology and type from a single index
+    ontology = models.CharField(max_length=128, null=True)
+    type = models.CharField(max_length=128, db_column="type", null=True)
 
     class Meta:
         indexes = [
@@ -630,6 +767,20 @@ class OntologySynonyms(models.Model):
                 name="api_ontosyn_syn_trgm_idx",
                 opclasses=["gin_trgm_ops"],
             ),
+            # btree index on lower(synonym) for prefix-matching short queries
+            models.Index(
+                OpClass(Lower("synonym"), name="text_pattern_ops"),
+                name="api_ontosyn_syn_lower_idx",
+            ),
+            # composite (btree_gin) trigram index for ontology/type-filtered searches
+            GinIndex(
+                "ontology",
+                "type",
+                OpClass("synonym", name="gin_trgm_ops"),
+                name="api_ontosyn_filt_trgm_idx",
+            ),
+            # btree index on the normalized synonym, for exact matches
+            models.Index(fields=["synonym_key"], name="api_ontosyn_syn_key_idx"),
         ]
 
     def __str__(self):
@@ -645,6 +796,8 @@ class OntologyTerms(models.Model):
     name = models.CharField(max_length=512)
     ontology = models.CharField(max_length=128)
     type = models.CharField(max_length=128, db_column="type")
+    # name as normalized by the onto_norm_key() SQL function, for exact matches
+    name_key = models.CharField(max_length=512, null=True)
 
     class Meta:
         indexes = [
@@ -662,6 +815,20 @@ class OntologyTerms(models.Model):
                 name="api_ontoterms_name_trgm_idx",
                 opclasses=["gin_trgm_ops"],
             ),
+            # btree index on lower(name) for prefix-matching short queries
+            models.Index(
+                OpClass(Lower("name"), name="text_pattern_ops"),
+                name="api_ontoterms_name_lower_idx",
+            ),
+            # composite (btree_gin) trigram index for ontology/type-filtered searches
+            GinIndex(
+                "ontology",
+                "type",
+                OpClass("name", name="gin_trgm_ops"),
+                name="api_ontoterms_filt_trgm_idx",
+            ),
+            # btree index on the normalized name, for exact matches
+            models.Index(fields=["name_key"], name="api_ontoterms_name_key_idx"),
         ]
 
     def __str__(self):
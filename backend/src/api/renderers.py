@@ -0,0 +1,41 @@
+"""
+The API's default renderer (see REST_FRAMEWORK in meta2onto/settings.py).
+
+ORJSONRenderer produces the same JSON as DRF's JSONRenderer, but encodes it
+with orjson, which is several times faster than the standard library's json
+module on large responses like study search pages and lookups (see
+benchmarks/renderers.py).
+"""
+
+import orjson
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# values orjson doesn't encode natively (e.g., Decimal, lazy translations,
+# querysets) are converted by DRF's encoder, as JSONRenderer would
+_drf_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Renders JSON via orjson, with the same output as JSONRenderer."""
+
+    # datetimes go through DRF's encoder too, since orjson formats them
+    # differently (e.g., "+00:00" rather than "Z"); dicts with non-str keys are
+    # allowed, as the standard library's json module allows them
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        options = self.OPTIONS
+        renderer_context = renderer_context or {}
+        # orjson only supports an indent of 2, used for any requested indent
+        if self.get_indent(accepted_media_type, renderer_context):
+            options |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=_drf_encoder.default, option=options)
+        # as JSONRenderer does, escape the line separators that are valid in
+        # JSON but not in JavaScript string literals
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
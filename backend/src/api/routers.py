@@ -0,0 +1,157 @@
+"""
+Routes the API's reads to read replicas (see POSTGRES_REPLICAS in
+meta2onto/settings.py), keeping writes on the primary ("default") database.
+
+Apart from carts and feedback, the API only reads, so every other api model is
+read from a replica chosen at random among those that are reachable and no
+more than REPLICA_MAX_LAG_SECONDS behind the primary. Carts and feedback (and
+Django's own apps, e.g. sessions and auth) are always read from the primary,
+so, e.g., a cart can be read back right after it's created.
+
+Within a request, every read goes to the same replica, chosen on its first
+read (see ReplicaPinningMiddleware), so that, e.g., a study search's count,
+page and facets, which may run on separate threads, agree with each other.
+Reads outside a request go to a replica chosen per query.
+
+Replica lag is polled by a background thread in each worker, on a connection
+to each replica that it keeps open, so that routing never waits on a replica;
+until the first poll completes, and whenever no replica qualifies, reads fall
+back to the primary.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+from contextvars import ContextVar
+
+import psycopg
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .utils.async_db import conninfo
+
+logger = logging.getLogger(__name__)
+
+# seconds of replication lag; zero on a primary (or a stand-in that isn't
+# replicating), and on a replica that has replayed everything it has received,
+# since pg_last_xact_replay_timestamp() doesn't advance while the primary is idle
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+# api models that the API writes, which are therefore only read from the primary
+PRIMARY_MODELS = {"cart", "cartitem", "feedback"}
+
+# the current request's pinned read database, under "alias" once it's been
+# chosen; shared by the threads and tasks the request's queries run on, which
+# inherit the context (see api.utils.parallel)
+request_reads: ContextVar[dict | None] = ContextVar("request_reads", default=None)
+
+
+class ReplicaMonitor:
+    """
+    Tracks each replica's lag, polled every REPLICA_LAG_CHECK_SECONDS by a
+    background thread that's started on first use in each process.
+    """
+
+    def __init__(self, aliases):
+        self.aliases = list(aliases)
+        # alias -> lag in seconds, or None if the replica couldn't be reached
+        self.lags: dict[str, float | None] = {}
+        # alias -> open connection, only used by the monitor thread
+        self._conns: dict[str, psycopg.Connection] = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def usable(self) -> list[str]:
+        """Replicas that are reachable and within REPLICA_MAX_LAG_SECONDS."""
+        self._ensure_started()
+        return [
+            alias
+            for alias in self.aliases
+            if (lag := self.lags.get(alias)) is not None
+            and lag <= settings.REPLICA_MAX_LAG_SECONDS
+        ]
+
+    def _ensure_started(self):
+        # threads don't survive a fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self.lags = {}
+                # inherited connections belong to the parent's thread
+                self._conns = {}
+                threading.Thread(
+                    target=self._run, name="replica-monitor", daemon=True
+                ).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self.check()
+            time.sleep(settings.REPLICA_LAG_CHECK_SECONDS)
+
+    def check(self):
+        for alias in self.aliases:
+            self.lags[alias] = self.measure_lag(alias)
+
+    def measure_lag(self, alias: str) -> float | None:
+        try:
+            conn = self._conns.get(alias)
+            if conn is None or conn.closed:
+                # autocommit, so that now() isn't frozen at a transaction's start
+                conn = self._conns[alias] = psycopg.connect(
+                    conninfo(alias), connect_timeout=5, autocommit=True
+                )
+            lag = conn.execute(REPLICA_LAG_SQL).fetchone()[0]
+        except psycopg.Error as e:
+            logger.warning("Couldn't check replica %s, not reading from it: %s", alias, e)
+            # reconnect on the next check
+            if (conn := self._conns.pop(alias, None)) is not None:
+                conn.close()
+            return None
+        return float(lag)
+
+
+class ReplicaRouter:
+    """Sends reads of read-only api models to replicas, and the rest to the primary."""
+
+    def __init__(self):
+        self.monitor = ReplicaMonitor(
+            alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS
+        )
+
+    def db_for_read(self, model, **hints):
+        opts = model._meta
+        if opts.app_label != "api" or opts.model_name in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        pinned = request_reads.get()
+        if pinned is not None and "alias" in pinned:
+            return pinned["alias"]
+
+        replicas = self.monitor.usable()
+        alias = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        if pinned is not None:
+            # setdefault, since concurrent queries may be choosing at once
+            alias = pinned.setdefault("alias", alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary by replication
+        return db == DEFAULT_DB_ALIAS
@@ -1,7 +1,10 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 from .models import (
     GEOSample,
     GEOSeries,
+    GEOSeriesDatabase,
     GEOSeriesToGEOPlatforms,
     Organism,
     GEOPlatform,
@@ -12,6 +15,7 @@ from .models import (
     OntologySearchDocs,
     OntologySynonyms,
     OntologyTerms,
+    OntologyTermStats,
     Cart,
     CartItem,
 )
@@ -55,6 +59,8 @@ class OntologySearchResultsSerializer(serializers.ModelSerializer):
     description = serializers.CharField(source="name", read_only=True)
     series = serializers.CharField(source="name", read_only=True)
 
+    # responses are cached for a long time; bump
+    # api.utils.cache.ONTOLOGY_SEARCH_SCHEMA_VERSION when changing the fields
     class Meta:
         model = OntologySearchResults
         fields = [
@@ -70,6 +76,7 @@ class OntologySearchResultsSerializer(serializers.ModelSerializer):
             "scope_weight",
             "overall_rank",
             "is_exact",
+            "hit_count",
 
             # joined in from the api_ontologytermrating table
             "performance",
@@ -120,6 +127,55 @@ class OntologyTermsSerializer(serializers.ModelSerializer):
         ]
 
 
+# synonym scopes, most specific first, per the OBO 1.4 spec
+SYNONYM_SCOPES = ["EXACT", "NARROW", "BROAD", "RELATED"]
+
+
+class OntologyTermDetailSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a single OntologyTerms row with its synonyms, rating and
+    precomputed stats. Expects the performance, hit_count and
+    confidence_histogram annotations added by api.views.ontology_term_detail.
+    """
+
+    synonyms = serializers.SerializerMethodField()
+    performance = serializers.CharField(read_only=True, allow_null=True)
+    hit_count = serializers.IntegerField(read_only=True)
+    confidence_histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OntologyTerms
+        fields = [
+            "id",
+            "name",
+            "ontology",
+            "type",
+            "synonyms",
+            "performance",
+            "hit_count",
+            "confidence_histogram",
+        ]
+
+    def get_synonyms(self, obj):
+        """Synonyms grouped by scope; those with no scope are treated as RELATED."""
+        groups = {scope: [] for scope in SYNONYM_SCOPES}
+        rows = (
+            OntologySynonyms.objects.filter(term_id=obj.id)
+            .order_by("synonym")
+            .values_list("synonym", "scope")
+        )
+        for synonym, scope in rows:
+            groups.setdefault(scope or "RELATED", []).append(synonym)
+        return groups
+
+    def get_confidence_histogram(self, obj):
+        counts = obj.confidence_histogram or [0] * OntologyTermStats.CONFIDENCE_BINS
+        return {
+            "bin_edges": OntologyTermStats.confidence_bin_edges(),
+            "counts": counts,
+        }
+
+
 # ===========================================================================
 # === GEO Metadata
 # ===========================================================================
@@ -132,7 +188,16 @@ class GEOPlatformSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 class GEOSeriesSerializer(serializers.ModelSerializer):
-    """Serializer for GEOSeries model."""
+    """
+    Serializer for GEOSeries model. If given, the fields argument restricts the
+    output to those fields (a sparse fieldset).
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
     sample_count = serializers.SerializerMethodField(read_only=True)
 
@@ -223,6 +288,163 @@ class GEOSeriesSerializer(serializers.ModelSerializer):
             "classification",
         ]
 
+class GEOSeriesValuesSerializer:
+    """
+    Lean equivalent of GEOSeriesSerializer(..., many=True) for the study search
+    and lookup endpoints, which serialize up to a page of series per request.
+
+    Works on rows from values(), i.e. dicts of just the columns and annotations
+    the output needs, and builds each output dict directly rather than through
+    DRF's per-field machinery; each page's databases and platforms are fetched
+    with one query apiece rather than one per series. The output is the same
+    as GEOSeriesSerializer's (see api.tests.GEOSeriesValuesSerializerTests),
+    including for sparse fieldsets (the fields argument).
+    """
+
+    # output field -> GEOSeries column, for fields that are rendered as-is
+    COLUMN_FIELDS = {
+        "name": "title",
+        "id": "gse",
+        "status": "status",
+        "submitted_at": "submission_date",
+        "last_update_date": "last_update_date",
+        "pubmed_id": "pubmed_id",
+        "summary": "summary",
+        "description": "summary",
+        "type": "type",
+        "contributor": "contributor",
+        "web_link": "web_link",
+        "overall_design": "overall_design",
+        "repeats": "repeats",
+        "repeats_sample_list": "repeats_sample_list",
+        "variable": "variable",
+        "variable_description": "variable_description",
+        "contact": "contact",
+        "supplementary_file": "supplementary_file",
+    }
+
+    # annotation -> the output field rendered from it; annotations are used if
+    # present (see GEOSeriesManager.search), and series without them are
+    # rendered as GEOSeriesSerializer renders them, i.e. as unknown
+    ANNOTATIONS = {
+        "prob": "confidence",
+        "keywords": "keywords",
+        "samples_ct": "sample_count",
+    }
+
+    def __init__(self, rows, related_rows=None, fields=None):
+        """
+        rows are from values_queryset(); related_rows are the rows of
+        related_querysets() for them, which are fetched if not given. fields
+        restricts the output to those fields, as for GEOSeriesSerializer.
+        """
+        self.rows = rows
+        self.related_rows = related_rows
+        # in GEOSeriesSerializer's order, whatever order they're given in
+        fields = [f for f in GEOSeriesSerializer.Meta.fields if not fields or f in fields]
+        self.fields = fields
+        self._column_fields = [
+            (field, self.COLUMN_FIELDS[field]) for field in fields if field in self.COLUMN_FIELDS
+        ]
+        self._other_fields = {field for field in fields if field not in self.COLUMN_FIELDS}
+
+    @classmethod
+    def columns(cls, fields=None):
+        """The GEOSeries columns needed to render the given fields (default: all)."""
+        fields = fields or GEOSeriesSerializer.Meta.fields
+        # the pk is always needed, e.g. to fetch the related rows
+        columns = ["gse", *(cls.COLUMN_FIELDS[f] for f in fields if f in cls.COLUMN_FIELDS)]
+        return list(dict.fromkeys(columns))
+
+    @classmethod
+    def values_queryset(cls, queryset, fields=None):
+        """Restrict a GEOSeries queryset to the values needed to serialize it."""
+        fields = fields or GEOSeriesSerializer.Meta.fields
+        annotations = [
+            annotation
+            for annotation, field in cls.ANNOTATIONS.items()
+            if field in fields and annotation in queryset.query.annotations
+        ]
+        return queryset.values(*cls.columns(fields), *annotations)
+
+    @staticmethod
+    def related_querysets(gses, fields=None):
+        """
+        The database and platform rows for the given series' GSEs, by output
+        field, for those of the given fields (default: all) that need them.
+        """
+        fields = fields or GEOSeriesSerializer.Meta.fields
+        querysets = {}
+        if "database" in fields:
+            querysets["database"] = (
+                GEOSeriesDatabase.objects.filter(series_id__in=gses)
+                .order_by("pk")
+                .values("series_id", "database_name")
+            )
+        if "platform" in fields:
+            # as GEOSeriesSerializer.get_platform does, use the first mapping per GSE
+            querysets["platform"] = (
+                GEOSeriesToGEOPlatforms.objects.filter(gse__in=gses)
+                .order_by("pk")
+                .values("gse", "platforms")
+            )
+        return querysets
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        related_rows = self.related_rows
+        if related_rows is None:
+            querysets = self.related_querysets([row["gse"] for row in rows], self.fields)
+            related_rows = {name: list(qs) for name, qs in querysets.items()}
+
+        databases = defaultdict(list)
+        for row in related_rows.get("database", []):
+            databases[row["series_id"]].append(row["database_name"])
+
+        platforms = {}
+        for row in related_rows.get("platform", []):
+            platforms.setdefault(row["gse"], str(row["platforms"]))
+
+        return [
+            self.to_representation(row, databases[row["gse"]], platforms.get(row["gse"], ""))
+            for row in rows
+        ]
+
+    def to_representation(self, row, databases, platform):
+        # in GEOSeriesSerializer's field order, the column fields all come first
+        ret = {field: row[column] for field, column in self._column_fields}
+        if "submitted_at" in ret:
+            # DRF's DateTimeField renders empty strings as null
+            ret["submitted_at"] = ret["submitted_at"] or None
+
+        fields = self._other_fields
+        if "confidence" in fields:
+            prob = row.get("prob")
+            if prob is None:
+                label = "unknown"
+            elif prob >= 0.8:
+                label = "high"
+            elif prob >= 0.5:
+                label = "medium"
+            else:
+                label = "low"
+            ret["confidence"] = {"name": label, "value": prob}
+        if "sample_count" in fields:
+            samples_ct = row.get("samples_ct")
+            ret["sample_count"] = samples_ct if samples_ct is not None else 0
+        if "database" in fields:
+            ret["database"] = databases
+        if "platform" in fields:
+            ret["platform"] = platform
+        if "keywords" in fields:
+            keywords = row.get("keywords")
+            ret["keywords"] = [kw.strip() for kw in keywords.split(",")] if keywords else []
+        if "classification" in fields:
+            ret["classification"] = "Positive"
+        return ret
+
+
 class GEOSampleSerializer(serializers.ModelSerializer):
     """Serializer for GEOSample model."""
 
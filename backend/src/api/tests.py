@@ -1,4 +1,40 @@
-from django.test import TestCase
+import datetime
+import gzip
+import math
+import os
+import pickle
+import tempfile
+
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from api.decorators import compressed_cache_page
+from api.models import Cart, GEOSeries
+from api.renderers import ORJSONRenderer
+from api.routers import ReplicaRouter, request_reads
+from api.serializers import GEOSeriesSerializer, GEOSeriesValuesSerializer
+from api.utils import warmup
+from api.utils.bm25 import BM25Index, Document, build_index
+from api.utils.compression import negotiate_encoding
+from api.utils.memcached import ChunkedPyMemcacheCache
+from api.utils.narrowing import (
+    cached_candidates,
+    remember_candidates,
+    trigram_similarity,
+    trigrams,
+)
+from api.utils.ontology_index import OntologyEntry, PrefixIndex
+from api.utils.ontology_search import finish_search
+from api.utils.parallel import run_concurrently
+from api.utils.symspell import SymSpellIndex, edit_distance
+from api.views import ready
+
 
 class GEOSeriesViewSetTests(TestCase):
     def test_search_action(self):
@@ -18,3 +54,439 @@ class GEOSeriesViewSetTests(TestCase):
 
         # Optionally, check that the count is as expected (assuming you know the expected count)
         # self.assertEqual(response.data['count'], expected_count)
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def setUp(self):
+        asthma = OntologyEntry("MONDO:0004979", "asthma", "MONDO", "disease", "good", 120)
+        lung = OntologyEntry("UBERON:0002048", "lung", "UBERON", "tissue", None, 40)
+        self.index = PrefixIndex(
+            [
+                ("MONDO:0004979", asthma),
+                ("asthma", asthma),
+                (
+                    "Asthmatic bronchitis",
+                    OntologyEntry(
+                        "MONDO:0004979", "asthma", "MONDO", "disease", "good", 120,
+                        synonym="Asthmatic bronchitis", scope="RELATED",
+                    ),
+                ),
+                ("lung", lung),
+                ("Lung cancer", OntologyEntry("MONDO:0008903", "lung cancer", "MONDO", "disease", None, 3)),
+            ]
+        )
+
+    def test_prefix_matches_are_case_insensitive_and_deduplicated(self):
+        results = self.index.search("ASTH")
+        self.assertEqual([r.id for r in results], ["MONDO:0004979"])
+        # the name is the closer completion, so it wins over the synonym
+        self.assertIsNone(results[0].synonym)
+        self.assertEqual(results[0].performance, "good")
+
+    def test_exact_match_ranks_first(self):
+        results = self.index.search("lung")
+        self.assertEqual([r.id for r in results], ["UBERON:0002048", "MONDO:0008903"])
+        self.assertTrue(results[0].is_exact)
+        self.assertFalse(results[1].is_exact)
+
+    def test_hit_count_boost(self):
+        index = PrefixIndex(
+            [
+                ("lung cyst", OntologyEntry("MONDO:1", "lung cyst", "MONDO", "disease", None, 3)),
+                ("lung mass", OntologyEntry("MONDO:2", "lung mass", "MONDO", "disease", None, 30000)),
+            ]
+        )
+        results = index.search("lung")
+        self.assertEqual([r.id for r in results], ["MONDO:2", "MONDO:1"])
+        self.assertEqual(results[0].hit_count, 30000)
+        self.assertGreater(results[0].overall_rank, results[1].overall_rank)
+
+    def test_ranks_over_every_key_with_the_prefix(self):
+        entries = [
+            (f"a{i:04} long completion", OntologyEntry(f"T:{i}", f"a{i:04}", "T", "disease", None, 0))
+            for i in range(1000)
+        ]
+        entries.append(("az", OntologyEntry("T:az", "az", "T", "tissue", None, 0)))
+        index = PrefixIndex(entries)
+
+        # the shortest completion sorts last, but is still the best match
+        self.assertEqual(index.search("a", max_results=3)[0].id, "T:az")
+        self.assertEqual([r.id for r in index.search("a", type="tissue")], ["T:az"])
+
+    def test_filters(self):
+        results = self.index.search("lung", type="disease")
+        self.assertEqual([r.id for r in results], ["MONDO:0008903"])
+        self.assertEqual(self.index.search("lung", ontology="CL"), [])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("xyz"), [])
+        self.assertEqual(self.index.search("   "), [])
+
+
+class BM25IndexTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        build_index(
+            [
+                Document("MONDO:0004979", "asthma", "MONDO", "disease"),
+                Document(
+                    "MONDO:0005002", "chronic obstructive pulmonary disease", "MONDO", "disease",
+                    [("asthma-like lung disease", "RELATED")],
+                ),
+                Document("UBERON:0002048", "lung", "UBERON", "tissue", [("pulmo", "EXACT")]),
+            ],
+            tmp.name,
+            source={"size": 1, "mtime_ns": 2},
+        )
+        self.index = BM25Index.load(tmp.name)
+
+    def test_name_outweighs_related_synonym(self):
+        scores = self.index.get_scores("asthma")
+        self.assertEqual(int(scores.argmax()), 0)
+        self.assertGreater(scores[1], scores[2])
+        # every document gets BM25+'s delta, but only these two contain the token
+        self.assertGreater(scores[2], 0)
+        self.assertEqual(self.index.matching_docs("asthma").tolist(), [0, 1])
+        self.assertEqual(self.index.top_k("asthma", 1)[0].tolist(), [0])
+
+    def test_scores_match_bm25_plus(self):
+        # weighted lengths: 10 (name); 40 (name) + 4 (RELATED synonym);
+        # 10 (name) + 8 (EXACT synonym), so avgdl = 72 / 3 = 24. "asthma" is
+        # in 2 of the 3 documents, 10 times in the first and once in the second
+        k1, b, delta = 1.2, 0.8, 0.5
+        idf = math.log((3 + 1) / 2)
+
+        def expected(tf, dl):
+            return idf * (delta + tf * (k1 + 1) / (k1 * (1 - b + b * dl / 24) + tf))
+
+        scores = self.index.get_scores("asthma")
+        for score, (tf, dl) in zip(scores.tolist(), [(10, 10), (1, 44), (0, 18)]):
+            self.assertAlmostEqual(score, expected(tf, dl), places=5)
+
+    def test_filter_mask(self):
+        mask = self.index.filter_mask(ontology="UBERON")
+        self.assertEqual(mask.tolist(), [False, False, True])
+        self.assertIsNone(self.index.filter_mask())
+
+    def test_records_source(self):
+        # compared against the database's on load, to notice it's been replaced
+        self.assertEqual(self.index.meta["source"], {"size": 1, "mtime_ns": 2})
+
+
+class SymSpellIndexTests(SimpleTestCase):
+    def setUp(self):
+        asthma = OntologyEntry("MONDO:0004979", "asthma", "MONDO", "disease", None, 120)
+        self.index = SymSpellIndex(
+            [
+                ("asthma", asthma),
+                (
+                    "Allergic asthma",
+                    OntologyEntry("MONDO:0004784", "allergic asthma", "MONDO", "disease", None, 40),
+                ),
+                ("lung", OntologyEntry("UBERON:0002048", "lung", "UBERON", "tissue", None, 40)),
+            ]
+        )
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance("astma", "asthma", 2), 1)
+        # adjacent transpositions count as one edit
+        self.assertEqual(edit_distance("ashtma", "asthma", 2), 1)
+        self.assertIsNone(edit_distance("lung", "asthma", 2))
+
+    def test_misspelled_query(self):
+        results = self.index.search("astma")
+        self.assertEqual([r.id for r in results], ["MONDO:0004979", "MONDO:0004784"])
+        self.assertFalse(results[0].is_exact)
+
+    def test_every_word_must_match(self):
+        results = self.index.search("alergic astma")
+        self.assertEqual([r.id for r in results], ["MONDO:0004784"])
+        # short words allow fewer edits
+        self.assertEqual([r.id for r in self.index.search("lng")], ["UBERON:0002048"])
+        self.assertEqual(self.index.search("lgn"), [])
+
+
+class NarrowingTests(SimpleTestCase):
+    def test_trigrams_match_pg_trgm(self):
+        # show_trgm('Lung-c')
+        self.assertEqual(
+            trigrams("Lung-c"), {"  l", " lu", "lun", "ung", "ng ", "  c", " c "}
+        )
+        # similarity('word', 'two words') is 0.36363637 in the pg_trgm docs
+        self.assertAlmostEqual(trigram_similarity("word", "two words"), 4 / 11)
+        self.assertEqual(trigram_similarity("", "lung"), 0.0)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        ONTOLOGY_NARROWING=True,
+        ONTOLOGY_NARROWING_POOL=3,
+        ONTOLOGY_SYMSPELL=False,
+    )
+    def test_only_complete_candidate_pools_are_recorded(self):
+        filters = {"ontology": None, "type": None}
+
+        def search(query, ids):
+            results = [SimpleNamespace(id=term_id) for term_id in ids]
+            finish_search(query, 1, "trigram", results, None, filters, from_database=True)
+
+        search("lung", ["A", "B"])
+        self.assertEqual(cached_candidates("lungs", **filters), ["A", "B"])
+        # as many matches as were asked for, so there may have been more
+        search("heart", ["A", "B", "C"])
+        self.assertIsNone(cached_candidates("hearts", **filters))
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    )
+    def test_new_words_are_not_narrowed(self):
+        filters = {"ontology": None, "type": None}
+        remember_candidates("lung", ["A"], **filters)
+        self.assertEqual(cached_candidates("lungs", **filters), ["A"])
+        self.assertIsNone(cached_candidates("lung ca", **filters))
+        self.assertIsNone(cached_candidates("lung-ca", **filters))
+
+
+class RunConcurrentlyTests(SimpleTestCase):
+    @override_settings(SEARCH_QUERY_THREADS=4)
+    def test_results_keep_their_keys(self):
+        tasks = {name: (lambda n=n: n * 2) for name, n in [("a", 1), ("b", 2), ("c", 3)]}
+        self.assertEqual(run_concurrently(tasks), {"a": 2, "b": 4, "c": 6})
+
+    @override_settings(SEARCH_QUERY_THREADS=4)
+    def test_exceptions_are_reraised(self):
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            run_concurrently({"ok": lambda: 1, "fail": fail})
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.router.monitor.aliases = ["replica1"]
+        # as if the monitor thread had been started in this process
+        self.router.monitor._pid = os.getpid()
+
+    @override_settings(REPLICA_MAX_LAG_SECONDS=5)
+    def test_reads_go_to_replicas_within_max_lag(self):
+        self.router.monitor.lags = {"replica1": 1.0}
+        self.assertEqual(self.router.db_for_read(GEOSeries), "replica1")
+        self.router.monitor.lags = {"replica1": 10.0}
+        self.assertEqual(self.router.db_for_read(GEOSeries), "default")
+        # unreachable
+        self.router.monitor.lags = {"replica1": None}
+        self.assertEqual(self.router.db_for_read(GEOSeries), "default")
+
+    @override_settings(SEARCH_QUERY_THREADS=4)
+    def test_reads_within_a_request_use_one_replica(self):
+        self.router.monitor.aliases = ["replica1", "replica2"]
+        self.router.monitor.lags = {"replica1": 0.0, "replica2": 0.0}
+
+        token = request_reads.set({})
+        self.addCleanup(request_reads.reset, token)
+        alias = self.router.db_for_read(GEOSeries)
+        tasks = {i: (lambda: self.router.db_for_read(GEOSeries)) for i in range(20)}
+        self.assertEqual(set(run_concurrently(tasks).values()), {alias})
+
+    def test_carts_and_writes_stay_on_primary(self):
+        self.router.monitor.lags = {"replica1": 0.0}
+        self.assertEqual(self.router.db_for_read(Cart), "default")
+        self.assertEqual(self.router.db_for_write(GEOSeries), "default")
+
+
+class ReadinessTests(SimpleTestCase):
+    def tearDown(self):
+        warmup._warming.clear()
+        warmup._boot_id = None
+        warmup._workers = 1
+        warmup._all_done = False
+
+    def test_not_ready_while_warming_up(self):
+        request = RequestFactory().get("/api/ready/")
+        self.assertEqual(ready(request).status_code, 200)
+
+        warmup._warming.set()
+        response = ready(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data, {"ready": False})
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_not_ready_until_every_worker_is_done(self):
+        warmup._boot_id = "boot"
+        warmup._workers = 2
+        cache.set("warmup:boot:claimed", True)
+        self.assertFalse(warmup.is_ready())
+
+        warmup.count_done()
+        self.assertFalse(warmup.is_ready())
+        warmup.count_done()
+        self.assertTrue(warmup.is_ready())
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_matches_json_renderer(self):
+        data = {
+            "results": [{"id": "GSE1", "value": Decimal("0.5"), "name": "caf\u00e9\u2028"}],
+            "at": datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc),
+            "facets": {1: "a"},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+
+class GEOSeriesValuesSerializerTests(SimpleTestCase):
+    def series(self, **annotations):
+        columns = {
+            column: f"{column} value"
+            for column in GEOSeriesValuesSerializer.COLUMN_FIELDS.values()
+        }
+        columns.update(pubmed_id=12345, web_link=None, submission_date="")
+        columns.update(gse="GSE1")
+        return {**columns, **annotations}
+
+    def assert_same_output(self, row, databases, platforms, fields=None):
+        annotations = GEOSeriesValuesSerializer.ANNOTATIONS
+        series = GEOSeries(**{k: v for k, v in row.items() if k not in annotations})
+        for name in annotations:
+            if name in row:
+                setattr(series, name, row[name])
+        # GEOSeriesSerializer looks databases and platforms up per series;
+        # inline the former and mock the latter so that it doesn't query
+        series._database = databases
+        first = SimpleNamespace(platforms=platforms[0]) if platforms else None
+        with mock.patch("api.serializers.GEOSeriesToGEOPlatforms.objects") as objects:
+            objects.filter.return_value.first.return_value = first
+            expected = GEOSeriesSerializer([series], many=True, fields=fields).data
+        actual = GEOSeriesValuesSerializer(
+            [row],
+            {
+                "database": [{"series_id": row["gse"], "database_name": db} for db in databases],
+                "platform": [{"gse": row["gse"], "platforms": p} for p in platforms],
+            },
+            fields=fields,
+        ).data
+        self.assertEqual(actual, [dict(expected[0])])
+        self.assertEqual(list(actual[0]), list(expected[0]))
+
+    def test_matches_drf_serializer_for_search_results(self):
+        row = self.series(prob=0.65, keywords="lung, asthma ,airway", samples_ct=12)
+        self.assert_same_output(row, ["GEO", "SRA"], [["GPL570", "GPL96"], ["GPL1"]])
+
+    def test_matches_drf_serializer_for_sparse_fieldsets(self):
+        row = self.series(prob=0.3, samples_ct=None)
+        fields = ["sample_count", "id", "confidence", "name"]
+        self.assert_same_output(row, ["GEO"], [], fields=fields)
+        self.assertEqual(
+            GEOSeriesValuesSerializer.columns(fields), ["gse", "title"]
+        )
+
+    def test_matches_drf_serializer_for_lookups(self):
+        # looked-up series have no search annotations, databases or platforms
+        self.assert_same_output(self.series(), [], [])
+
+
+@override_settings(
+    COMPRESSION_ENCODINGS=["zstd", "br", "gzip"],
+    COMPRESSION_MIN_BYTES=100,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class CompressionTests(SimpleTestCase):
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate, br, zstd"), "zstd")
+        self.assertEqual(negotiate_encoding("gzip, br;q=0.5"), "gzip")
+        self.assertEqual(negotiate_encoding("identity, *;q=0"), None)
+        self.assertEqual(negotiate_encoding(""), None)
+        with self.settings(COMPRESSION_ENCODINGS=["gzip"]):
+            self.assertEqual(negotiate_encoding("zstd, gzip;q=0.1"), "gzip")
+
+    def test_compressed_cache_page_caches_per_negotiated_encoding(self):
+        calls = []
+        body = b'{"results": ["' + b"x" * 1000 + b'"]}'
+
+        @compressed_cache_page(60)
+        def view(request):
+            calls.append(request)
+            return HttpResponse(body, content_type="application/json")
+
+        factory = RequestFactory()
+        first = view(factory.get("/search/", HTTP_ACCEPT_ENCODING="gzip, deflate"))
+        # a different header that negotiates the same encoding is a cache hit
+        second = view(factory.get("/search/", HTTP_ACCEPT_ENCODING="gzip"))
+        plain = view(factory.get("/search/"))
+
+        self.assertEqual(len(calls), 2)
+        for response in (first, second):
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(response.content), body)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(plain.content, body)
+
+
+class FakeMemcacheClient:
+    """Stands in for pymemcache's client, refusing oversized items as memcached does."""
+
+    def __init__(self, max_item_bytes):
+        self.items = {}
+        self.max_item_bytes = max_item_bytes
+
+    def set(self, key, value, expire=0):
+        if len(pickle.dumps(value)) > self.max_item_bytes:
+            return False
+        self.items[key] = value
+        return True
+
+    def add(self, key, value, expire=0):
+        return key not in self.items and self.set(key, value)
+
+    def get(self, key, default=None):
+        return self.items.get(key, default)
+
+    def get_multi(self, keys):
+        return {key: self.items[key] for key in keys if key in self.items}
+
+    def set_multi(self, values, expire=0):
+        return [key for key, value in values.items() if not self.set(key, value)]
+
+    def delete(self, key):
+        return self.items.pop(key, None) is not None
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.delete(key)
+
+
+@override_settings(CACHE_COMPRESS_MIN_BYTES=100, CACHE_MAX_ITEM_BYTES=1000, CACHE_MAX_CHUNKS=4)
+class ChunkedPyMemcacheCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ChunkedPyMemcacheCache("localhost:11211", {})
+        # room for a chunk plus pickling overhead
+        self.client = FakeMemcacheClient(max_item_bytes=1100)
+        self.cache.__dict__["_cache"] = self.client
+
+    def test_small_and_compressible_values_use_one_item(self):
+        self.cache.set("small", {"a": 1})
+        self.cache.set("compressible", "x" * 10_000)
+        self.assertEqual(len(self.client.items), 2)
+        self.assertEqual(self.cache.get("small"), {"a": 1})
+        self.assertEqual(self.cache.get_many(["compressible"]), {"compressible": "x" * 10_000})
+
+    def test_large_values_are_split_across_items(self):
+        value = os.urandom(3000)
+        self.cache.set("large", value)
+        self.assertGreater(len(self.client.items), 3)
+        self.assertEqual(self.cache.get("large"), value)
+
+        # losing any chunk loses the value
+        chunk = next(key for key in self.client.items if ":chunk:" in key)
+        self.client.delete(chunk)
+        self.assertIsNone(self.cache.get("large"))
+
+    def test_values_over_the_chunk_limit_are_dropped_and_logged(self):
+        with self.assertLogs("api.utils.memcached", level="WARNING"):
+            self.cache.set("huge", os.urandom(5000))
+        self.assertEqual(self.client.items, {})
+        self.assertIsNone(self.cache.get("huge"))
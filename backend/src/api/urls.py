@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
@@ -13,6 +14,8 @@ from .views import (
     # GEOSeriesRelationsViewSet,
     # ExternalRelationViewSet,
     ontology_search,
+    ontology_term_detail,
+    ready,
 )
 
 # Create a router and register our viewsets with it
@@ -31,5 +34,26 @@ router.register(r"cart", CartViewSet, basename="cart")
 urlpatterns = [
     path("", include(router.urls)),
     path("ontology/search/", ontology_search, name="ontology-search"),
+    path(
+        "ontology/terms/<str:term_id>/",
+        ontology_term_detail,
+        name="ontology-term-detail",
+    ),
     # path('cart/download/', download_cart, name='cart-download'),
+    path("ready/", ready, name="ready"),
 ]
+
+# when served via ASGI, the slow search and lookup endpoints are handled by
+# async views instead; they must come before the router's routes to take effect
+if settings.API_ASYNC_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path("study/search/", async_views.study_search, name="study-search-async"),
+        path("study/lookup/", async_views.study_lookup, name="study-lookup-async"),
+        path(
+            "ontology/search/",
+            async_views.ontology_search,
+            name="ontology-search-async",
+        ),
+    ] + urlpatterns
@@ -0,0 +1,116 @@
+"""
+Async database access for the ASGI views (see api.async_views).
+
+Django's async ORM methods (aget(), acount(), etc.) still run each query
+synchronously, in a single thread per worker, so a slow query holds up every
+other request's queries. These helpers instead run queries on psycopg 3 async
+connections from a per-worker AsyncConnectionPool, which the event loop can
+interleave. Querysets are still built with the ORM as usual; only compiling and
+executing them happens here.
+
+Rows come back as dicts keyed by column name, without Django's from_db_value()
+conversions, so this is only suitable for models whose fields don't need them
+(e.g., text, numeric and array columns).
+"""
+
+import asyncio
+import time
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+# database alias -> its connection pool
+_pools: dict[str, AsyncConnectionPool] = {}
+_pools_lock = asyncio.Lock()
+
+# milliseconds each of the current request's queries waited for a pooled
+# connection, if the request is being timed (see api.middleware)
+pool_waits: ContextVar[list[float] | None] = ContextVar("pool_waits", default=None)
+
+
+def conninfo(alias: str = DEFAULT_DB_ALIAS) -> str:
+    """Build a libpq connection string from a DATABASES entry."""
+    db = settings.DATABASES[alias]
+    return make_conninfo(
+        dbname=db["NAME"],
+        user=db["USER"],
+        password=db["PASSWORD"],
+        host=db["HOST"],
+        port=db["PORT"],
+    )
+
+
+async def get_pool(alias: str = DEFAULT_DB_ALIAS) -> AsyncConnectionPool:
+    """Return the worker's connection pool for a database, opening it on first use."""
+    if alias not in _pools:
+        async with _pools_lock:
+            if alias not in _pools:
+                pool = AsyncConnectionPool(
+                    conninfo(alias),
+                    min_size=settings.ASYNC_DB_POOL_MIN_SIZE,
+                    max_size=settings.ASYNC_DB_POOL_MAX_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT,
+                    # as CONN_HEALTH_CHECKS does for the sync pool
+                    check=AsyncConnectionPool.check_connection,
+                    open=False,
+                )
+                await pool.open()
+                _pools[alias] = pool
+    return _pools[alias]
+
+
+async def fetch_all(sql: str, params=None, using: str = DEFAULT_DB_ALIAS) -> list[dict]:
+    """Run a query on the given database and return its rows as dicts."""
+    pool = await get_pool(using)
+    start = time.perf_counter()
+    async with pool.connection() as conn:
+        waits = pool_waits.get()
+        if waits is not None:
+            waits.append((time.perf_counter() - start) * 1000)
+        async with conn.cursor(row_factory=dict_row) as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchall()
+
+
+async def fetch_queryset(queryset) -> list[dict]:
+    """
+    Evaluate a queryset on the database it's routed to (see api.routers),
+    returning its rows as dicts keyed by column name.
+    """
+    sql, params = queryset.query.sql_with_params()
+    return await fetch_all(sql, params, using=queryset.db)
+
+
+async def fetch_count(queryset) -> int:
+    """The number of rows in a queryset, as queryset.count() would return."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    rows = await fetch_all(
+        f"SELECT COUNT(*) AS count FROM ({sql}) AS counted", params, using=queryset.db
+    )
+    return rows[0]["count"]
+
+
+def to_instances(model, rows: list[dict]):
+    """
+    Build model instances from fetched rows; columns that aren't fields of the
+    model (e.g., annotations) are set as attributes, as the ORM does.
+    """
+    fields = model._meta.concrete_fields
+    columns = {f.column for f in fields}
+    names = [f.attname for f in fields]
+    instances = []
+    for row in rows:
+        # fields that weren't selected are deferred, as with only()
+        values = [row.get(f.column, DEFERRED) for f in fields]
+        instance = model.from_db(DEFAULT_DB_ALIAS, names, values)
+        for column, value in row.items():
+            if column not in columns:
+                setattr(instance, column, value)
+        instances.append(instance)
+    return instances
@@ -0,0 +1,280 @@
+"""
+A persistent, precomputed BM25+ index over ontology term documents.
+
+Each document is a term's name plus its synonyms, tokenized once at build time.
+Rather than repeating text to weight names and synonyms (see the docstring of
+api.utils.search), each field's token counts are multiplied by its weight, which
+gives the same term frequencies and document lengths without the copies.
+
+The index is stored as a term-major sparse (CSR) matrix whose entries are each
+(token, document) pair's final BM25+ weight, i.e. its IDF times its saturated,
+length-normalized term frequency. Scoring a query is then a sparse dot product
+of the query's token counts with that matrix, and loading the index is just
+memory-mapping its arrays, so no per-query corpus refit is needed.
+
+Layout of an index directory:
+- indptr.npy, indices.npy, data.npy: the CSR matrix; row t covers
+  indices/data[indptr[t]:indptr[t + 1]], i.e. the documents containing token t
+  and the token's weight in each;
+- idf.npy: per-token IDF (needed for BM25+'s delta term);
+- doc_len.npy: per-document weighted length;
+- meta.json: the BM25 parameters, the vocabulary (token -> row) and the
+  documents' ids, names, ontologies and types, in column order, plus the
+  source the index was built from, if given (see api.utils.search).
+
+An index can also be built and used purely in memory (see
+BM25Index.from_documents), as the ontology search API does.
+
+Scores match rank_bm25's BM25Plus fitted on the equivalent repeated-text corpus.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+# BM25+ parameters; see api.utils.search for why BM25+ was chosen
+K1 = 1.2
+B = 0.8
+DELTA = 0.5
+
+# field weights, replacing the repetition counts used to build "weighted documents"
+NAME_WEIGHT = int(os.environ.get("NAME_WEIGHT", "10"))
+
+SCOPE_WEIGHTS = {
+    "EXACT": int(os.environ.get("SCOPE_WEIGHT_EXACT", "8")),
+    "NARROW": int(os.environ.get("SCOPE_WEIGHT_NARROW", "7")),
+    "BROAD": int(os.environ.get("SCOPE_WEIGHT_BROAD", "3")),
+    "RELATED": int(os.environ.get("SCOPE_WEIGHT_RELATED", "1")),
+}
+# per the OBO 1.4 spec, synonyms with no scope are treated as RELATED
+DEFAULT_SCOPE = "RELATED"
+
+TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+ARRAYS = ("indptr", "indices", "data", "idf", "doc_len")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+@dataclass
+class Document:
+    """An ontology term to be indexed."""
+
+    term_id: str
+    name: str
+    ontology: str
+    type: str
+    # (synonym, scope) pairs; scope may be None
+    synonyms: list[tuple[str, str | None]] = field(default_factory=list)
+
+    def weighted_counts(self) -> Counter:
+        """Token counts over the name and synonyms, scaled by field weight."""
+        counts = Counter()
+        for token in tokenize(self.name or ""):
+            counts[token] += NAME_WEIGHT
+        for text, scope in self.synonyms:
+            weight = SCOPE_WEIGHTS.get(scope, SCOPE_WEIGHTS[DEFAULT_SCOPE])
+            for token in tokenize(text or ""):
+                counts[token] += weight
+        return counts
+
+
+def build_index(
+    docs: Iterable[Document], path: Path, k1=K1, b=B, delta=DELTA, source: dict | None = None
+):
+    """
+    Tokenize docs, compute their BM25+ weights and write the index to path (a
+    directory, created if needed), recording source (a JSON-serializable
+    description of where docs came from) in its metadata. Returns the number
+    of documents indexed.
+    """
+    index = BM25Index.from_documents(docs, k1=k1, b=b, delta=delta)
+    if source is not None:
+        index.meta["source"] = source
+    index.save(path)
+    return len(index)
+
+
+class BM25Index:
+    """
+    A BM25+ index, either built in memory by from_documents() or loaded
+    (memory-mapped) from a directory written by save().
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray], meta: dict):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self.meta = meta
+        self.delta = meta["delta"]
+        self.vocab = meta["vocab"]
+        self.docs = meta["docs"]
+        self.term_ids = self.docs["term_id"]
+        self.ontologies = np.array(self.docs["ontology"], dtype=object)
+        self.types = np.array(self.docs["type"], dtype=object)
+
+    @classmethod
+    def from_documents(cls, docs: Iterable[Document], k1=K1, b=B, delta=DELTA):
+        """Tokenize docs and compute their BM25+ weights."""
+        docs = list(docs)
+        counts = [doc.weighted_counts() for doc in docs]
+        n_docs = len(docs)
+
+        doc_len = np.array([sum(c.values()) for c in counts], dtype=np.float64)
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len / avgdl) if n_docs else doc_len
+
+        # token -> [(doc, weighted tf)], i.e. the transposed document-term matrix
+        postings: dict[str, list[tuple[int, int]]] = {}
+        for i, c in enumerate(counts):
+            for token, tf in c.items():
+                postings.setdefault(token, []).append((i, tf))
+
+        vocab = sorted(postings)
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        idf = np.empty(len(vocab), dtype=np.float64)
+        indices = []
+        data = []
+
+        for row, token in enumerate(vocab):
+            docs_for_token = postings[token]
+            idf[row] = math.log((n_docs + 1) / len(docs_for_token))
+            doc_idx = np.fromiter((d for d, _ in docs_for_token), dtype=np.int32)
+            tf = np.fromiter((f for _, f in docs_for_token), dtype=np.float64)
+            indices.append(doc_idx)
+            data.append(idf[row] * tf * (k1 + 1) / (norm[doc_idx] + tf))
+            indptr[row + 1] = indptr[row] + len(docs_for_token)
+
+        arrays = {
+            "indptr": indptr,
+            "indices": np.concatenate(indices) if indices else np.empty(0, np.int32),
+            "data": (np.concatenate(data) if data else np.empty(0)).astype(np.float32),
+            "idf": idf,
+            "doc_len": doc_len,
+        }
+        meta = {
+            "k1": k1,
+            "b": b,
+            "delta": delta,
+            "vocab": {token: row for row, token in enumerate(vocab)},
+            "docs": {
+                "term_id": [d.term_id for d in docs],
+                "name": [d.name for d in docs],
+                "ontology": [d.ontology for d in docs],
+                "type": [d.type for d in docs],
+            },
+        }
+        return cls(arrays, meta)
+
+    @classmethod
+    def load(cls, path: Path):
+        """Load an index written by save(), memory-mapping its arrays."""
+        path = Path(path)
+        with open(path / "meta.json") as fp:
+            meta = json.load(fp)
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAYS
+        }
+        return cls(arrays, meta)
+
+    def save(self, path: Path):
+        """Write the index to path, a directory that's created if needed."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        # each file is written aside and moved into place, so processes that
+        # have the previous index memory-mapped keep reading intact files
+        for name in ARRAYS:
+            with open(path / f"{name}.npy.tmp", "wb") as fp:
+                np.save(fp, getattr(self, name))
+            os.replace(path / f"{name}.npy.tmp", path / f"{name}.npy")
+        # written last, so a partially-written index is never mistaken for a complete one
+        with open(path / "meta.json.tmp", "w") as fp:
+            json.dump(self.meta, fp)
+        os.replace(path / "meta.json.tmp", path / "meta.json")
+
+    def __len__(self):
+        return len(self.term_ids)
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (Path(path) / "meta.json").exists()
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """
+        BM25+ score of every document for query. As in rank_bm25, each
+        occurrence of a query token counts, and tokens not in the vocabulary
+        contribute nothing.
+        """
+        q_counts = Counter(t for t in tokenize(query) if t in self.vocab)
+        scores = np.zeros(len(self), dtype=np.float64)
+
+        for token, count in q_counts.items():
+            row = self.vocab[token]
+            start, end = self.indptr[row], self.indptr[row + 1]
+            # BM25+ adds idf * delta for every document, matching or not
+            scores += count * self.idf[row] * self.delta
+            scores += np.bincount(
+                self.indices[start:end],
+                weights=count * self.data[start:end].astype(np.float64),
+                minlength=len(self),
+            )
+
+        return scores
+
+    def matching_docs(self, query: str) -> np.ndarray:
+        """
+        Indices of the documents containing at least one query token. (Under
+        BM25+ every document scores above zero once any query token is in the
+        vocabulary, so a positive score doesn't mean a document matched.)
+        """
+        rows = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(
+            np.concatenate(
+                [self.indices[self.indptr[r]:self.indptr[r + 1]] for r in rows]
+            )
+        )
+
+    def top_k(self, query: str, k: int, mask: np.ndarray | None = None):
+        """
+        Return (doc indices, scores) of the k best-scoring documents that
+        contain a query token (and pass mask, if given), best first; ties are
+        broken by document order.
+        """
+        candidates = self.matching_docs(query)
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        if len(candidates) == 0:
+            return candidates, np.empty(0)
+
+        scores = self.get_scores(query)[candidates]
+        # argpartition selects the top k in linear time; only those are sorted
+        if len(candidates) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+        else:
+            part = np.arange(len(candidates))
+        part = part[np.lexsort((candidates[part], -scores[part]))]
+        return candidates[part], scores[part]
+
+    def filter_mask(self, type: str | None = None, ontology: str | None = None):
+        """Boolean mask of documents of the given type and ontology, or None."""
+        if not type and not ontology:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        if type:
+            mask &= self.types == type
+        if ontology:
+            mask &= self.ontologies == ontology
+        return mask
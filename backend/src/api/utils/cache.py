@@ -0,0 +1,63 @@
+"""
+Helpers for caching ontology search responses in the shared (memcached) cache.
+
+Cached entries are keyed by a data version, which is bumped whenever the
+ontology or search term data is reimported. Bumping the version orphans every
+entry cached under the previous one, which memcached then evicts as usual, and
+signals each worker to rebuild its in-memory indexes. They're also keyed by
+ONTOLOGY_SEARCH_SCHEMA_VERSION, so that a deploy changing what's cached doesn't
+serve entries cached by the previous code.
+"""
+
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+ONTOLOGY_DATA_VERSION_KEY = "ontology_search:version"
+
+# bump whenever the shape of cached ontology search entries changes, e.g. a
+# field is added to OntologySearchResultsSerializer
+ONTOLOGY_SEARCH_SCHEMA_VERSION = 2
+
+
+def ontology_data_version():
+    """
+    Return the current ontology data version, initializing it if needed, or
+    None if the cache is unavailable.
+    """
+    version = cache.get(ONTOLOGY_DATA_VERSION_KEY)
+    if version is None:
+        # add() is a no-op if another worker initialized it first
+        cache.add(ONTOLOGY_DATA_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(ONTOLOGY_DATA_VERSION_KEY)
+    return version
+
+
+def bump_ontology_data_version():
+    """Invalidate cached ontology search responses and in-memory indexes."""
+    version = time.time_ns()
+    cache.set(ONTOLOGY_DATA_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def normalize_search_query(query: str) -> str:
+    """Strip and collapse whitespace, which doesn't affect search results."""
+    return " ".join(query.split())
+
+
+def ontology_search_cache_key(query: str, **params):
+    """
+    Build a cache key for an ontology search from its normalized query and
+    any other parameters that affect its results (e.g., max_results, filters).
+    """
+    payload = json.dumps(
+        [normalize_search_query(query), sorted(params.items())], default=str
+    )
+    # memcached keys can't contain whitespace or be longer than 250 bytes
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return (
+        f"ontology_search:v{ONTOLOGY_SEARCH_SCHEMA_VERSION}:"
+        f"{ontology_data_version()}:{digest}"
+    )
@@ -0,0 +1,75 @@
+"""
+Response compression, negotiated with the client via Accept-Encoding (see
+api.middleware.CompressionMiddleware and api.decorators.compressed_cache_page).
+
+Study search pages and lookups are large (a 100-row page with full summaries is
+hundreds of KB of JSON) and compress several-fold, so compressing them saves far
+more transfer time than it costs. Encodings are offered in the order given by
+COMPRESSION_ENCODINGS; zstd and brotli compress JSON better and faster than
+gzip at the levels used here, but not every client accepts them.
+"""
+
+import gzip
+
+import brotli
+import zstandard
+
+from django.conf import settings
+
+# levels suited to compressing responses on the fly rather than ahead of time
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+# Content-Encoding token -> function compressing bytes with it; zstd
+# compressors aren't thread-safe, so each response gets its own
+ENCODERS = {
+    "zstd": lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data),
+    "br": lambda data: brotli.compress(data, quality=BROTLI_QUALITY),
+    # mtime=0 so that identical responses compress identically, as Django's
+    # GZipMiddleware does
+    "gzip": lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0),
+}
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q-value}, lowercased."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate_encoding(header: str) -> str | None:
+    """
+    Pick the encoding to compress a response with, given the request's
+    Accept-Encoding header: the one of COMPRESSION_ENCODINGS the client
+    prefers (by q-value), ties going to the earliest, or None to send the
+    response uncompressed.
+    """
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for encoding in settings.COMPRESSION_ENCODINGS:
+        if encoding not in ENCODERS:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress data with one of ENCODERS."""
+    return ENCODERS[encoding](data)
@@ -0,0 +1,177 @@
+"""
+A memcached cache backend that can store values over memcached's item size
+limit (1MB by default), e.g. study search pages with limit=1000.
+
+With the stock PyMemcacheCache, memcached refuses such values, and since the
+client is configured with ignore_exc, the failure is silent: the page is
+recomputed on every request. ChunkedPyMemcacheCache instead:
+- compresses values of at least CACHE_COMPRESS_MIN_BYTES (pickled) with zstd;
+- splits those that are still over CACHE_MAX_ITEM_BYTES across up to
+  CACHE_MAX_CHUNKS chunk keys, storing a small manifest under the value's key;
+- logs a warning whenever it drops a value, i.e. one that's too large even
+  when split, or that memcached refuses.
+
+A value is only returned if all of its chunks are; if any was evicted, it's a
+cache miss. Chunks are keyed by a token unique to each write, so concurrent
+writers of the same key never mix their chunks.
+"""
+
+import logging
+import pickle
+import uuid
+
+from dataclasses import dataclass
+
+import zstandard
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.memcached import PyMemcacheCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+@dataclass
+class CompressedValue:
+    """A pickled, zstd-compressed value, small enough for a single item."""
+
+    blob: bytes
+
+
+@dataclass
+class ChunkedValue:
+    """Manifest of a compressed value split across count chunk keys."""
+
+    token: str
+    count: int
+
+
+def chunk_key(key: str, token: str, index: int) -> str:
+    return f"{key}:chunk:{token}:{index}"
+
+
+class ChunkedPyMemcacheCache(PyMemcacheCache):
+    """PyMemcacheCache that compresses large values and splits huge ones."""
+
+    def _encode(self, key: str, value, timeout):
+        """
+        Return what to store under key for value: the value itself if it's
+        small, else a CompressedValue, or a ChunkedValue once its chunks have
+        been stored. Returns _MISSING, having logged why, if it can't be stored.
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) < settings.CACHE_COMPRESS_MIN_BYTES:
+            # pickled again by the client, which is cheap for small values
+            return value
+
+        blob = zstandard.ZstdCompressor().compress(data)
+        max_item = settings.CACHE_MAX_ITEM_BYTES
+        if len(blob) <= max_item:
+            return CompressedValue(blob)
+
+        count = -(-len(blob) // max_item)
+        if count > settings.CACHE_MAX_CHUNKS:
+            logger.warning(
+                "Not caching %s: %d bytes compressed, over the %d-chunk limit",
+                key,
+                len(blob),
+                settings.CACHE_MAX_CHUNKS,
+            )
+            return _MISSING
+
+        token = uuid.uuid4().hex[:12]
+        chunks = {
+            chunk_key(key, token, i): blob[i * max_item:(i + 1) * max_item]
+            for i in range(count)
+        }
+        failed = self._cache.set_multi(chunks, timeout)
+        if failed:
+            logger.warning(
+                "Not caching %s: memcached refused %d of its %d chunks",
+                key,
+                len(failed),
+                count,
+            )
+            self._cache.delete_multi(chunks.keys())
+            return _MISSING
+        return ChunkedValue(token, count)
+
+    def _decode_many(self, stored: dict) -> dict:
+        """
+        Turn values as stored into the values that were cached, fetching all
+        chunks in one round trip; values with missing chunks are left out.
+        """
+        chunk_keys = [
+            chunk_key(key, value.token, i)
+            for key, value in stored.items()
+            if isinstance(value, ChunkedValue)
+            for i in range(value.count)
+        ]
+        chunks = self._cache.get_multi(chunk_keys) if chunk_keys else {}
+
+        values = {}
+        for key, value in stored.items():
+            if isinstance(value, ChunkedValue):
+                parts = [chunks.get(chunk_key(key, value.token, i)) for i in range(value.count)]
+                if any(part is None for part in parts):
+                    # a chunk was evicted, so the value is gone
+                    continue
+                value = CompressedValue(b"".join(parts))
+            if isinstance(value, CompressedValue):
+                value = pickle.loads(zstandard.ZstdDecompressor().decompress(value.blob))
+            values[key] = value
+        return values
+
+    def _set(self, key, value, timeout) -> bool:
+        encoded = self._encode(key, value, timeout)
+        if encoded is _MISSING:
+            return False
+        if not self._cache.set(key, encoded, timeout):
+            # small values only fail to be set if memcached is unreachable,
+            # which would otherwise log a warning per request
+            if encoded is not value:
+                logger.warning("Not caching %s: memcached refused it", key)
+            return False
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self.get_backend_timeout(timeout)
+        encoded = self._encode(key, value, timeout)
+        if encoded is _MISSING:
+            return False
+        added = bool(self._cache.add(key, encoded, timeout))
+        if not added and isinstance(encoded, ChunkedValue):
+            # the key already had a value, so this one's chunks are unused
+            self._cache.delete_multi(
+                [chunk_key(key, encoded.token, i) for i in range(encoded.count)]
+            )
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if not self._set(key, value, self.get_backend_timeout(timeout)):
+            # make sure the key doesn't keep its old value, as PyMemcacheCache does
+            self._cache.delete(key)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        failed = []
+        for key, value in data.items():
+            if not self._set(self.make_and_validate_key(key, version=version), value, timeout):
+                failed.append(key)
+        return failed
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        return self._decode_many({key: value}).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        stored = self._cache.get_multi(key_map.keys())
+        return {key_map[k]: v for k, v in self._decode_many(stored).items()}
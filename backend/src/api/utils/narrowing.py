@@ -0,0 +1,163 @@
+"""
+Incremental candidate narrowing across autocomplete keystrokes.
+
+As a user types "lun", "lung", "lung c", each query would otherwise be a full
+database search. Instead, a full trigram search that finds every matching term
+(i.e., fewer than the ONTOLOGY_NARROWING_POOL it asks for, more than are
+returned) records their ids in the shared cache, and a later query that extends
+a recorded one is answered by rescoring only those candidates in Python, with
+the same trigram similarity search_onto() uses. If rescoring leaves fewer than
+ONTOLOGY_NARROWING_MIN_RESULTS terms, the candidates are too few to trust and
+the caller does a full search.
+
+Only queries that extend the recorded query's last word are narrowed ("lung"
+to "lungs", not "lung" to "lung ca"). A new word brings trigrams of its own,
+which can match terms the shorter query never did (e.g. the synonym "CA"),
+whereas lengthening a word only changes its trailing trigrams. Even then a
+query's matches aren't strictly a subset of its prefix's, so narrowing is a
+heuristic: a term that only the longer query matches can be missed.
+
+Narrowed results depend on which earlier query they were narrowed from, so
+they aren't cached as the query's results (see api.views.ontology_search).
+
+Rescoring needs every name and synonym of each candidate, which comes from a
+per-worker map of term id to entries (see load_entries).
+"""
+
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import ontology_search_cache_key
+from .ontology_index import (
+    IndexHolder,
+    load_entries,
+    normalize_query,
+    to_search_result,
+    top_hits,
+)
+
+# pg_trgm.similarity_threshold as set by search_onto(); rescored matches not
+# above it (pg_trgm's % is strict) wouldn't have been returned by a full
+# search either
+SIMILARITY_THRESHOLD = 0.2
+
+# pg_trgm splits strings into words on anything but letters and digits
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    The trigrams pg_trgm extracts from text: each lowercased word is padded
+    with two spaces in front and one behind, then split into 3-character runs.
+    """
+    result = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def trigram_similarity(a: str | set, b: str | set) -> float:
+    """pg_trgm's similarity(): shared trigrams over all distinct trigrams."""
+    a = a if isinstance(a, set) else trigrams(a)
+    b = b if isinstance(b, set) else trigrams(b)
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def entries_by_term(entries):
+    """Group (key, entry) pairs by term id, dropping the keys that are ids."""
+    by_term = {}
+    for key, entry in entries:
+        if key and key != entry.term_id:
+            by_term.setdefault(entry.term_id, []).append((key, entry))
+    return by_term
+
+
+term_entries = IndexHolder(lambda: entries_by_term(load_entries()))
+
+
+def candidates_cache_key(query: str, **filters):
+    return ontology_search_cache_key(normalize_query(query), kind="candidates", **filters)
+
+
+def remember_candidates(query: str, term_ids, **filters):
+    """
+    Record the candidate terms found for query, for later narrowing; they must
+    be every term matching query, not just the best-ranked ones.
+    """
+    cache.set(
+        candidates_cache_key(query, **filters),
+        list(term_ids),
+        settings.ONTOLOGY_NARROWING_TIMEOUT,
+    )
+
+
+def cached_candidates(query: str, **filters):
+    """
+    Return the recorded candidate term ids of the longest shorter query that
+    query extends within its last word (e.g. "lung" for "lungs"), or None if
+    there are none.
+    """
+    q = normalize_query(query)
+    words = list(WORD_RE.finditer(q))
+    if not words or words[-1].end() != len(q):
+        return None
+
+    start = max(words[-1].start(), settings.ONTOLOGY_SHORT_QUERY_MAX_LEN)
+    prefixes = [q[:i] for i in range(len(q) - 1, start, -1)]
+    if not prefixes:
+        return None
+
+    keys = {prefix: candidates_cache_key(prefix, **filters) for prefix in prefixes}
+    found = cache.get_many(list(keys.values()))
+    for prefix in prefixes:
+        if keys[prefix] in found:
+            return found[keys[prefix]]
+    return None
+
+
+def rescore(query: str, term_ids):
+    """
+    Rank the given terms for query by the trigram similarity of their names
+    and synonyms, as search_onto()'s fuzzy branches would; returns
+    (entry, sim, is_exact) hits for every term above SIMILARITY_THRESHOLD.
+    """
+    q = normalize_query(query)
+    q_trigrams = trigrams(q)
+    by_term = term_entries.get()
+
+    hits = []
+    for term_id in term_ids:
+        for key, entry in by_term.get(term_id, ()):
+            is_exact = normalize_query(key) == q
+            sim = 1.0 if is_exact else trigram_similarity(q_trigrams, key)
+            if sim > SIMILARITY_THRESHOLD:
+                hits.append((entry, sim, is_exact))
+    return top_hits(hits, len(term_ids))
+
+
+def narrow(query: str, max_results: int, **filters):
+    """
+    Answer query by rescoring the candidates recorded for a query it extends,
+    returning up to max_results OntologySearchResults, or None if there are no
+    such candidates or too few of them still match.
+    """
+    term_ids = cached_candidates(query, **filters)
+    if term_ids is None:
+        return None
+
+    hits = rescore(query, term_ids)
+    if len(hits) < min(max_results, settings.ONTOLOGY_NARROWING_MIN_RESULTS):
+        return None
+
+    # the narrowed set is itself a candidate set for longer queries
+    remember_candidates(query, [entry.term_id for entry, _, _ in hits], **filters)
+    return [
+        to_search_result(entry, sim, is_exact)
+        for entry, sim, is_exact in hits[:max_results]
+    ]
@@ -0,0 +1,418 @@
+"""
+In-memory indexes over the searchable ontology terms, held once per worker
+process and used to answer autocomplete queries without a database round trip.
+
+"Searchable" terms are the ontology terms that have at least one row in
+api_searchterm (i.e., a row in api_ontologytermstats), the same set
+search_onto() restricts its results to.
+
+The prefix index is a set of parallel sorted arrays: lowercased keys (term ids,
+names and synonyms), the entries they point to, and numpy arrays of what ranking
+needs from each. A prefix lookup binary-searches for the range of keys starting
+with the query, scores the whole range at once with numpy, and only builds and
+sorts hits for the best-scoring keys, so even one-character prefixes are ranked
+over every match in a few milliseconds.
+
+The BM25 index ranks whole-word matches against names and synonyms with BM25+,
+as api.utils.search does for the metahq DuckDB database; it backs the bm25
+search engine (see api.views.ontology_search).
+"""
+
+import functools
+import heapq
+import math
+import threading
+import time
+
+from bisect import bisect_left
+from dataclasses import dataclass
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connection
+
+from .bm25 import BM25Index, Document
+from .cache import ontology_data_version
+from .results import dictfetchall
+
+# weights applied to synonym matches by scope; mirrors the CASE expressions in
+# the search_onto() SQL function so that in-memory and database results rank alike
+SCOPE_WEIGHTS = {
+    "EXACT": 1.5,
+    "NARROW": 1.3,
+    "BROAD": 1.1,
+    "RELATED": 0.9,
+}
+DEFAULT_SCOPE_WEIGHT = 1.0
+
+# strength of the boost given to terms with more predicted series, i.e. overall
+# ranks are scaled by 1 + HIT_COUNT_BOOST * ln(1 + hit_count), as in search_onto()
+HIT_COUNT_BOOST = 0.02
+
+# the keys of a prefix range turned into hits and fully ranked, per result
+# asked for; keys scoring below the best max_results * PREFIX_CANDIDATE_FACTOR
+# can't make the results, unless those belong to fewer than max_results terms
+PREFIX_CANDIDATE_FACTOR = 4
+
+# number of (prefix, max_results) rankings memoized per index; short prefixes
+# are both the most common keystrokes and the most expensive to rank
+PREFIX_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True, slots=True)
+class OntologyEntry:
+    """A single searchable string (term id, name or synonym) for a term."""
+
+    term_id: str
+    name: str
+    ontology: str
+    type: str
+    performance: str | None
+    hit_count: int
+    # None for entries keyed on the term's id or name
+    synonym: str | None = None
+    scope: str | None = None
+
+    @property
+    def scope_weight(self):
+        if self.synonym is None:
+            return DEFAULT_SCOPE_WEIGHT
+        return SCOPE_WEIGHTS.get(self.scope, DEFAULT_SCOPE_WEIGHT)
+
+    @property
+    def hit_boost(self):
+        return 1 + HIT_COUNT_BOOST * math.log1p(self.hit_count)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace, as is done for the index's keys."""
+    return " ".join(query.lower().split())
+
+
+def load_terms():
+    """
+    Fetch every searchable term, keyed by id, and the synonyms of those terms.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT t.id, t.name, t.ontology, t.type, h.hit_count,
+                (
+                    SELECT otr.performance FROM api_ontologytermrating otr
+                    WHERE otr.term = t.id LIMIT 1
+                ) AS performance
+            FROM api_ontologyterms t
+            JOIN api_ontologytermstats h ON h.term = t.id
+            """
+        )
+        terms = {row["id"]: row for row in dictfetchall(cursor)}
+
+        cursor.execute(
+            "SELECT term_id, synonym, scope FROM api_ontologysynonyms WHERE term_id = ANY(%s)",
+            [list(terms)],
+        )
+        synonyms = dictfetchall(cursor)
+
+    return terms, synonyms
+
+
+def base_entry(t: dict) -> OntologyEntry:
+    """The entry for a term's id or name, given its row from load_terms()."""
+    return OntologyEntry(
+        term_id=t["id"],
+        name=t["name"],
+        ontology=t["ontology"],
+        type=t["type"],
+        performance=t["performance"],
+        hit_count=t["hit_count"],
+    )
+
+
+def load_entries():
+    """
+    Fetch an entry for the id, name and each synonym of every searchable term.
+    """
+    terms, synonyms = load_terms()
+
+    entries = []
+    for t in terms.values():
+        entry = base_entry(t)
+        entries.append((t["id"], entry))
+        entries.append((t["name"], entry))
+
+    for s in synonyms:
+        t = terms[s["term_id"]]
+        entries.append(
+            (
+                s["synonym"],
+                OntologyEntry(
+                    term_id=t["id"],
+                    name=t["name"],
+                    ontology=t["ontology"],
+                    type=t["type"],
+                    performance=t["performance"],
+                    hit_count=t["hit_count"],
+                    synonym=s["synonym"],
+                    scope=s["scope"],
+                ),
+            )
+        )
+
+    return entries
+
+
+def to_search_result(
+    entry: OntologyEntry, sim: float, is_exact: bool, overall_rank: float | None = None
+):
+    """
+    Build an (unsaved) OntologySearchResults row for an entry, ranked the same
+    way search_onto() ranks its rows unless overall_rank is given, so it can go
+    through OntologySearchResultsSerializer like any other result.
+    """
+    from api.models import OntologySearchResults
+
+    scope_weight = entry.scope_weight
+    if overall_rank is None:
+        overall_rank = sim * scope_weight * entry.hit_boost
+    row = {
+        "id": entry.term_id,
+        "name": entry.name,
+        "ontology": entry.ontology,
+        "type": entry.type,
+        "synonym": entry.synonym,
+        "scope": entry.scope,
+        "sim": sim,
+        "scope_weight": scope_weight,
+        "overall_rank": overall_rank,
+        "is_exact": is_exact,
+        "hit_count": entry.hit_count,
+        "performance": entry.performance,
+    }
+
+    # from_db() skips most of Model.__init__, which matters when building
+    # results on every keystroke
+    fields = [f.attname for f in OntologySearchResults._meta.concrete_fields]
+    return OntologySearchResults.from_db(
+        None, fields, [row[name] for name in fields]
+    )
+
+
+def rank_key(entry: OntologyEntry, sim: float, is_exact: bool):
+    """Sort key matching search_onto()'s final ORDER BY."""
+    scope_weight = entry.scope_weight
+    return (
+        not is_exact,
+        -sim * scope_weight * entry.hit_boost,
+        -scope_weight,
+        -sim,
+        -entry.hit_count,
+        entry.term_id,
+    )
+
+
+def top_hits(hits, max_results: int):
+    """
+    Given (entry, sim, is_exact) hits, keep the best-ranked hit for each term,
+    as search_onto()'s DISTINCT ON does, and return the top max_results of
+    those, best first.
+    """
+    best = {}
+    for entry, sim, is_exact in hits:
+        key = rank_key(entry, sim, is_exact)
+        current = best.get(entry.term_id)
+        if current is None or key < current[0]:
+            best[entry.term_id] = (key, entry, sim, is_exact)
+
+    return tuple(
+        (entry, sim, is_exact)
+        for _, entry, sim, is_exact in heapq.nsmallest(
+            max_results, best.values(), key=lambda b: b[0]
+        )
+    )
+
+
+# ===========================================================================
+# === Prefix index
+# ===========================================================================
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over searchable term ids, names and synonyms.
+    """
+
+    def __init__(self, entries):
+        pairs = sorted(
+            ((normalize_query(key), entry) for key, entry in entries if key),
+            key=lambda pair: pair[0],
+        )
+        self.keys = [key for key, _ in pairs]
+        self.entries = [entry for _, entry in pairs]
+
+        # parallel to keys, for scoring whole prefix ranges at once
+        self.key_lengths = np.array([len(key) for key in self.keys], dtype=np.int64)
+        self.scope_weights = np.array([e.scope_weight for e in self.entries], dtype=np.float64)
+        self.hit_boosts = np.array([e.hit_boost for e in self.entries], dtype=np.float64)
+        self.ontologies = np.array([e.ontology for e in self.entries], dtype=object)
+        self.types = np.array([e.type for e in self.entries], dtype=object)
+
+        self._ranked = functools.lru_cache(maxsize=PREFIX_CACHE_SIZE)(self._rank)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 50,
+        ontology: str | None = None,
+        type: str | None = None,
+    ):
+        """
+        Return up to max_results OntologySearchResults whose id, name or a
+        synonym starts with query, best match per term first, optionally
+        restricted to terms from the given ontology and of the given type.
+
+        A key's similarity is the fraction of it covered by the query, so
+        shorter completions rank higher; exact matches rank first.
+        """
+        q = normalize_query(query)
+        if not q:
+            return []
+
+        return [
+            to_search_result(entry, sim, is_exact)
+            for entry, sim, is_exact in self._ranked(q, max_results, ontology, type)
+        ]
+
+    def prefix_range(self, q: str) -> tuple[int, int]:
+        """The [start, end) range of keys starting with q."""
+        start = bisect_left(self.keys, q)
+        # the first string sorting after every string starting with q
+        end = bisect_left(self.keys, q[:-1] + chr(ord(q[-1]) + 1), lo=start)
+        return start, end
+
+    def _rank(self, q: str, max_results: int, ontology: str | None, type: str | None):
+        start, end = self.prefix_range(q)
+        idx = np.arange(start, end)
+        if ontology:
+            idx = idx[self.ontologies[idx] == ontology]
+        if type:
+            idx = idx[self.types[idx] == type]
+
+        # the primary sort key of rank_key(), in the same order of operations
+        # so that ties are exact; exact matches are the keys as long as q
+        lengths = self.key_lengths[idx]
+        sims = len(q) / lengths
+        scores = sims * self.scope_weights[idx] * self.hit_boosts[idx]
+
+        n_candidates = max_results * PREFIX_CANDIDATE_FACTOR
+        if len(idx) > n_candidates:
+            cutoff = np.partition(scores, -n_candidates)[-n_candidates]
+            best = (scores >= cutoff) | (lengths == len(q))
+            if len({self.entries[i].term_id for i in idx[best]}) >= max_results:
+                idx, sims, lengths = idx[best], sims[best], lengths[best]
+
+        hits = [
+            (self.entries[i], 1.0 if is_exact else sim, is_exact)
+            for i, sim, is_exact in zip(
+                idx.tolist(), sims.tolist(), (lengths == len(q)).tolist()
+            )
+        ]
+        return top_hits(hits, max_results)
+
+
+# ===========================================================================
+# === BM25 index
+# ===========================================================================
+
+
+class BM25TermIndex:
+    """
+    BM25+ index over the names and synonyms of searchable terms (see
+    api.utils.bm25), weighted by field as in api.utils.search.
+    """
+
+    def __init__(self, terms: dict, synonyms: list):
+        syns_by_term = {}
+        for s in synonyms:
+            syns_by_term.setdefault(s["term_id"], []).append((s["synonym"], s["scope"]))
+
+        # parallel to the index's documents
+        self.entries = [base_entry(t) for t in terms.values()]
+        self.index = BM25Index.from_documents(
+            Document(
+                e.term_id, e.name, e.ontology, e.type, syns_by_term.get(e.term_id, [])
+            )
+            for e in self.entries
+        )
+        # there are only a handful of distinct (type, ontology) filters
+        self._filter_mask = functools.lru_cache(maxsize=64)(self.index.filter_mask)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 50,
+        ontology: str | None = None,
+        type: str | None = None,
+    ):
+        """
+        Return up to max_results OntologySearchResults for query, ranked by
+        BM25+ score (reported as sim and overall_rank), optionally restricted
+        to terms from the given ontology and of the given type.
+        """
+        q = normalize_query(query)
+        mask = self._filter_mask(type=type, ontology=ontology)
+        doc_idx, scores = self.index.top_k(q, max_results, mask=mask)
+
+        results = []
+        for i, score in zip(doc_idx.tolist(), scores.tolist()):
+            entry = self.entries[i]
+            is_exact = q in (entry.term_id.lower(), (entry.name or "").lower())
+            # ranked by BM25+ alone, so hit counts are reported but don't boost
+            results.append(to_search_result(entry, score, is_exact, overall_rank=score))
+        return results
+
+
+class IndexHolder:
+    """
+    Lazily builds an index on first use and keeps it for the life of the
+    worker process, rebuilding it when the ontology data version changes
+    (see api.utils.cache). The version is checked at most once every
+    ONTOLOGY_INDEX_RECHECK_SECONDS so lookups don't pay for a cache round trip.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._index = None
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._index is not None and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + settings.ONTOLOGY_INDEX_RECHECK_SECONDS
+            version = ontology_data_version()
+            # a None version means the cache is unreachable; keep what we have
+            if version is not None and version != self._version:
+                self.reset()
+
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._version = ontology_data_version()
+                    self._next_check = time.monotonic() + settings.ONTOLOGY_INDEX_RECHECK_SECONDS
+                    self._index = self._build()
+        return self._index
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+
+
+prefix_index = IndexHolder(lambda: PrefixIndex(load_entries()))
+bm25_index = IndexHolder(lambda: BM25TermIndex(*load_terms()))
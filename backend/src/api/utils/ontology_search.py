@@ -0,0 +1,305 @@
+"""
+Ranks ontology terms for the autocomplete box (see api.views.ontology_search).
+
+Queries are answered from the per-worker prefix index when it has enough
+completions for them, and otherwise by one of the database search strategies
+(see OntologySearchResultsManager.STRATEGY_FUNCTIONS), chosen by query length:
+- short queries (up to ONTOLOGY_SHORT_QUERY_MAX_LEN characters) are prefix
+  matched against btree indexes, since trigram similarity either matches nothing
+  or scans huge posting lists for them;
+- queries of ONTOLOGY_FULLTEXT_MIN_WORDS or more words are matched against the
+  tsvector indexes, falling back to trigram similarity if that finds fewer than
+  ONTOLOGY_FULLTEXT_MIN_RESULTS terms (e.g., for misspelled words);
+- other queries are fuzzy matched by trigram similarity.
+Unless they were prefix matched, queries also get candidates from the per-worker
+typo-tolerant index (see api.utils.symspell), which are merged into the above.
+
+Trigram searches record their candidate terms in the shared cache, if they found
+every match, so that a query extending an earlier one (the next keystroke) can
+usually be answered by rescoring those candidates instead (see
+api.utils.narrowing).
+
+Alternatively, the bm25 engine ranks every query with the per-worker BM25+
+index (see api.utils.ontology_index.BM25TermIndex), so its relevance can be
+compared against the default engine's.
+
+Time spent in each strategy is recorded in an optional timings dict, which the
+view reports in the Server-Timing response header.
+"""
+
+import logging
+import time
+
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from api.models import OntologySearchResults
+
+from .narrowing import narrow, remember_candidates, term_entries
+from .ontology_index import bm25_index, prefix_index
+from .symspell import symspell_index
+
+logger = logging.getLogger(__name__)
+
+# values accepted for the engine argument of search_ontology_terms()
+ENGINES = ("default", "bm25")
+
+
+@contextmanager
+def timed(timings: dict | None, name: str):
+    """Add the time spent in the block, in milliseconds, to timings[name]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.debug("ontology search strategy %s took %.2fms", name, elapsed)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def choose_strategy(query: str) -> str:
+    """Pick the database search strategy for a (normalized) query."""
+    if len(query) <= settings.ONTOLOGY_SHORT_QUERY_MAX_LEN:
+        return "prefix"
+    if len(query.split()) >= settings.ONTOLOGY_FULLTEXT_MIN_WORDS:
+        return "fulltext"
+    return "trigram"
+
+
+def merge_results(*result_lists, max_results: int):
+    """
+    Merge lists of OntologySearchResults into one, keeping the best-ranked
+    row for each term, ordered as search_onto() orders its rows.
+    """
+    best = {}
+    for results in result_lists:
+        for r in results:
+            key = (
+                not r.is_exact,
+                -r.overall_rank,
+                -r.scope_weight,
+                -r.sim,
+                -r.hit_count,
+                r.id,
+            )
+            if r.id not in best or key < best[r.id][0]:
+                best[r.id] = (key, r)
+    return [r for _, r in sorted(best.values(), key=lambda b: b[0])][:max_results]
+
+
+def database_search(
+    query: str, max_results: int, strategy: str, timings: dict | None = None, **filters
+):
+    """
+    Run the given database search strategy, falling back from fulltext to
+    trigram similarity if the former finds too few terms.
+    """
+    with timed(timings, strategy):
+        results = list(
+            OntologySearchResults.objects.search(
+                query, max_results, strategy=strategy, **filters
+            )
+        )
+
+    if needs_trigram_fallback(strategy, results, max_results):
+        with timed(timings, "trigram"):
+            results = list(
+                OntologySearchResults.objects.search(
+                    query, max_results, strategy="trigram", **filters
+                )
+            )
+
+    return results
+
+
+async def adatabase_search(
+    query: str, max_results: int, strategy: str, timings: dict | None = None, **filters
+):
+    """Like database_search(), but on an async connection."""
+    with timed(timings, strategy):
+        results = await OntologySearchResults.objects.asearch(
+            query, max_results, strategy=strategy, **filters
+        )
+
+    if needs_trigram_fallback(strategy, results, max_results):
+        with timed(timings, "trigram"):
+            results = await OntologySearchResults.objects.asearch(
+                query, max_results, strategy="trigram", **filters
+            )
+
+    return results
+
+
+def needs_trigram_fallback(strategy: str, results, max_results: int) -> bool:
+    return strategy == "fulltext" and len(results) < min(
+        max_results, settings.ONTOLOGY_FULLTEXT_MIN_RESULTS
+    )
+
+
+def search_indexes(query: str, max_results: int, timings, engine: str, filters: dict):
+    """
+    The in-memory part of search_ontology_terms(). Returns (results, strategy),
+    where strategy is None if results are final, and otherwise is the database
+    strategy for the query; results is then None if the database must be
+    searched, or the narrowed results otherwise.
+    """
+    if engine == "bm25":
+        with timed(timings, "bm25"):
+            return bm25_index.get().search(query, max_results, **filters), None
+
+    if settings.ONTOLOGY_PREFIX_INDEX:
+        with timed(timings, "prefix-index"):
+            results = prefix_index.get().search(query, max_results, **filters)
+        if len(results) >= min(max_results, settings.ONTOLOGY_PREFIX_MIN_RESULTS):
+            return results, None
+
+    strategy = choose_strategy(query)
+    results = None
+    if uses_narrowing(strategy):
+        with timed(timings, "narrowing"):
+            results = narrow(query, max_results, **filters)
+    return results, strategy
+
+
+def uses_narrowing(strategy: str) -> bool:
+    # narrowing rescores by trigram similarity alone, which would rank
+    # fulltext-strategy queries differently from a full search
+    return settings.ONTOLOGY_NARROWING and strategy == "trigram"
+
+
+def database_limit(strategy: str, max_results: int) -> int:
+    """
+    How many rows to fetch from the database: a larger pool of candidates than
+    needed when narrowing, for narrowing later queries that extend this one.
+    """
+    if uses_narrowing(strategy):
+        return max(max_results, settings.ONTOLOGY_NARROWING_POOL)
+    return max_results
+
+
+def finish_search(
+    query: str,
+    max_results: int,
+    strategy: str,
+    results,
+    timings,
+    filters: dict,
+    from_database: bool,
+):
+    """
+    The rest of search_ontology_terms() once the database has been searched
+    (from_database) or the query was narrowed: records candidates, and merges in
+    the typo-tolerant index's results.
+    """
+    # candidates are only recorded if they're every match, i.e. the search
+    # found fewer than it asked for; a truncated pool would lose terms
+    if (
+        from_database
+        and uses_narrowing(strategy)
+        and len(results) < database_limit(strategy, max_results)
+    ):
+        remember_candidates(query, [r.id for r in results], **filters)
+    results = results[:max_results]
+
+    if settings.ONTOLOGY_SYMSPELL and strategy != "prefix":
+        with timed(timings, "symspell"):
+            typo_results = symspell_index.get().search(query, max_results, **filters)
+        results = merge_results(results, typo_results, max_results=max_results)
+
+    return results
+
+
+def search_ontology_terms(
+    query: str,
+    max_results: int = 50,
+    timings: dict | None = None,
+    engine: str = "default",
+    ontology: str | None = None,
+    type: str | None = None,
+    meta: dict | None = None,
+):
+    """
+    Return up to max_results OntologySearchResults for query, best first,
+    using the given engine (one of ENGINES). If given, ontology and type
+    restrict the results to terms from that ontology and of that type.
+
+    If meta is given, meta["narrowed"] is set to whether the results were
+    narrowed from an earlier query's candidates rather than fully searched;
+    narrowed results shouldn't be cached as the query's results.
+    """
+    filters = {"ontology": ontology, "type": type}
+    if meta is not None:
+        meta["narrowed"] = False
+
+    results, strategy = search_indexes(query, max_results, timings, engine, filters)
+    if strategy is None:
+        return results
+
+    from_database = results is None
+    if meta is not None:
+        meta["narrowed"] = not from_database
+    if from_database:
+        results = database_search(
+            query, database_limit(strategy, max_results), strategy, timings, **filters
+        )
+
+    return finish_search(
+        query, max_results, strategy, results, timings, filters, from_database
+    )
+
+
+async def asearch_ontology_terms(
+    query: str,
+    max_results: int = 50,
+    timings: dict | None = None,
+    engine: str = "default",
+    ontology: str | None = None,
+    type: str | None = None,
+    meta: dict | None = None,
+):
+    """
+    Like search_ontology_terms(), but searches the database on an async
+    connection (see api.async_views). The in-memory part runs in a thread,
+    since it can block: indexes are rebuilt from the database when the data
+    version changes, and narrowing reads and writes the shared cache.
+    """
+    filters = {"ontology": ontology, "type": type}
+    if meta is not None:
+        meta["narrowed"] = False
+
+    # thread-sensitive, so that any connection opened to rebuild an index is
+    # closed at the end of the request, as in a sync view
+    results, strategy = await sync_to_async(search_indexes)(
+        query, max_results, timings, engine, filters
+    )
+    if strategy is None:
+        return results
+
+    from_database = results is None
+    if meta is not None:
+        meta["narrowed"] = not from_database
+    if from_database:
+        results = await adatabase_search(
+            query, database_limit(strategy, max_results), strategy, timings, **filters
+        )
+
+    return await sync_to_async(finish_search)(
+        query, max_results, strategy, results, timings, filters, from_database
+    )
+
+
+def preload_indexes():
+    """
+    Build the in-memory indexes now rather than on first use, e.g. in the
+    gunicorn master before it forks its workers (see gunicorn.conf.py).
+    """
+    if settings.ONTOLOGY_PREFIX_INDEX:
+        prefix_index.get()
+    if settings.ONTOLOGY_SYMSPELL:
+        symspell_index.get()
+    if settings.ONTOLOGY_NARROWING:
+        term_entries.get()
+    bm25_index.get()
@@ -0,0 +1,59 @@
+"""
+Runs a request's independent database queries concurrently, e.g. a study
+search's facet, count and page queries, so that its latency is that of the
+slowest query rather than the sum of all of them.
+
+Django gives each thread its own database connection, so each query runs on a
+thread from a per-worker pool, on that thread's connection, which is closed
+again once the query is done (or, with connection pooling, returned to the
+pool). The async views do the same with asyncio.gather() instead (see
+api.async_views).
+
+Each query runs in a copy of the calling thread's context, so that, e.g., it's
+routed to the same replica as the rest of the request (see api.routers).
+"""
+
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # created on first use, i.e. after gunicorn has forked its workers
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.SEARCH_QUERY_THREADS,
+            thread_name_prefix="search-query",
+        )
+    return _executor
+
+
+def _run_and_close(func):
+    try:
+        return func()
+    finally:
+        connections.close_all()
+
+
+def run_concurrently(tasks: dict) -> dict:
+    """
+    Call each of tasks' callables, concurrently on their own connections, and
+    return their results under the same keys. Exceptions are re-raised. With
+    SEARCH_QUERY_THREADS set to 1 or less, tasks run one after another in the
+    calling thread instead.
+    """
+    if settings.SEARCH_QUERY_THREADS <= 1:
+        return {name: func() for name, func in tasks.items()}
+
+    executor = _get_executor()
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, _run_and_close, func)
+        for name, func in tasks.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
@@ -5,8 +5,12 @@ weighs names and synonyms in decreasing order of specificity: names are weighed
 most highly, followed by exact synonyms, then narrow, broad, and finally related
 synonyms.
 
-Currently this weighting is applied by repeating each name or synonym by its
-weight to construct a "weighted document" that is then indexed by BM25+.
+This weighting was originally applied by repeating each name or synonym by its
+weight to construct a "weighted document" that was then indexed by BM25+, which
+meant rebuilding every document and refitting BM25+ over the whole corpus on
+each query. Weights are now applied as field weights on token counts, and the
+index is built once per DuckDB database and stored next to it on disk, where
+it's memory-mapped at query time (see api.utils.bm25). Scores are unchanged.
 
 Regarding the choice of BM25+ over BM25Okapi: BM25Okapi has a known issue where
 very short documents (e.g. a single word) are heavily favored over longer
@@ -30,33 +34,23 @@ Date: 2025-09-25
 from __future__ import annotations
 
 import os
-import re
 from pathlib import Path
 from typing import TYPE_CHECKING, Literal, NotRequired, TypedDict
 
 import duckdb
 import polars as pl
-from rank_bm25 import BM25Plus
 
 from metahq_core.util.exceptions import NoResultsFound
 
+from .bm25 import NAME_WEIGHT, SCOPE_WEIGHTS, BM25Index, Document, build_index
+
 if TYPE_CHECKING:
     import logging
 
 TABLE_DOCS = "ontology_search_docs"
 
-
-# weights for building doc_text, which is used for BM25 indexing
-NAME_WEIGHT = int(os.environ.get("NAME_WEIGHT", "10"))
-
-SCOPE_WEIGHTS = {
-    "EXACT": int(os.environ.get("SCOPE_WEIGHT_EXACT", "8")),
-    "NARROW": int(os.environ.get("SCOPE_WEIGHT_NARROW", "7")),
-    "BROAD": int(os.environ.get("SCOPE_WEIGHT_BROAD", "3")),
-    "RELATED": int(os.environ.get("SCOPE_WEIGHT_RELATED", "1")),
-}
-# per the OBO 1.4 spec, synonyms with no scope are treated as RELATED
-DEFAULT_SCOPE = "RELATED"
+# BM25 indexes loaded so far, by index directory
+_indexes: dict[Path, BM25Index] = {}
 
 
 class SynonymEntry(TypedDict):
@@ -92,6 +86,76 @@ def doc_text_for(name: str, syns: list[SynonymEntry]) -> str:
     return " \n ".join(parts)
 
 
+def index_dir_for(db: Path | str) -> Path:
+    """Default location of the BM25 index for a DuckDB database."""
+    return Path(db).with_suffix(".bm25")
+
+
+def build_search_index(db: Path | str, index_dir: Path | None = None) -> int:
+    """
+    Build (or rebuild) the BM25 index for every term in the DuckDB database.
+
+    :param db: path to the DuckDB database file
+    :param index_dir: where to write the index; defaults to index_dir_for(db)
+    :return: the number of terms indexed
+    """
+    index_dir = Path(index_dir or index_dir_for(db))
+    # taken before reading, so a database replaced mid-build reads as changed
+    source = source_stamp(db)
+
+    with duckdb.connect(str(db), read_only=True) as con:
+        terms = con.execute(
+            f"SELECT term_id, name, ontology, type FROM {TABLE_DOCS}"
+        ).fetchall()
+        synonyms = con.execute(
+            "SELECT term_id, synonym, scope FROM ontology_synonyms"
+        ).fetchall()
+
+    syns_by_term: dict[str, list] = {}
+    for term_id, synonym, scope in synonyms:
+        syns_by_term.setdefault(term_id, []).append((synonym, scope))
+
+    n_docs = build_index(
+        (
+            Document(term_id, name, ontology, type, syns_by_term.get(term_id, []))
+            for term_id, name, ontology, type in terms
+        ),
+        index_dir,
+        source=source,
+    )
+    _indexes.pop(index_dir.resolve(), None)
+    return n_docs
+
+
+def source_stamp(db: Path | str) -> dict:
+    """
+    The size and modification time of a DuckDB database, recorded in the
+    index built from it so that a replaced database is noticed.
+    """
+    stat = os.stat(db)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_search_index(db: Path | str, index_dir: Path | None = None) -> BM25Index:
+    """
+    Return the BM25 index for the DuckDB database, building it first if it
+    doesn't exist yet or was built from a different version of the database
+    (by size and modification time). Loaded indexes are kept for the life of
+    the process, and reloaded if the database changes.
+    """
+    index_dir = Path(index_dir or index_dir_for(db)).resolve()
+    source = source_stamp(db)
+
+    index = _indexes.get(index_dir)
+    if index is None or index.meta.get("source") != source:
+        index = BM25Index.load(index_dir) if BM25Index.exists(index_dir) else None
+        if index is None or index.meta.get("source") != source:
+            build_search_index(db, index_dir)
+            index = BM25Index.load(index_dir)
+        _indexes[index_dir] = index
+    return index
+
+
 def search(
     query: str,
     db: Path | None = None,
@@ -100,6 +164,7 @@ def search(
     ontology: str | None = None,
     logger: logging.Logger | None = None,
     verbose: bool = False,
+    index_dir: Path | None = None,
 ) -> pl.DataFrame:
     """
     Given a query string, return the top k hits from the ontology search index.
@@ -114,6 +179,8 @@ def search(
     :param type: if given, restrict results to this type (e.g. "celltype", "disease", or "tissue")
     :param ontology: if given, restrict results to this ontology (e.g. "CL", "UBERON", or "MONDO")
     :param verbose: if True, print debug information
+    :param index_dir: location of the BM25 index; defaults to index_dir_for(db),
+      and is built there on first use
     :return: a polars DataFrame with columns: term_id, ontology, name, type, synonyms, score
     """
 
@@ -130,128 +197,68 @@ def search(
 
         db = str(get_ontology_search_db())
 
-    with duckdb.connect(db) as con:
-        # 1) Load docs (one per term)
-
-        # construct SQL to get all possible documents, including building the WHERE clause if needed
-        if type or ontology:
-            clauses = [
-                f"type='{type}'" if type else None,
-                f"ontology='{ontology}'" if ontology else None,
-            ]
-
-            where = "WHERE " + (" AND ".join(x for x in clauses if x is not None))
-        else:
-            where = ""
-
-        # in addition to fetching the normal info about each entity, we also
-        # compute the column 'doc_text' on the fly.
-
-        # we do this because rank_bm25 doesn't support field weights, so we
-        # simulate it by repeating terms in the document.
-
-        # we previously precomputed this column as 'doc_text' during the db
-        # build, but it blows up the size of the db quite a bit, and it's not
-        # that expensive to compute on the fly. we can also modify the weights
-        # at query time with this approach.
-
-        sql = f"""
-        SELECT term_id, name, ontology, type,
-            (
-                SELECT REPEAT(name || ' ', {NAME_WEIGHT}) || ' ' ||
-                (
-                    SELECT COALESCE(
-                        STRING_AGG(
-                            REPEAT(
-                                synonym || ' ', 
-                                CASE scope
-                                    WHEN 'EXACT' THEN {SCOPE_WEIGHTS['EXACT']}
-                                    WHEN 'NARROW' THEN {SCOPE_WEIGHTS['NARROW']}
-                                    WHEN 'BROAD' THEN {SCOPE_WEIGHTS['BROAD']}
-                                    WHEN 'RELATED' THEN {SCOPE_WEIGHTS['RELATED']}
-                                    ELSE {SCOPE_WEIGHTS['RELATED']} -- treat unknown scope as RELATED
-                                END
-                            ), ' '
-                        ), ''
-                    )
-                )
-                FROM ontology_synonyms
-                WHERE term_id = ontology_search_docs.term_id
-            ) AS doc_text
-        FROM {TABLE_DOCS} {where}
-        """
-
-        if verbose:
-            logger.debug("SQL:\n%s\n", sql)
-
-        # execute the query and get the results as a polars DataFrame
-        df = con.execute(sql).pl()
-
-        # check that the df is not empty; if it is, raise an error
-        if df.is_empty():
-            msg = (
-                "No entities matched the filters: ontology=%s, type=%s",
-                ontology,
-                type,
-            )
-
-            raise NoResultsFound(msg)
-
-        # 2) Tokenize the corpus
-        corpus_tokens = (
-            df["doc_text"].str.to_lowercase().str.extract_all(r"[A-Za-z0-9]+")
+    # 1) Load the precomputed index (once per process). type and ontology
+    #    filters restrict the results below, so IDF and document lengths come
+    #    from the whole corpus rather than the filtered subset
+    index = load_search_index(db, index_dir)
+
+    mask = index.filter_mask(type=type, ontology=ontology)
+    if mask is not None and not mask.any():
+        msg = (
+            "No entities matched the filters: ontology=%s, type=%s",
+            ontology,
+            type,
         )
 
-        # 3) Fit BM25Plus (BM25Okapi has issues with doc lengths biasing results)
-        # bm25 = BM25Okapi(corpus_tokens)
-        bm25 = BM25Plus(corpus_tokens, k1=1.2, b=0.8, delta=0.5)
+        raise NoResultsFound(msg)
 
-        # 4) Tokenize the query in the same way as the corpus, apply BM25 to get scores, and return the top k hits
-        q_tokens = re.findall(r"[A-Za-z0-9]+", query.lower())
-        scores = [x for x in bm25.get_scores(q_tokens) if x > 0]
+    # 2) Take the top k of the documents that matched at least one query token
+    #    and pass the filters, keeping indices into the index
+    top_idx, top_scores = index.top_k(query, k, mask=mask)
 
-        # if we have no scores > 0, then there are no results
-        if len(scores) == 0:
-            raise NoResultsFound(f"No results found for query: '{query}'")
+    if verbose:
+        logger.debug("Scored %d documents for query: '%s'", len(index), query)
 
-        top_idx = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+    # if no documents matched, then there are no results
+    if len(top_idx) == 0:
+        raise NoResultsFound(f"No results found for query: '{query}'")
 
-        # for each hit, query for and return its synonyms ordered by scope specificity, then alphabetically
-        # this could probably be optimized by doing a single query for all synonyms
-        # but this is simpler and k is generally small
-        result_synonyms = {}
-        for i in top_idx:
-            term_id = df["term_id"][i]
-            syn_sql = f"""
-            SELECT synonym, scope
+    top_idx = top_idx.tolist()
+    top_ids = [index.term_ids[i] for i in top_idx]
+
+    # 3) Fetch the synonyms of every hit in one query, ordered by scope
+    #    specificity, then alphabetically
+    result_synonyms: dict[str, list[tuple[str, str | None]]] = {
+        term_id: [] for term_id in top_ids
+    }
+    placeholders = ", ".join("?" for _ in top_ids)
+    with duckdb.connect(db, read_only=True) as con:
+        syn_rows = con.execute(
+            f"""
+            SELECT term_id, synonym, scope
             FROM ontology_synonyms
-            WHERE term_id='{term_id}'
-            ORDER BY CASE scope
+            WHERE term_id IN ({placeholders})
+            ORDER BY term_id, CASE scope
                 WHEN 'EXACT' THEN 0
                 WHEN 'BROAD' THEN 1
                 WHEN 'NARROW' THEN 2
                 WHEN 'RELATED' THEN 3
                 ELSE 9
             END, synonym
-            """
-
-            try:
-                syn_df = con.execute(syn_sql).pl()
-                result_synonyms[term_id] = [
-                    (r["synonym"], r["scope"])
-                    for r in syn_df.select(["synonym", "scope"]).rows(named=True)
-                ]
-            except ValueError:
-                # no synonyms for this term
-                result_synonyms[term_id] = []
+            """,
+            top_ids,
+        ).fetchall()
+
+    for term_id, synonym, scope in syn_rows:
+        result_synonyms[term_id].append((synonym, scope))
 
     return pl.DataFrame(
         {
-            "term_id": [df["term_id"][i] for i in top_idx],
-            "ontology": [df["ontology"][i] for i in top_idx],
-            "name": [df["name"][i] for i in top_idx],
-            "type": [df["type"][i] for i in top_idx],
-            "synonyms": [result_synonyms.get(df["term_id"][i], []) for i in top_idx],
-            "score": [float(scores[i]) for i in top_idx],
+            "term_id": top_ids,
+            "ontology": [index.docs["ontology"][i] for i in top_idx],
+            "name": [index.docs["name"][i] for i in top_idx],
+            "type": [index.docs["type"][i] for i in top_idx],
+            "synonyms": [result_synonyms[term_id] for term_id in top_ids],
+            "score": top_scores.tolist(),
         }
     )
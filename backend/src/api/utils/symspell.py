@@ -0,0 +1,207 @@
+"""
+Typo-tolerant ontology term lookup with a SymSpell-style deletion index.
+
+Every distinct word in the searchable terms' ids, names and synonyms is indexed
+under each string obtained by deleting up to MAX_DISTANCE characters from its
+first PREFIX_LENGTH characters. Two words within edit distance d of each other
+always share such a deletion, so a query word's candidate corrections are found
+by generating its own deletions and looking each up, after which the candidates
+are verified with a real (Damerau-Levenshtein) edit distance. Lookups therefore
+cost a few dozen dict probes per query word, regardless of vocabulary size,
+rather than a scan of large trigram posting lists.
+
+A term matches a query if each query word matches (within its allowed edit
+distance) some word of one of the term's keys; matches are scored by how much
+of the query had to be corrected and how much of the key the query covers. See
+api.utils.ontology_search for how these candidates are merged with the other
+strategies' results.
+"""
+
+import functools
+
+from collections import defaultdict
+
+from .ontology_index import (
+    IndexHolder,
+    OntologyEntry,
+    load_entries,
+    normalize_query,
+    to_search_result,
+    top_hits,
+)
+
+# maximum edit distance for corrections; shorter words allow fewer (see max_distance_for)
+MAX_DISTANCE = 2
+
+# only the first PREFIX_LENGTH characters of each word are used to generate
+# deletions, which bounds the index's size; candidates are still verified
+# against whole words
+PREFIX_LENGTH = 7
+
+# number of (query, max_results, ontology, type) lookups memoized per index
+LOOKUP_CACHE_SIZE = 4096
+
+
+def max_distance_for(word: str) -> int:
+    """Edit distance allowed for a query word: none for very short words."""
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 4:
+        return 1
+    return MAX_DISTANCE
+
+
+def deletions(word: str, max_distance: int) -> set[str]:
+    """
+    The word's prefix and every string formed by deleting up to max_distance
+    characters from it.
+    """
+    prefix = word[:PREFIX_LENGTH]
+    results = {prefix}
+    frontier = {prefix}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int | None:
+    """
+    Optimal string alignment (restricted Damerau-Levenshtein) distance between
+    a and b, i.e. counting adjacent transpositions as one edit, or None if it
+    exceeds max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (
+                prev2 is not None
+                and i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return None
+        prev2, prev = prev, cur
+
+    return prev[-1] if prev[-1] <= max_distance else None
+
+
+class SymSpellIndex:
+    """
+    Deletion index over the words of searchable term ids, names and synonyms.
+    """
+
+    def __init__(self, entries):
+        # normalized keys and their entries, in parallel
+        self.keys = []
+        self.entries: list[OntologyEntry] = []
+        self.words: list[str] = []
+        # word id -> indices into keys/entries of the keys containing it
+        self.postings: list[list[int]] = []
+        # deletion -> ids of the words it was generated from
+        self.deletes: dict[str, list[int]] = defaultdict(list)
+
+        word_ids = {}
+        for key, entry in entries:
+            key = normalize_query(key or "")
+            if not key:
+                continue
+            idx = len(self.keys)
+            self.keys.append(key)
+            self.entries.append(entry)
+
+            for word in set(key.split()):
+                word_id = word_ids.get(word)
+                if word_id is None:
+                    word_id = word_ids[word] = len(self.words)
+                    self.words.append(word)
+                    self.postings.append([])
+                    for d in deletions(word, MAX_DISTANCE):
+                        self.deletes[d].append(word_id)
+                self.postings[word_id].append(idx)
+
+        self.deletes = dict(self.deletes)
+        self._ranked = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._rank)
+
+    def __len__(self):
+        return len(self.words)
+
+    def lookup_word(self, word: str) -> dict[int, int]:
+        """Map the id of each indexed word within edit distance of word to its distance."""
+        max_distance = max_distance_for(word)
+        candidates = set()
+        for d in deletions(word, max_distance):
+            candidates.update(self.deletes.get(d, ()))
+
+        matches = {}
+        for word_id in candidates:
+            distance = edit_distance(word, self.words[word_id], max_distance)
+            if distance is not None:
+                matches[word_id] = distance
+        return matches
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 50,
+        ontology: str | None = None,
+        type: str | None = None,
+    ):
+        """
+        Return up to max_results OntologySearchResults whose id, name or a
+        synonym contains a (possibly misspelled) match for every word of
+        query, best match per term first.
+        """
+        q = normalize_query(query)
+        if not q:
+            return []
+
+        return [
+            to_search_result(entry, sim, is_exact)
+            for entry, sim, is_exact in self._ranked(q, max_results, ontology, type)
+        ]
+
+    def _rank(self, q: str, max_results: int, ontology: str | None, type: str | None):
+        # key index -> summed edit distance over the query words matched so far
+        distances = None
+        for word in q.split():
+            best = {}
+            for word_id, distance in self.lookup_word(word).items():
+                for idx in self.postings[word_id]:
+                    if distance < best.get(idx, MAX_DISTANCE + 1):
+                        best[idx] = distance
+            if distances is None:
+                distances = best
+            else:
+                # every query word must match
+                distances = {
+                    idx: distances[idx] + distance
+                    for idx, distance in best.items()
+                    if idx in distances
+                }
+            if not distances:
+                return ()
+
+        hits = []
+        for idx, distance in distances.items():
+            key, entry = self.keys[idx], self.entries[idx]
+            if (ontology and entry.ontology != ontology) or (type and entry.type != type):
+                continue
+            # penalize corrections, and keys that the query covers only partly
+            sim = (1 - distance / len(q)) * min(1.0, len(q) / len(key))
+            hits.append((entry, sim, distance == 0 and key == q))
+
+        return top_hits(hits, max_results)
+
+
+symspell_index = IndexHolder(lambda: SymSpellIndex(load_entries()))
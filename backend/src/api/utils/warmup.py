@@ -0,0 +1,272 @@
+"""
+Warms up a worker before it serves traffic, so that the first searches after a
+deploy or a database restore don't pay for cold caches:
+- the search tables and their trigram indexes are loaded into the shared
+  buffers of Postgres and any replicas with pg_prewarm (enabled by migration
+  0044);
+- the in-memory ontology indexes are built, if they weren't already inherited
+  from the gunicorn master (see api.utils.ontology_search.preload_indexes);
+- the study and ontology searches for the WARMUP_TOP_QUERIES most popular
+  terms are requested from their endpoints, as the frontend requests them,
+  which fills the response caches and pulls the rest of what the searches
+  touch into the others.
+
+Under gunicorn (see gunicorn.conf.py), the databases are prewarmed once, by the
+master before it forks its workers. Each worker then builds its indexes in a
+background thread, and the first worker to claim it in the shared cache also
+replays the searches, once for all of them. As it finishes, each worker counts
+itself done in the shared cache, and the readiness endpoint (/api/ready/)
+reports a worker ready once as many workers as the master forks have, so that
+no worker is reported ready while others are still cold. The warmup management
+command runs every step on demand, e.g. after a pg_restore.
+
+A failed step is logged and skipped, and a warm-up that takes longer than
+WARMUP_CLAIM_TIMEOUT (e.g., a worker died before counting itself done) or can't
+be coordinated (the cache is unreachable) doesn't hold up readiness, since a
+cold worker is still better than one that never becomes ready. A worker that
+replaces one that died counts itself done too, so the count can run ahead of
+the workers actually done; each worker still waits for its own steps.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+
+from api.models import OntologyTerms, OntologyTermStats
+
+from .ontology_search import preload_indexes
+
+logger = logging.getLogger(__name__)
+
+# the tables searched on every request, plus their indexes; indexes using the
+# trigram opclass on any other table are prewarmed as well
+PREWARM_TABLES = [
+    "api_searchterm",
+    "api_ontologytermstats",
+    "api_ontologyterms",
+    "api_ontologysynonyms",
+]
+
+PREWARM_INDEXES_SQL = """
+SELECT indexrelid::regclass::text
+FROM pg_index
+WHERE indrelid = ANY(%(tables)s::regclass[])
+UNION
+SELECT format('%%I.%%I', schemaname, indexname)
+FROM pg_indexes
+WHERE schemaname = current_schema() AND indexdef LIKE '%%gin_trgm_ops%%'
+"""
+
+# the page of study search results the frontend asks for first
+REPLAY_STUDY_LIMIT = 100
+
+# as browsers send it, so that the cached responses are the ones they're served
+# (see api.decorators.compressed_cache_page)
+REPLAY_ACCEPT_ENCODING = "gzip, deflate, br, zstd"
+
+# how long a worker's claim on replaying the searches is honored; if the
+# workers haven't all finished by then, they're reported ready regardless
+WARMUP_CLAIM_TIMEOUT = 60 * 10
+
+# identifies the gunicorn master's boot (set by warm_up_master()), under which
+# the workers it forks coordinate their warm-up in the shared cache; None
+# outside gunicorn, or with WARMUP off
+_boot_id: str | None = None
+
+# the number of workers the master forks, each of which must be done warming
+# up before any is reported ready
+_workers = 1
+
+# set while a warm-up started by start_warm_up() is in progress
+_warming = threading.Event()
+
+# set once every worker of this boot is known to be done, so the cache isn't
+# asked again
+_all_done = False
+
+
+def prewarm_relations(using: str = DEFAULT_DB_ALIAS) -> dict[str, int]:
+    """
+    Load the search tables and indexes into a database's shared buffers;
+    returns the number of blocks loaded per relation.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(PREWARM_INDEXES_SQL, {"tables": PREWARM_TABLES})
+        relations = PREWARM_TABLES + sorted(row[0] for row in cursor.fetchall())
+
+        blocks = {}
+        for relation in relations:
+            cursor.execute("SELECT pg_prewarm(%s::regclass)", [relation])
+            blocks[relation] = cursor.fetchone()[0]
+    return blocks
+
+
+def top_terms(n: int) -> list[str]:
+    """The n ontology terms with the most predicted series."""
+    return list(
+        OntologyTermStats.objects.order_by("-hit_count", "term").values_list(
+            "term", flat=True
+        )[:n]
+    )
+
+
+def replay_top_queries(n: int) -> int:
+    """
+    Request the study searches (by id) and the ontology searches (by name) for
+    the n most popular terms, with the parameters the frontend sends; returns
+    the number of searches requested.
+    """
+    terms = top_terms(n)
+    names = OntologyTerms.objects.filter(id__in=terms).values_list("name", flat=True)
+    searches = [
+        (
+            "/api/study/search/",
+            {"query": term, "ordering": "", "offset": 0, "limit": REPLAY_STUDY_LIMIT},
+        )
+        for term in terms
+    ] + [("/api/ontology/search/", {"query": name}) for name in names]
+
+    # the response caches are keyed by the requested URL, host included
+    client = Client(HTTP_HOST=settings.DOMAIN, HTTP_ACCEPT_ENCODING=REPLAY_ACCEPT_ENCODING)
+    for path, params in searches:
+        response = client.get(path, params)
+        if response.status_code != 200:
+            logger.warning(
+                "Warm-up search %s?query=%s returned %d",
+                path,
+                params["query"],
+                response.status_code,
+            )
+
+    return len(searches)
+
+
+def prewarm_steps():
+    # replicas (see api.routers) serve most reads, so they're prewarmed too
+    return [
+        (f"prewarm {alias}", lambda alias=alias: prewarm_relations(alias))
+        for alias in settings.DATABASES
+    ]
+
+
+def run_steps(steps, log=logger) -> dict:
+    """
+    Run (name, callable) warm-up steps in turn, logging how long each took to
+    the given logger. Returns {step name: (seconds taken, step result)} for the
+    steps that succeeded.
+    """
+    done = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            result = step()
+        except Exception:
+            log.exception("Warm-up step %s failed, skipping it", name)
+            continue
+        done[name] = (time.perf_counter() - start, result)
+        log.info("Warm-up step %s done in %.2fs", name, done[name][0])
+    return done
+
+
+def warm_up(top_n: int | None = None, log=logger) -> dict:
+    """
+    Run every warm-up step, as run_steps() does; top_n defaults to
+    WARMUP_TOP_QUERIES.
+    """
+    if top_n is None:
+        top_n = settings.WARMUP_TOP_QUERIES
+
+    return run_steps(
+        [
+            *prewarm_steps(),
+            ("indexes", preload_indexes),
+            ("replay", lambda: replay_top_queries(top_n)),
+        ],
+        log,
+    )
+
+
+def _boot_key(name: str) -> str:
+    return f"warmup:{_boot_id}:{name}"
+
+
+def warm_up_master(workers: int, log=logger) -> dict:
+    """
+    In the gunicorn master, before it forks the given number of workers:
+    prewarm the databases, which only needs doing once rather than by every
+    worker, and start a new boot for the workers to coordinate the rest of
+    their warm-up under.
+    """
+    global _boot_id, _workers
+    _boot_id = uuid.uuid4().hex
+    _workers = workers
+    return run_steps(prewarm_steps(), log)
+
+
+def count_done():
+    """Count this worker as done warming up, in the shared cache."""
+    key = _boot_key("done")
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the key is gone, i.e. the cache is unreachable or evicted it; is_ready()
+        # won't wait for workers it can't count
+        pass
+
+
+def start_warm_up(log=logger):
+    """
+    In a gunicorn worker: build the in-memory indexes in a background thread,
+    and replay the most popular searches too if no other worker of this boot
+    has claimed them. No worker is ready until every worker is done (see
+    is_ready()).
+    """
+    steps = [("indexes", preload_indexes)]
+
+    claim = _boot_key("claimed")
+    # if the claim can't be read back, the cache is unreachable and there's
+    # no coordinating with other workers, so this one replays by itself
+    replays = cache.add(claim, True, WARMUP_CLAIM_TIMEOUT) or cache.get(claim) is None
+    if replays:
+        steps.append(("replay", lambda: replay_top_queries(settings.WARMUP_TOP_QUERIES)))
+
+    _warming.set()
+
+    def run():
+        try:
+            run_steps(steps, log)
+        finally:
+            connections.close_all()
+            count_done()
+            _warming.clear()
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+
+def is_ready() -> bool:
+    """
+    Whether this worker is done warming up (or never started to), and so are
+    all the other workers of this boot, including the one that replayed the
+    most popular searches.
+    """
+    global _all_done
+    if _warming.is_set():
+        return False
+    if _all_done or _boot_id is None:
+        return True
+
+    found = cache.get_many([_boot_key("claimed"), _boot_key("done")])
+    # if the replay's claim isn't current, the warm-up has taken too long (or
+    # the cache is unreachable); it's not worth waiting for
+    _all_done = (
+        _boot_key("claimed") not in found
+        or found.get(_boot_key("done"), 0) >= _workers
+    )
+    return _all_done
@@ -2,6 +2,8 @@ import csv
 from collections import Counter
 
 from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.cache import cache
 from django.db import models, transaction
 from django.db.models import (
     Case,
@@ -18,15 +20,16 @@ from django.db.models import (
 from django.db.models.functions import Coalesce
 from django.http import HttpResponse
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from .decorators import compressed_cache_page
 from .models import (
     Cart,
     CartItem,
@@ -34,7 +37,8 @@ from .models import (
     GEOSample,
     GEOSeries,
     GEOSeriesToGEOPlatforms,
-    OntologySearchResults,
+    OntologyTerms,
+    OntologyTermStats,
     Organism,
     GEOPlatform,
     SearchTerm,
@@ -47,12 +51,18 @@ from .serializers import (
     GEOSampleSerializer,
     GEOSeriesSerializer,
     OntologySearchResultsSerializer,
+    OntologyTermDetailSerializer,
     OrganismSerializer,
     GEOPlatformSerializer,
     SearchTermSerializer,
     GEOSeriesSerializer,
+    GEOSeriesValuesSerializer,
 )
 from .utils.auth import CsrfExemptSessionAuthentication
+from .utils.cache import normalize_search_query, ontology_search_cache_key
+from .utils.ontology_search import ENGINES, search_ontology_terms, timed
+from .utils.parallel import run_concurrently
+from .utils.warmup import is_ready
 
 # ===========================================================================
 # === Helpers
@@ -83,6 +93,29 @@ class GEOSeriesSearchPagination(LimitOffsetPagination):
         )
 
 
+def parse_fields_param(query_params):
+    """
+    Parse the study endpoints' fields parameter, a comma-separated list of
+    GEOSeriesSerializer fields to return (a sparse fieldset), e.g.
+    fields=id,name,confidence,sample_count. Returns None (i.e., all fields) if
+    it's not given; raises ValueError with a message for the client if it names
+    unknown fields.
+    """
+    value = query_params.get("fields")
+    if not value:
+        return None
+
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    available = GEOSeriesSerializer.Meta.fields
+    unknown = requested.difference(available)
+    if unknown:
+        raise ValueError(
+            f"unknown fields: {', '.join(sorted(unknown))}; "
+            f"available fields are: {', '.join(available)}"
+        )
+    return [name for name in available if name in requested]
+
+
 # ===========================================================================
 # === Reference Types
 # ===========================================================================
@@ -125,6 +158,9 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ReadOnly API endpoint for viewing GEOSeries.
     Accessible at /api/series/
+
+    Every action takes an optional fields parameter, which limits both the
+    columns selected and the fields returned (see parse_fields_param).
     """
 
     queryset = GEOSeries.objects.all()
@@ -135,6 +171,28 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ["gse"]
     pagination_class = GEOSeriesSearchPagination
 
+    # the fields requested via the fields parameter (see parse_fields_param),
+    # or None for all of them; set per request by initial()
+    sparse_fields = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        try:
+            self.sparse_fields = parse_fields_param(request.query_params)
+        except ValueError as e:
+            raise ValidationError({"error": str(e)})
+
+    def get_queryset(self):
+        # only select the columns the requested fields need
+        queryset = super().get_queryset()
+        if self.sparse_fields is not None:
+            queryset = queryset.only(*GEOSeriesValuesSerializer.columns(self.sparse_fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.sparse_fields)
+        return super().get_serializer(*args, **kwargs)
+
     def _with_samples_count(self, queryset):
         """
         Keep queryset at one row per GEOSeries while annotating sample counts.
@@ -175,8 +233,11 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
             ),
         )
 
-    def _build_facets(self, queryset):
-        """Compute facets for the search result set."""
+    def _bucket_facet_querysets(self, queryset):
+        """
+        Build the study size and confidence facet count querysets for the
+        search result set; returns {facet name: (queryset, key field)}.
+        """
 
         annotated_qs = self._with_samples_count(queryset)
         annotated_qs = self._with_facet_buckets(annotated_qs).order_by()
@@ -191,9 +252,18 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
             count=Count("gse")
         )
 
-        # platform facet
-        gse_list = list(queryset.values_list("gse", flat=True))
+        return {
+            "Study Size": (study_size_counts, "study_size"),
+            "Confidence": (confidence_counts, "confidence_level"),
+        }
 
+    def _platform_facet_querysets(self, gse_list):
+        """
+        Build the platform and technology facet count querysets for the GSEs
+        in the search result set; returns {facet name: (queryset, key field)}.
+        """
+
+        # platform facet
         platform_counts_qs = (
             GEOSeriesToGEOPlatforms.objects
             .filter(gse__in=gse_list)
@@ -221,69 +291,68 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
             .annotate(count=Count("gpl", distinct=True))
         )
 
-        # final facet results
         return {
-            "Study Size": {
-                entry["study_size"]: entry["count"] for entry in study_size_counts
-            },
-            "Confidence": {
-                entry["confidence_level"]: entry["count"] for entry in confidence_counts
-            },
-            "Platforms": {
-                (row["gpl"] or "unknown"): row["count"] for row in platform_counts
-            },
-            "Technologies": {
-                (row["technology"] or "unknown"): row["count"] for row in technology_counts
-            },
+            "Platforms": (platform_counts, "gpl"),
+            "Technologies": (technology_counts, "technology"),
         }
 
-    # search by ontology ID (e.g., MONDO:0000270), which consults SearchTerm for
-    # series matching the term
-    @method_decorator(cache_page(settings.LONGTERM_CACHE_TIMEOUT))
-    @action(
-        detail=False, methods=["get"], url_path="search", permission_classes=[AllowAny]
-    )
-    def search(self, request):
-        query = request.query_params.get("query")
-        ordering = request.query_params.get("ordering") or "relevance"
-        offset = request.query_params.get("offset")
-        limit = request.query_params.get("limit")
+    @staticmethod
+    def _facet_counts(rows, key):
+        """Map each facet value in rows (e.g., a platform) to its count."""
+        return {(row[key] or "unknown"): row["count"] for row in rows}
 
-        if not query:
-            return Response(
-                {
-                    "count": 0,
-                    "next": None,
-                    "previous": None,
-                    "results": [],
-                    "facets": {},
-                    "meta": {
-                        "term": query,
-                        "performance": "unknown",
-                    },
-                }
-            )
+    def _facet_tasks(self, queryset):
+        """
+        Callables that compute the facets for the search result set, to be run
+        concurrently (see api.utils.parallel); each returns {facet name: counts}.
+        """
+
+        def counts(facet_querysets):
+            return {
+                name: self._facet_counts(rows, key)
+                for name, (rows, key) in facet_querysets.items()
+            }
+
+        def platform_facets():
+            # platform facets need the GSEs in the result set first
+            gse_list = list(queryset.values_list("gse", flat=True))
+            return counts(self._platform_facet_querysets(gse_list))
+
+        tasks = {
+            name: (lambda name=name, facet=facet: counts({name: facet}))
+            for name, facet in self._bucket_facet_querysets(queryset).items()
+        }
+        tasks["Platforms"] = platform_facets
+        return tasks
 
+    @staticmethod
+    def _term_performance(query):
+        """The model performance rating for a searched term, or "unknown"."""
+        rating = OntologyTermRating.objects.filter(term=query).values("performance").first()
+        return rating.get("performance", "unknown") if rating else "unknown"
+
+    def _search_querysets(self, query, ordering, query_params):
+        """
+        Build the (unevaluated) querysets for a search: the full searched
+        result set, which facets describe, and the results after applying the
+        facet filters and ordering from query_params.
+        """
         max_results = settings.SEARCH_MAX_RESULTS
 
         # produce initial queryset based on search, which may include relevance annotations but is not yet filtered by facets
-        results = GEOSeries.objects.search(query, max_results=max_results, order_by=ordering)
+        searched = GEOSeries.objects.search(query, max_results=max_results, order_by=ordering)
 
         # adds annotations used for building facets
-        results = self._with_samples_count(results)
-        results = self._with_facet_buckets(results)
-
-        # Build facets BEFORE applying facet filters, so facets describe the full
-        # searched result set
-        facets = self._build_facets(results)
-
+        searched = self._with_samples_count(searched)
+        searched = self._with_facet_buckets(searched)
+        results = searched
 
         # ---------------------------------------------------------------
         # --- apply faceting options from request
         # ---------------------------------------------------------------
 
         # if confidence is provided, filter by confidence bucket
-        confidence = request.query_params.get("Confidence")
+        confidence = query_params.get("Confidence")
         if confidence in ["high", "medium", "low", "unknown"]:
             if confidence == "high":
                 results = results.filter(prob__gte=0.8)
@@ -295,7 +364,7 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
                 results = results.filter(prob__isnull=True)
 
         # if study size is provided, filter by samples_ct bucket
-        study_size = request.query_params.get("Study Size")
+        study_size = query_params.get("Study Size")
         if study_size in ["small", "medium", "large"]:
             if study_size == "small":
                 results = results.filter(samples_ct__lt=10)
@@ -308,7 +377,7 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
         # 1. get GPLs whose technology is in requested platform technologies
         # 2. find GSEs whose platforms array overlaps those GPLs
         # 3. filter results to those GSEs
-        platforms = request.query_params.getlist("Platforms")
+        platforms = query_params.getlist("Platforms")
         if platforms:
             # gpls = list(
             #     GEOPlatform.objects.filter(technology__in=platforms).values_list(
@@ -330,12 +399,12 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
         # 1. find GPLs whose technology is in requested technologies
         # 2. find GSEs whose platforms array overlaps those GPLs
         # 3. filter results to those GSEs
-        technologies = request.query_params.getlist("Technologies")
+        technologies = query_params.getlist("Technologies")
         if technologies:
-            tech_gpls = list(
-                GEOPlatform.objects.filter(technology__in=technologies).values_list(
-                    "gpl", flat=True
-                )
+            # a subquery rather than a list, so that building the querysets
+            # doesn't hit the database (see api.async_views)
+            tech_gpls = ArraySubquery(
+                GEOPlatform.objects.filter(technology__in=technologies).values("gpl")
             )
 
             tech_gse_values = (
@@ -365,13 +434,68 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
         elif ordering == "-samples":
             results = results.order_by("samples_ct", "gse")
 
-        # paginate the response
-        if limit is not None:
-            self.pagination_class.limit = limit
-        else:
-            self.pagination_class.limit = self.pagination_class.default_limit
+        return searched, results
 
-        self.pagination_class.offset = offset or 0
+    # search by ontology ID (e.g., MONDO:0000270), which consults SearchTerm for
+    # series matching the term
+    @method_decorator(compressed_cache_page(settings.LONGTERM_CACHE_TIMEOUT))
+    @action(
+        detail=False, methods=["get"], url_path="search", permission_classes=[AllowAny]
+    )
+    def search(self, request):
+        query = request.query_params.get("query")
+        ordering = request.query_params.get("ordering") or "relevance"
+
+        if not query:
+            return Response(
+                {
+                    "count": 0,
+                    "next": None,
+                    "previous": None,
+                    "results": [],
+                    "facets": {},
+                    "meta": {
+                        "term": query,
+                        "performance": "unknown",
+                    },
+                }
+            )
+
+        searched, results = self._search_querysets(
+            query, ordering, request.query_params
+        )
+
+        # paginate the response; this is done here rather than by
+        # paginate_queryset(), so that the page and count queries can run
+        # alongside the others
+        paginator = self.paginator
+        paginator.request = request
+        paginator.limit = paginator.get_limit(request)
+        paginator.offset = paginator.get_offset(request)
+
+        # the page is serialized from just the values it needs (see
+        # GEOSeriesValuesSerializer)
+        page = GEOSeriesValuesSerializer.values_queryset(results, self.sparse_fields)
+        if paginator.limit is not None:
+            page = page[paginator.offset:paginator.offset + paginator.limit]
+
+        # Build facets from the searched result set, i.e. BEFORE facet filters
+        # are applied, so facets describe the full searched result set. The
+        # facet, rating, count and page queries are independent of each other,
+        # so they run concurrently, each on its own connection.
+        facet_tasks = self._facet_tasks(searched)
+        done = run_concurrently(
+            {
+                **facet_tasks,
+                "performance": lambda: self._term_performance(query),
+                "count": results.count,
+                "page": lambda: GEOSeriesValuesSerializer(page, fields=self.sparse_fields).data,
+            }
+        )
+
+        facets = {}
+        for name in facet_tasks:
+            facets.update(done[name])
 
         # ---------------------------------------------------------------
         # --- build final result set, either paginated or not
@@ -379,29 +503,23 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
 
         meta = {
             "term": query,
-            "performance": (
-                OntologyTermRating.objects
-                    .filter(term=query).values("performance").first()
-                    .get("performance", "unknown")
-            )
+            "performance": done["performance"],
         }
 
-        if self.paginator is not None:
-            self.paginator.facets = facets
-            self.paginator.meta = meta
-
-        page = self.paginate_queryset(results)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        if paginator.limit is not None:
+            paginator.count = done["count"]
+            if paginator.count > paginator.limit and paginator.template is not None:
+                paginator.display_page_controls = True
+            paginator.facets = facets
+            paginator.meta = meta
+            return self.get_paginated_response(done["page"])
 
-        serializer = self.get_serializer(results, many=True)
         return Response(
             {
-                "count": results.count(),
+                "count": done["count"],
                 "next": None,
                 "previous": None,
-                "results": serializer.data,
+                "results": done["page"],
                 "facets": facets,
                 "meta": meta,
             }
@@ -415,13 +533,16 @@ class GEOSeriesViewSet(viewsets.ReadOnlyModelViewSet):
     def lookup(self, request):
         # takes a list of series_ids in the body
         series_ids = request.data.get("ids", [])
-        queryset = self.get_queryset().filter(gse__in=series_ids)
+        fields = self.sparse_fields
+        queryset = GEOSeriesValuesSerializer.values_queryset(
+            self.get_queryset().filter(gse__in=series_ids), fields
+        )
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+            return self.get_paginated_response(
+                GEOSeriesValuesSerializer(page, fields=fields).data
+            )
+        return Response(GEOSeriesValuesSerializer(queryset, fields=fields).data)
 
     # nest /samples to find related samples for a series
     @action(
@@ -500,6 +621,38 @@ class SearchTermViewSet(viewsets.ReadOnlyModelViewSet):
 # ===========================================================================
 
 
+def parse_ontology_search_params(query_params):
+    """
+    Parse the ontology search endpoint's query parameters (see ontology_search)
+    into (query, max_results, engine, filters); raises ValueError with a message
+    for the client if they're invalid.
+    """
+    query = normalize_search_query(query_params.get("query") or "")
+    max_results = query_params.get("max_results", 50)
+    engine = query_params.get("engine") or "default"
+    filters = {
+        "ontology": query_params.get("ontology") or None,
+        "type": query_params.get("type") or None,
+    }
+
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(ENGINES)}")
+
+    # max_results doesn't matter if there's no query
+    if query:
+        try:
+            max_results = int(max_results)
+        except ValueError:
+            raise ValueError("max_results must be an integer")
+
+    return query, max_results, engine, filters
+
+
+def server_timing(timings: dict) -> str:
+    """Format per-strategy timings (in ms) as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={ms:.2f}" for name, ms in timings.items())
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def ontology_search(request):
@@ -510,25 +663,79 @@ def ontology_search(request):
     Query parameters:
     - query (required): The search query string
     - max_results (optional): Maximum number of results to return (default: 50)
+    - engine (optional): "default", or "bm25" to rank with BM25+ instead
+    - ontology (optional): Only return terms from this ontology (e.g. "MONDO")
+    - type (optional): Only return terms of this type (e.g. "disease")
     """
-    query = request.query_params.get("query")
-    max_results = request.query_params.get("max_results", 50)
+    try:
+        query, max_results, engine, filters = parse_ontology_search_params(
+            request.query_params
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     if not query:
         # return an empty list if no query is provided
         return Response([])
 
-    try:
-        max_results = int(max_results)
-    except ValueError:
+    # time spent per search strategy, reported via the Server-Timing header
+    timings = {}
+
+    # results are cached across workers, including empty ones, until the
+    # ontology data is reimported (see api.utils.cache)
+    cache_key = ontology_search_cache_key(
+        query, max_results=max_results, engine=engine, **filters
+    )
+    with timed(timings, "cache"):
+        data = cache.get(cache_key)
+
+    if data is None:
+        meta = {}
+        results = search_ontology_terms(
+            query, max_results, timings=timings, engine=engine, meta=meta, **filters
+        )
+        data = OntologySearchResultsSerializer(results, many=True).data
+        # narrowed results depend on the query they were narrowed from, so
+        # only a full search's are cached (see api.utils.narrowing)
+        if not meta["narrowed"]:
+            cache.set(cache_key, data, settings.LONGTERM_CACHE_TIMEOUT)
+
+    response = Response(data)
+    response["Server-Timing"] = server_timing(timings)
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def ontology_term_detail(request, term_id):
+    """
+    API endpoint for the details of a single ontology term, including its
+    synonyms, model performance rating, and the number and confidence
+    distribution of its predicted series (precomputed in OntologyTermStats).
+    Accessible at /api/ontology/terms/<term_id>/
+    """
+    stats = OntologyTermStats.objects.filter(term=OuterRef("id"))
+    term = (
+        OntologyTerms.objects.filter(id=term_id)
+        .annotate(
+            performance=Subquery(
+                OntologyTermRating.objects.filter(term=OuterRef("id")).values(
+                    "performance"
+                )[:1]
+            ),
+            hit_count=Coalesce(Subquery(stats.values("hit_count")[:1]), 0),
+            confidence_histogram=Subquery(stats.values("confidence_histogram")[:1]),
+        )
+        .first()
+    )
+
+    if term is None:
         return Response(
-            {"error": "max_results must be an integer"},
-            status=status.HTTP_400_BAD_REQUEST,
+            {"error": f"Ontology term not found: {term_id}"},
+            status=status.HTTP_404_NOT_FOUND,
         )
 
-    results = OntologySearchResults.objects.search(query, max_results)
-    serializer = OntologySearchResultsSerializer(results, many=True)
-    return Response(serializer.data)
+    return Response(OntologyTermDetailSerializer(term).data)
 
 
 # ===========================================================================
@@ -661,3 +868,21 @@ class CartViewSet(viewsets.ModelViewSet):
                 {"error": "Unsupported download type"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+
+
+# ===========================================================================
+# === Service status
+# ===========================================================================
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def ready(request):
+    """
+    Readiness check: 200 once the worker that serves it and every other worker
+    have warmed up (see api.utils.warmup), 503 until then.
+    Accessible at /api/ready/
+    """
+    if not is_ready():
+        return Response({"ready": False}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({"ready": True})
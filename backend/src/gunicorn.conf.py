@@ -0,0 +1,63 @@
+"""
+gunicorn settings, read from the working directory (/app/src) when
+launch_api.sh starts gunicorn in production mode.
+"""
+
+import gc
+import logging
+
+logger = logging.getLogger("gunicorn.error")
+
+# load the Django app once in the master process, so that anything built at
+# startup (e.g., the in-memory ontology indexes) is inherited by every worker
+preload_app = True
+
+
+def when_ready(server):
+    """
+    Runs in the master after the app is loaded and before workers are forked.
+    """
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.db import connections
+
+    if settings.WARMUP:
+        from api.utils.warmup import warm_up_master
+
+        warm_up_master(server.cfg.workers, log=logger)
+
+    if settings.ONTOLOGY_PRELOAD_INDEXES:
+        from api.utils.ontology_search import preload_indexes
+
+        try:
+            preload_indexes()
+        except Exception:
+            # workers will build the indexes on first use instead
+            logger.exception("Couldn't preload ontology indexes")
+
+    # database connections mustn't be shared with forked workers, and neither
+    # may connection pools, whose background threads don't survive the fork;
+    # each worker creates its own pool on first use
+    connections.close_all()
+    for conn in connections.all(initialized_only=True):
+        conn.close_pool()
+    # nor may memcached sockets, opened e.g. to check the ontology data version
+    # while preloading; workers would interleave their requests on them
+    caches.close_all()
+
+    # keep the garbage collector from touching (and thereby un-sharing) the
+    # objects built so far
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    Runs in each worker right after it's forked; starts the worker's part of
+    the warm-up, which /api/ready/ waits for (see api.utils.warmup).
+    """
+    from django.conf import settings
+
+    if settings.WARMUP:
+        from api.utils.warmup import start_warm_up
+
+        start_warm_up(log=worker.log)
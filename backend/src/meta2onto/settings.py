@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
 import os
 
 from pathlib import Path
@@ -81,6 +82,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so it sees every pooled connection a request waits for
+    "api.middleware.PoolWaitTimingMiddleware",
+    # sends each request's reads to a single replica (see api.routers)
+    "api.middleware.ReplicaPinningMiddleware",
+    # before anything else that reads or changes response bodies
+    "api.middleware.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -114,6 +121,16 @@ WSGI_APPLICATION = "meta2onto.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# if true, each worker keeps a pool of open connections (via psycopg_pool)
+# rather than connecting to postgres anew for every request
+DB_POOL = is_truthy(os.environ.get("DB_POOL", "1"))
+# per-worker pool sizes; the maximum should cover a sync worker's request
+# thread plus its SEARCH_QUERY_THREADS (see api.utils.parallel)
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "8"))
+# seconds a request may wait for a free pooled connection before erroring out
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+
 DATABASES = {
     # sql database via psycopg
     "default": {
@@ -123,14 +140,52 @@ DATABASES = {
         "PASSWORD": os.environ["POSTGRES_PASSWORD"],
         "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # check pooled connections before handing them out, so that ones
+        # dropped by the server (e.g., after a restart) are replaced
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "pool": {
+                "min_size": DB_POOL_MIN_SIZE,
+                "max_size": DB_POOL_MAX_SIZE,
+                "timeout": DB_POOL_TIMEOUT,
+            }
+        }
+        if DB_POOL
+        else {},
     }
 }
 
+# read replicas, as a comma-separated list of host[:port]; e.g., a second
+# postgres restored from the same dump works as a stand-in. if given, reads of
+# the read-only api models are spread across them (see api.routers)
+POSTGRES_REPLICAS = [
+    replica.strip()
+    for replica in os.environ.get("POSTGRES_REPLICAS", "").split(",")
+    if replica.strip()
+]
+for i, replica in enumerate(POSTGRES_REPLICAS, start=1):
+    host, _, port = replica.partition(":")
+    DATABASES[f"replica{i}"] = {
+        **copy.deepcopy(DATABASES["default"]),
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        # tests use the primary's test database in place of the replicas
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["api.routers.ReplicaRouter"] if POSTGRES_REPLICAS else []
+# replicas lagging further behind the primary than this many seconds aren't read from
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "5"))
+# how often (in seconds) each worker checks its replicas' lag
+REPLICA_LAG_CHECK_SECONDS = float(os.environ.get("REPLICA_LAG_CHECK_SECONDS", "5"))
+
 # Cache configuration
 # https://docs.djangoproject.com/en/5.2/topics/cache/
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        # compresses large values and splits those over memcached's item size
+        # limit across several keys (see api.utils.memcached)
+        "BACKEND": "api.utils.memcached.ChunkedPyMemcacheCache",
         "LOCATION": os.environ.get("MEMCACHED_LOCATION", "memcached:11211"),
         "OPTIONS": {
             "no_delay": True,
@@ -195,9 +250,11 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 100,
+    # JSON via orjson (see api.renderers); the browsable API is only offered
+    # in debug mode, since rendering it is slow and nothing in production uses it
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
+        "api.renderers.ORJSONRenderer",
+        *(["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
     ],
     "DEFAULT_FILTER_BACKENDS": [
         "rest_framework.filters.SearchFilter",
@@ -211,3 +268,77 @@ REST_FRAMEWORK = {
 LONGTERM_CACHE_TIMEOUT = int(os.environ.get("LONGTERM_CACHE_TIMEOUT", str(60 * 60 * 24 * 30)))
 # maximum number of search results to return, which can be overridden by environment variable
 SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "1000"))
+# if true, autocomplete queries are first answered from a per-worker in-memory
+# prefix index over ontology term ids, names and synonyms (see api.utils.ontology_index)
+ONTOLOGY_PREFIX_INDEX = is_truthy(os.environ.get("ONTOLOGY_PREFIX_INDEX", "1"))
+# minimum number of prefix completions needed to answer from the prefix index;
+# with fewer, the query falls back to the fuzzy search_onto() SQL function
+ONTOLOGY_PREFIX_MIN_RESULTS = int(os.environ.get("ONTOLOGY_PREFIX_MIN_RESULTS", "10"))
+# how often (in seconds) each worker checks whether its in-memory ontology
+# indexes are stale, i.e. whether the ontology data has been reimported
+ONTOLOGY_INDEX_RECHECK_SECONDS = int(os.environ.get("ONTOLOGY_INDEX_RECHECK_SECONDS", "60"))
+# ontology search queries up to this many characters are prefix-matched via
+# btree indexes instead of fuzzy-matched via trigram similarity
+ONTOLOGY_SHORT_QUERY_MAX_LEN = int(os.environ.get("ONTOLOGY_SHORT_QUERY_MAX_LEN", "3"))
+# ontology search queries of at least this many words are matched via the
+# tsvector (full-text) indexes rather than trigram similarity...
+ONTOLOGY_FULLTEXT_MIN_WORDS = int(os.environ.get("ONTOLOGY_FULLTEXT_MIN_WORDS", "2"))
+# ...unless that finds fewer than this many terms, in which case they fall back
+# to trigram similarity
+ONTOLOGY_FULLTEXT_MIN_RESULTS = int(os.environ.get("ONTOLOGY_FULLTEXT_MIN_RESULTS", "5"))
+# if true, gunicorn builds the in-memory ontology indexes (prefix, BM25) once in
+# its master process, so forked workers share them copy-on-write instead of each
+# building their own on first use (see gunicorn.conf.py)
+ONTOLOGY_PRELOAD_INDEXES = is_truthy(os.environ.get("ONTOLOGY_PRELOAD_INDEXES", "1"))
+# if true, ontology search also finds candidates for misspelled queries via a
+# per-worker deletion (SymSpell-style) index over term words (see api.utils.symspell)
+ONTOLOGY_SYMSPELL = is_truthy(os.environ.get("ONTOLOGY_SYMSPELL", "1"))
+# if true, ontology trigram searches record their candidate terms in the cache,
+# and queries that extend an earlier query (e.g., the next autocomplete keystroke)
+# are answered by rescoring those candidates (see api.utils.narrowing)
+ONTOLOGY_NARROWING = is_truthy(os.environ.get("ONTOLOGY_NARROWING", "1"))
+# number of candidate terms each trigram search fetches; they're only recorded for
+# narrowing if the search found fewer, i.e. every match
+ONTOLOGY_NARROWING_POOL = int(os.environ.get("ONTOLOGY_NARROWING_POOL", "200"))
+# minimum number of rescored candidates needed to answer a query by narrowing;
+# with fewer, the candidates aren't trusted and the query gets a full search
+ONTOLOGY_NARROWING_MIN_RESULTS = int(os.environ.get("ONTOLOGY_NARROWING_MIN_RESULTS", "10"))
+# how long (in seconds) recorded candidate sets are kept
+ONTOLOGY_NARROWING_TIMEOUT = int(os.environ.get("ONTOLOGY_NARROWING_TIMEOUT", "3600"))
+# if true, the study search, study lookup and ontology search endpoints are
+# served by async views that query the database via psycopg's async connections
+# (see api.async_views); launch_api.sh sets this when serving via ASGI
+API_ASYNC_VIEWS = is_truthy(os.environ.get("API_ASYNC_VIEWS", "0"))
+# size limits of each worker's async database connection pool (see api.utils.async_db)
+ASYNC_DB_POOL_MIN_SIZE = int(os.environ.get("ASYNC_DB_POOL_MIN_SIZE", "1"))
+ASYNC_DB_POOL_MAX_SIZE = int(os.environ.get("ASYNC_DB_POOL_MAX_SIZE", "10"))
+# number of threads each worker uses to run a study search's facet, count and
+# page queries concurrently, each on its own connection (see api.utils.parallel);
+# 1 runs them one after another instead
+SEARCH_QUERY_THREADS = int(os.environ.get("SEARCH_QUERY_THREADS", "6"))
+# if true, gunicorn warms up before /api/ready/ reports it ready: the master
+# prewarms the search tables and indexes into Postgres' buffers, each worker
+# builds its in-memory indexes, and one worker replays the most popular
+# searches (see api.utils.warmup)
+WARMUP = is_truthy(os.environ.get("WARMUP", "1"))
+# number of most popular terms whose study and ontology searches are replayed
+WARMUP_TOP_QUERIES = int(os.environ.get("WARMUP_TOP_QUERIES", "50"))
+# encodings responses may be compressed with, in order of preference when the
+# client accepts several equally (see api.utils.compression); any of zstd, br
+# and gzip
+COMPRESSION_ENCODINGS = [
+    encoding.strip()
+    for encoding in os.environ.get("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+    if encoding.strip()
+]
+# responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+# cached values (e.g., study search pages) at least this many bytes pickled are
+# stored compressed (see api.utils.memcached)
+CACHE_COMPRESS_MIN_BYTES = int(os.environ.get("CACHE_COMPRESS_MIN_BYTES", str(64 * 1024)))
+# compressed values larger than this are split across several memcached items;
+# it must be below memcached's item size limit (-I, 1MB by default), less room
+# for the key and item overhead
+CACHE_MAX_ITEM_BYTES = int(os.environ.get("CACHE_MAX_ITEM_BYTES", str(1000 * 1000)))
+# values needing more items than this are logged and not cached at all
+CACHE_MAX_CHUNKS = int(os.environ.get("CACHE_MAX_CHUNKS", "16"))